@@ -0,0 +1,151 @@
+"""Partitioned bus_locations with a sequential key, plus per-minute rollups
+
+On Postgres bus_locations becomes a table range-partitioned by day on
+"timestamp", with a DEFAULT partition for anything outside the daily ones;
+LocationMaintenance creates partitions ahead of time and drops expired
+ones. Other databases get a plain table with the same columns and indexes.
+
+An existing bus_locations (created by `create_all`, with UUID or
+sequential keys) is copied into the new table with fresh sequential ids.
+For very large histories, consider trimming it before upgrading. Tables
+and indexes `create_all` already made at startup are left as they are.
+
+Revision ID: 0001_bus_locations
+Revises:
+Create Date: 2024-09-02 08:00:00
+
+"""
+from datetime import date, datetime, time, timedelta, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_bus_locations'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+PARTITION_DAYS_AHEAD = 7
+COLUMNS = "bus_id, latitude, longitude, speed, \"timestamp\""
+
+
+def day_partition_sql(day: date) -> str:
+    start = datetime.combine(day, time(), tzinfo=timezone.utc)
+    end = start + timedelta(days=1)
+    return (
+        f"CREATE TABLE IF NOT EXISTS bus_locations_p{day:%Y%m%d} PARTITION OF bus_locations "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+def create_referenced_tables(bind):
+    # The rest of the schema is still created by `create_all` at startup;
+    # make sure buses exists for the foreign keys on a fresh database
+    from app.core.database import Base
+    import app.models  # noqa: F401
+    tables = Base.metadata.tables
+    Base.metadata.create_all(bind, tables=[tables["users"], tables["routes"], tables["buses"]])
+
+
+def create_index(name: str, table: str, columns):
+    if name not in {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(table)}:
+        op.create_index(name, table, columns)
+
+
+def create_postgres_table():
+    op.execute("""
+        CREATE TABLE bus_locations (
+            id BIGSERIAL NOT NULL,
+            bus_id VARCHAR NOT NULL REFERENCES buses (id),
+            latitude DOUBLE PRECISION NOT NULL,
+            longitude DOUBLE PRECISION NOT NULL,
+            speed DOUBLE PRECISION DEFAULT 0,
+            "timestamp" TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, "timestamp")
+        ) PARTITION BY RANGE ("timestamp")
+    """)
+    op.execute('CREATE INDEX ix_bus_locations_bus_id_timestamp ON bus_locations (bus_id, "timestamp")')
+    # Rows arrive in time order, so a BRIN index is tiny and enough for range scans
+    op.execute('CREATE INDEX ix_bus_locations_timestamp ON bus_locations USING brin ("timestamp")')
+    op.execute("CREATE TABLE bus_locations_default PARTITION OF bus_locations DEFAULT")
+    today = datetime.now(timezone.utc).date()
+    for offset in range(-1, PARTITION_DAYS_AHEAD + 1):
+        op.execute(day_partition_sql(today + timedelta(days=offset)))
+
+
+def create_plain_table():
+    op.create_table(
+        "bus_locations",
+        sa.Column("id", sa.BigInteger().with_variant(sa.Integer, "sqlite"), primary_key=True, autoincrement=True),
+        sa.Column("bus_id", sa.String, sa.ForeignKey("buses.id"), nullable=False),
+        sa.Column("latitude", sa.Float, nullable=False),
+        sa.Column("longitude", sa.Float, nullable=False),
+        sa.Column("speed", sa.Float, default=0.0),
+        sa.Column("timestamp", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    create_index("ix_bus_locations_bus_id_timestamp", "bus_locations", ["bus_id", "timestamp"])
+    create_index("ix_bus_locations_timestamp", "bus_locations", ["timestamp"])
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    postgres = bind.dialect.name == "postgresql"
+    create_referenced_tables(bind)
+
+    legacy = "bus_locations" in sa.inspect(bind).get_table_names()
+    if legacy:
+        op.rename_table("bus_locations", "bus_locations_legacy")
+        # Index names are schema-wide; free them for the new table
+        op.execute("DROP INDEX IF EXISTS ix_bus_locations_timestamp")
+        op.execute("DROP INDEX IF EXISTS ix_bus_locations_id")
+        op.execute("DROP INDEX IF EXISTS ix_bus_locations_bus_id_timestamp")
+
+    if postgres:
+        create_postgres_table()
+    else:
+        create_plain_table()
+
+    if legacy:
+        op.execute(
+            f"INSERT INTO bus_locations ({COLUMNS}) "
+            f"SELECT bus_id, latitude, longitude, COALESCE(speed, 0), COALESCE(\"timestamp\", CURRENT_TIMESTAMP) "
+            f"FROM bus_locations_legacy ORDER BY \"timestamp\""
+        )
+        op.drop_table("bus_locations_legacy")
+
+    if "bus_location_rollups" not in sa.inspect(bind).get_table_names():
+        op.create_table(
+            "bus_location_rollups",
+            sa.Column("bus_id", sa.String, sa.ForeignKey("buses.id"), primary_key=True),
+            sa.Column("minute", sa.DateTime(timezone=True), primary_key=True),
+            sa.Column("latitude", sa.Float, nullable=False),
+            sa.Column("longitude", sa.Float, nullable=False),
+            sa.Column("speed", sa.Float, nullable=False),
+            sa.Column("max_speed", sa.Float, nullable=False),
+            sa.Column("samples", sa.Integer, nullable=False),
+        )
+    create_index("ix_bus_location_rollups_minute", "bus_location_rollups", ["minute"])
+
+
+def downgrade() -> None:
+    op.drop_table("bus_location_rollups")
+    op.rename_table("bus_locations", "bus_locations_partitioned")
+    op.execute("DROP INDEX IF EXISTS ix_bus_locations_timestamp")
+    op.execute("DROP INDEX IF EXISTS ix_bus_locations_bus_id_timestamp")
+    op.create_table(
+        "bus_locations",
+        sa.Column("id", sa.String, primary_key=True, index=True),
+        sa.Column("bus_id", sa.String, sa.ForeignKey("buses.id"), nullable=False),
+        sa.Column("latitude", sa.Float, nullable=False),
+        sa.Column("longitude", sa.Float, nullable=False),
+        sa.Column("speed", sa.Float, default=0.0),
+        sa.Column("timestamp", sa.DateTime(timezone=True), server_default=sa.func.now(), index=True),
+    )
+    op.execute(
+        f"INSERT INTO bus_locations (id, {COLUMNS}) "
+        f"SELECT CAST(id AS VARCHAR), {COLUMNS} FROM bus_locations_partitioned"
+    )
+    # Dropping the parent drops its partitions too
+    op.drop_table("bus_locations_partitioned")
@@ -0,0 +1,63 @@
+"""Expense indexes for keyset pagination, plus per-category monthly rollups
+
+Adds (date, id) and (category, date) indexes on expenses and the
+expense_rollups table, filled from the existing ledger. From then on
+`POST /admin/expenses` keeps the rollups up to date in the same
+transaction as each insert.
+
+Revision ID: 0002_expense_rollups
+Revises: 0001_bus_locations
+Create Date: 2024-09-16 08:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_expense_rollups'
+down_revision = '0001_bus_locations'
+branch_labels = None
+depends_on = None
+
+
+def month_sql(dialect: str) -> str:
+    if dialect == "postgresql":
+        # UTC months, as the app computes them; not the session time zone
+        return "date_trunc('month', date AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'"
+    # Same text layout SQLAlchemy stores SQLite datetimes in
+    return "strftime('%Y-%m-01 00:00:00.000000', date)"
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    tables = sa.inspect(bind).get_table_names()
+    if "expenses" not in tables:
+        # Fresh database: `create_all` creates both tables with their indexes
+        return
+
+    op.execute("CREATE INDEX IF NOT EXISTS ix_expenses_date_id ON expenses (date, id)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_expenses_category_date ON expenses (category, date)")
+    if "expense_rollups" in tables:
+        # Created empty by `create_all` on a server started before upgrading
+        op.execute("DELETE FROM expense_rollups")
+    else:
+        op.create_table(
+            "expense_rollups",
+            sa.Column("category", sa.String, primary_key=True),
+            sa.Column("month", sa.DateTime(timezone=True), primary_key=True),
+            sa.Column("total", sa.Float, nullable=False),
+            sa.Column("count", sa.Integer, nullable=False),
+        )
+    month = month_sql(bind.dialect.name)
+    op.execute(
+        f"INSERT INTO expense_rollups (category, month, total, count) "
+        f"SELECT category, {month}, SUM(amount), COUNT(*) FROM expenses "
+        f"WHERE date IS NOT NULL GROUP BY category, {month}"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS expense_rollups")
+    op.execute("DROP INDEX IF EXISTS ix_expenses_category_date")
+    op.execute("DROP INDEX IF EXISTS ix_expenses_date_id")
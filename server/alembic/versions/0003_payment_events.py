@@ -0,0 +1,43 @@
+"""Stripe webhook event queue
+
+Adds payment_events, where `POST /payments/webhook/payment` stores each
+verified event under its Stripe id for PaymentEventProcessor to apply.
+
+Revision ID: 0003_payment_events
+Revises: 0002_expense_rollups
+Create Date: 2024-09-23 08:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_payment_events'
+down_revision = '0002_expense_rollups'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if "payment_events" in sa.inspect(op.get_bind()).get_table_names():
+        # Already created by `create_all`
+        return
+
+    op.create_table(
+        "payment_events",
+        sa.Column("id", sa.String, primary_key=True),
+        sa.Column("type", sa.String, nullable=False),
+        sa.Column("payload", sa.Text, nullable=False),
+        sa.Column("status", sa.String, nullable=False),
+        sa.Column("attempts", sa.Integer, nullable=False),
+        sa.Column("next_attempt_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("last_error", sa.Text),
+        sa.Column("received_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("processed_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_payment_events_status_next_attempt_at", "payment_events", ["status", "next_attempt_at"])
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS payment_events")
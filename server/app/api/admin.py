@@ -1,118 +1,99 @@
-from fastapi import APIRouter, Depends, HTTPException, Response, Header
-from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.core.security import decode_access_token
-from app.models import Expense, User
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
+from app.core.auth import require_admin
+from app.models import Expense
 from app.schemas import ExpenseCreate, ExpenseResponse
+from app.services.expense_export import EXPORT_FORMATS, expense_exporter
+from app.services.expense_summary import (
+    BUCKETS, decode_cursor, encode_cursor, page_query, rollup_upsert, summarize, summary_query,
+)
 from typing import List, Optional
 import uuid
-import pandas as pd
-from io import BytesIO
-from datetime import datetime
+from datetime import datetime, timezone
 
 router = APIRouter()
 
-def get_current_user_id(authorization: Optional[str] = Header(None)):
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    token = authorization.replace("Bearer ", "") if authorization.startswith("Bearer ") else authorization
-    payload = decode_access_token(token)
-    if not payload:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    return payload.get("sub")
-
-def verify_admin(user_id: str, db: Session):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user or user.role != "admin":
-        raise HTTPException(status_code=403, detail="Admin access required")
-    return user
-
 @router.get("/expenses", response_model=List[ExpenseResponse])
 async def get_expenses(
-    db: Session = Depends(get_db),
-    current_user_id: str = Depends(get_current_user_id)
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user_id: str = Depends(require_admin),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to")
 ):
-    verify_admin(current_user_id, db)
-    expenses = db.query(Expense).all()
+    """Expenses oldest first, one page at a time; pass the X-Next-Cursor
+    response header back as `cursor` for the next page"""
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    result = await db.execute(page_query(limit, after, category, start, end))
+    expenses = result.scalars().all()
+    if len(expenses) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(expenses[-1])
     return expenses
 
 @router.post("/expenses", response_model=ExpenseResponse)
 async def create_expense(
     expense_data: ExpenseCreate,
-    db: Session = Depends(get_db),
-    current_user_id: str = Depends(get_current_user_id)
+    db: AsyncSession = Depends(get_async_db),
+    current_user_id: str = Depends(require_admin)
 ):
-    verify_admin(current_user_id, db)
     
     expense = Expense(
         id=str(uuid.uuid4()),
         user_id=current_user_id,
         category=expense_data.category,
         amount=expense_data.amount,
-        description=expense_data.description
+        description=expense_data.description,
+        date=datetime.now(timezone.utc)
     )
     db.add(expense)
-    db.commit()
-    db.refresh(expense)
+    # Same transaction, so the rollup never disagrees with the ledger
+    dialect = db.get_bind().dialect.name
+    await db.execute(rollup_upsert(dialect, expense.category, expense.date, expense.amount))
+    await db.commit()
+    await db.refresh(expense)
     return expense
 
 @router.get("/expenses/export")
 async def export_expenses(
-    db: Session = Depends(get_db),
-    current_user_id: str = Depends(get_current_user_id),
-    format: str = "xlsx"
+    db: AsyncSession = Depends(get_async_db),
+    current_user_id: str = Depends(require_admin),
+    format: str = "xlsx",
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to")
 ):
-    verify_admin(current_user_id, db)
-    
-    expenses = db.query(Expense).all()
-    
-    # Convert to DataFrame
-    data = [{
-        "Category": exp.category,
-        "Amount": exp.amount,
-        "Description": exp.description,
-        "Date": exp.date.isoformat() if exp.date else ""
-    } for exp in expenses]
-    
-    df = pd.DataFrame(data)
+    """Export expenses dated in [from, to), oldest first"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
     
-    # Create file
-    output = BytesIO()
-    if format == "csv":
-        df.to_csv(output, index=False)
-        media_type = "text/csv"
-        filename = "expenses.csv"
-    else:
-        df.to_excel(output, index=False, engine="openpyxl")
-        media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        filename = "expenses.xlsx"
-    
-    output.seek(0)
-    
-    return Response(
-        content=output.read(),
+    media_type, filename = EXPORT_FORMATS[format]
+    body = expense_exporter.csv(start, end) if format == "csv" else expense_exporter.xlsx(start, end)
+    return StreamingResponse(
+        body,
         media_type=media_type,
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 @router.get("/expenses/summary")
 async def get_expense_summary(
-    db: Session = Depends(get_db),
-    current_user_id: str = Depends(get_current_user_id)
+    db: AsyncSession = Depends(get_async_db),
+    current_user_id: str = Depends(require_admin),
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    bucket: Optional[str] = None
 ):
-    verify_admin(current_user_id, db)
-    
-    expenses = db.query(Expense).all()
+    """Totals per category for expenses dated in [from, to), optionally
+    also per month"""
+    if bucket is not None and bucket not in BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of {', '.join(BUCKETS)}")
     
-    # Group by category
-    summary = {}
-    for exp in expenses:
-        if exp.category not in summary:
-            summary[exp.category] = 0
-        summary[exp.category] += exp.amount
-    
-    return {
-        "by_category": summary,
-        "total": sum(summary.values())
-    }
-
+    result = await db.execute(summary_query(db.get_bind().dialect.name, start, end, bucket))
+    return summarize(result.all(), bucket)
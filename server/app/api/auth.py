@@ -1,37 +1,52 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.core.security import verify_password, get_password_hash, create_access_token
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
+from app.core.security import create_access_token
 from app.models import User
-from app.schemas import UserCreate, UserLogin, TokenResponse
+from app.schemas import UserCreate, UserLogin, UserResponse, TokenResponse
+from app.services.password_hasher import PasswordHasherBusy, password_hasher
 import uuid
 
 router = APIRouter()
 
+def auth_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-in attempts, try again shortly",
+        headers={"Retry-After": "1"}
+    )
+
 @router.post("/register", response_model=TokenResponse)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     # Check if user exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+    result = await db.execute(select(User).where(User.email == user_data.email))
+    existing_user = result.scalars().first()
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
+    try:
+        hashed_password = await password_hasher.hash(user_data.password)
+    except PasswordHasherBusy:
+        raise auth_busy()
+    
     # Create user
     user = User(
         id=str(uuid.uuid4()),
         email=user_data.email,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=hashed_password,
         name=user_data.name,
         role="parent"
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     
     # Create token
-    token = create_access_token(data={"sub": user.id, "email": user.email})
+    token = create_access_token(data={"sub": user.id, "email": user.email, "role": user.role})
     
     return TokenResponse(
         token=token,
@@ -44,15 +59,20 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     )
 
 @router.post("/login", response_model=TokenResponse)
-async def login(credentials: UserLogin, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == credentials.email).first()
-    if not user or not verify_password(credentials.password, user.hashed_password):
+async def login(credentials: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(User).where(User.email == credentials.email))
+    user = result.scalars().first()
+    try:
+        valid = user is not None and await password_hasher.verify(credentials.password, user.hashed_password)
+    except PasswordHasherBusy:
+        raise auth_busy()
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
-    token = create_access_token(data={"sub": user.id, "email": user.email})
+    token = create_access_token(data={"sub": user.id, "email": user.email, "role": user.role})
     
     return TokenResponse(
         token=token,
@@ -63,4 +83,3 @@ async def login(credentials: UserLogin, db: Session = Depends(get_db)):
             role=user.role
         )
     )
-
@@ -0,0 +1,97 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import as_utc, get_async_db
+from app.core.auth import get_current_user_id, require_admin
+from app.models import Bus
+from app.schemas import BusEta, BusStatusResponse, StopEtaResponse
+from app.services import bus_history as bus_history_module
+from app.services import route_cache as route_cache_module
+from app.services.bus_state import bus_state
+from app.services.eta import eta_engine
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+router = APIRouter()
+
+# The live endpoints read the in-memory state only; bus_locations is
+# history and is only read by /history
+
+@router.get("/buses/{bus_id}/status", response_model=BusStatusResponse)
+async def get_bus_status(
+    bus_id: str,
+    current_user_id: str = Depends(get_current_user_id)
+):
+    state = bus_state.get(bus_id)
+    if state is None or not state.has_position:
+        raise HTTPException(status_code=404, detail="No live position for this bus")
+    return BusStatusResponse.model_validate(state)
+
+@router.get("/routes/{route_id}/buses", response_model=List[BusStatusResponse])
+async def get_route_buses(
+    route_id: str,
+    current_user_id: str = Depends(get_current_user_id)
+):
+    return [
+        BusStatusResponse.model_validate(state)
+        for state in bus_state.on_route(route_id)
+        if state.has_position
+    ]
+
+@router.get("/routes/{route_id}/eta", response_model=StopEtaResponse)
+async def get_stop_eta(
+    route_id: str,
+    stop_id: str,
+    current_user_id: str = Depends(get_current_user_id)
+):
+    """ETAs to a stop for every live bus on the route that has not passed
+    it yet, soonest first"""
+    geometry = await route_cache_module.route_cache.get(route_id)
+    target = geometry.position_by_stop_id.get(stop_id)
+    if target is None:
+        raise HTTPException(status_code=404, detail="Stop not found on this route")
+    etas = []
+    for state in bus_state.on_route(route_id):
+        if not state.has_position:
+            continue
+        eta = eta_engine.estimate(geometry, state.current_stop_index, state.route_progress_m,
+                                  target, state.speed)
+        if eta is None or eta.stops_away <= 0:
+            continue
+        etas.append(BusEta(bus_id=state.bus_id, stops_away=eta.stops_away, eta_seconds=round(eta.seconds, 1),
+                           eta_minutes=eta.minutes, source=eta.source))
+    etas.sort(key=lambda eta: eta.eta_seconds)
+    return StopEtaResponse(route_id=route_id, stop_id=stop_id, buses=etas)
+
+HISTORY_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "binary": "application/octet-stream"}
+
+@router.get("/buses/{bus_id}/history")
+async def get_bus_history(
+    bus_id: str,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    resolution: str = "raw",
+    tolerance: float = Query(0.0, ge=0, description="Douglas-Peucker tolerance in meters; 0 keeps every point"),
+    format: str = "ndjson",
+    db: AsyncSession = Depends(get_async_db),
+    current_user_id: str = Depends(require_admin)
+):
+    """Stream a bus's track between `from` and `to` (default: the last 24h)
+    in time order. `resolution=minute` reads the per-minute rollups."""
+    if resolution not in bus_history_module.RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {', '.join(bus_history_module.RESOLUTIONS)}")
+    if format not in HISTORY_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(HISTORY_MEDIA_TYPES)}")
+    end = as_utc(end or datetime.now(timezone.utc))
+    start = as_utc(start or end - timedelta(days=1))
+    if start >= end:
+        raise HTTPException(status_code=400, detail="from must be before to")
+    if await db.get(Bus, bus_id) is None:
+        raise HTTPException(status_code=404, detail="Bus not found")
+    
+    # The stream opens its own session: rows are read while the response is
+    # being sent, after this handler has returned
+    return StreamingResponse(
+        bus_history_module.bus_history.encode(bus_id, start, end, resolution, tolerance, format),
+        media_type=HISTORY_MEDIA_TYPES[format],
+    )
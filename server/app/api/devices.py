@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
+from app.core.auth import get_current_user_id
+from app.models import DeviceToken
+from app.schemas import DeviceTokenCreate, DeviceTokenResponse
+from datetime import datetime, timezone
+import uuid
+
+router = APIRouter()
+
+@router.post("/device-tokens", response_model=DeviceTokenResponse)
+async def register_device_token(
+    token_data: DeviceTokenCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user_id: str = Depends(get_current_user_id)
+):
+    # A token belongs to one device; re-registering moves it to the current user
+    result = await db.execute(select(DeviceToken).where(DeviceToken.token == token_data.token))
+    device_token = result.scalar_one_or_none()
+    if device_token:
+        device_token.user_id = current_user_id
+        device_token.platform = token_data.platform or device_token.platform
+        device_token.last_seen_at = datetime.now(timezone.utc)
+    else:
+        device_token = DeviceToken(
+            id=str(uuid.uuid4()),
+            user_id=current_user_id,
+            token=token_data.token,
+            platform=token_data.platform
+        )
+        db.add(device_token)
+    await db.commit()
+    await db.refresh(device_token)
+    return device_token
+
+@router.delete("/device-tokens/{token}")
+async def unregister_device_token(
+    token: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user_id: str = Depends(get_current_user_id)
+):
+    await db.execute(delete(DeviceToken).where(
+        DeviceToken.token == token,
+        DeviceToken.user_id == current_user_id
+    ))
+    await db.commit()
+    return {"status": "success"}
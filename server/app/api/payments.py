@@ -1,39 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Header
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
 from app.core.config import settings
-from app.core.security import decode_access_token
-from app.models import Subscription, Route
+from app.core.auth import get_current_user_id
+from app.models import Route
 from app.schemas import CheckoutSessionCreate
-from typing import Optional
+from app.services.payment_events import HANDLERS, payment_event_processor
+from app.services.stripe_gateway import StripeGatewayBusy, stripe_gateway
 import stripe
-import uuid
-
-stripe.api_key = settings.STRIPE_SECRET_KEY
 
 router = APIRouter()
 
-def get_current_user_id(authorization: Optional[str] = Header(None)):
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    token = authorization.replace("Bearer ", "") if authorization.startswith("Bearer ") else authorization
-    payload = decode_access_token(token)
-    if not payload:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    return payload.get("sub")
-
 @router.post("/create-checkout-session")
 async def create_checkout_session(
     session_data: CheckoutSessionCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user_id: str = Depends(get_current_user_id)
 ):
-    route = db.query(Route).filter(Route.id == session_data.route_id).first()
+    result = await db.execute(select(Route).where(Route.id == session_data.route_id))
+    route = result.scalars().first()
     if not route:
         raise HTTPException(status_code=404, detail="Route not found")
-    
+
     try:
-        checkout_session = stripe.checkout.Session.create(
+        checkout_session = await stripe_gateway.create_checkout_session(
             payment_method_types=["card"],
             line_items=[{
                 "price_data": {
@@ -57,16 +49,24 @@ async def create_checkout_session(
                 "stop_index": str(session_data.stop_index),
             }
         )
-        
+
         return {"url": checkout_session.url}
+    except StripeGatewayBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Payments are busy, try again shortly",
+            headers={"Retry-After": "1"}
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Payment provider timed out")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/webhook/payment")
-async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
+async def stripe_webhook(request: Request, db: AsyncSession = Depends(get_async_db)):
     payload = await request.body()
     sig_header = request.headers.get("stripe-signature")
-    
+
     try:
         event = stripe.Webhook.construct_event(
             payload, sig_header, settings.STRIPE_WEBHOOK_SECRET
@@ -75,21 +75,10 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Invalid payload")
     except stripe.error.SignatureVerificationError:
         raise HTTPException(status_code=400, detail="Invalid signature")
-    
-    if event["type"] == "checkout.session.completed":
-        session = event["data"]["object"]
-        metadata = session.get("metadata", {})
-        
-        # Activate subscription
-        subscription = db.query(Subscription).filter(
-            Subscription.user_id == metadata.get("user_id"),
-            Subscription.route_id == metadata.get("route_id"),
-            Subscription.stop_id == metadata.get("stop_id")
-        ).first()
-        
-        if subscription:
-            subscription.is_active = True
-            db.commit()
-    
-    return {"status": "success"}
 
+    # Stored and applied by the background processor; Stripe redelivers
+    # until it gets a 2xx, and a redelivered event id is a no-op
+    if event["type"] in HANDLERS:
+        await payment_event_processor.store(db, event["id"], event["type"], payload.decode("utf-8"))
+
+    return {"status": "success"}
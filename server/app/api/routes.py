@@ -1,38 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.core.security import decode_access_token
+from fastapi import APIRouter, Depends, HTTPException, Header, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from app.core.database import get_async_db
+from app.core.auth import get_current_user_id
 from app.models import Route, Stop
 from app.schemas import RouteResponse
+from app.services.route_catalogue import CachedBody, etag_matches, route_catalogue
 from typing import List, Optional
 
 router = APIRouter()
 
-def get_current_user_id(authorization: Optional[str] = Header(None)):
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    token = authorization.replace("Bearer ", "") if authorization.startswith("Bearer ") else authorization
-    payload = decode_access_token(token)
-    if not payload:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    return payload.get("sub")
+def cached_response(cached: CachedBody, if_none_match: Optional[str]) -> Response:
+    # private: the catalogue is behind auth; no-cache: always revalidate
+    headers = {"ETag": cached.etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, cached.etag):
+        route_catalogue.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
 
 @router.get("", response_model=List[RouteResponse])
 async def get_routes(
-    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
     current_user_id: str = Depends(get_current_user_id)
 ):
-    routes = db.query(Route).all()
-    return routes
+    catalogue = await route_catalogue.get()
+    return cached_response(catalogue.routes, if_none_match)
 
 @router.get("/{route_id}", response_model=RouteResponse)
 async def get_route(
     route_id: str,
-    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
     current_user_id: str = Depends(get_current_user_id)
 ):
-    route = db.query(Route).filter(Route.id == route_id).first()
+    catalogue = await route_catalogue.get()
+    cached = catalogue.by_id.get(route_id)
+    if cached is not None:
+        return cached_response(cached, if_none_match)
+
+    # Not in the snapshot; it may have been added by another process
+    result = await db.execute(
+        select(Route).options(selectinload(Route.stops)).where(Route.id == route_id)
+    )
+    route = result.scalar_one_or_none()
     if not route:
         raise HTTPException(status_code=404, detail="Route not found")
     return route
-
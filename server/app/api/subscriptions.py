@@ -1,40 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.core.security import decode_access_token
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
+from app.core.auth import get_current_user_id
 from app.models import Subscription, Route, Stop
 from app.schemas import SubscriptionCreate, SubscriptionResponse
-from typing import Optional
+from app.services.subscription_index import subscription_index
 import uuid
 
 router = APIRouter()
 
-def get_current_user_id(authorization: Optional[str] = Header(None)):
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    token = authorization.replace("Bearer ", "") if authorization.startswith("Bearer ") else authorization
-    payload = decode_access_token(token)
-    if not payload:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    return payload.get("sub")
-
 @router.post("/{route_id}/subscribe", response_model=SubscriptionResponse)
 async def subscribe_to_route(
     route_id: str,
     subscription_data: SubscriptionCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user_id: str = Depends(get_current_user_id)
 ):
     # Verify route exists
-    route = db.query(Route).filter(Route.id == route_id).first()
+    route = await db.get(Route, route_id)
     if not route:
         raise HTTPException(status_code=404, detail="Route not found")
     
     # Verify stop exists and belongs to route
-    stop = db.query(Stop).filter(
+    result = await db.execute(select(Stop).where(
         Stop.id == subscription_data.stop_id,
         Stop.route_id == route_id
-    ).first()
+    ))
+    stop = result.scalar_one_or_none()
     if not stop:
         raise HTTPException(status_code=404, detail="Stop not found")
     
@@ -49,8 +42,9 @@ async def subscribe_to_route(
         notifications_enabled=True
     )
     db.add(subscription)
-    db.commit()
-    db.refresh(subscription)
+    await db.commit()
+    await db.refresh(subscription)
+    subscription_index.upsert(subscription)
     
     return subscription
 
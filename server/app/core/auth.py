@@ -0,0 +1,185 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import Depends, Header, HTTPException
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
+from app.core.config import settings
+from app.core.database import get_async_db
+from app.core.security import decode_access_token
+from app.core.state_channel import state_channel
+from app.models import User
+
+
+class TokenCache:
+    """Bounded LRU of verified JWT claims keyed by the raw token.
+
+    A hit skips signature verification entirely; entries are dropped once
+    the token's `exp` passes, so an expired token is never accepted from
+    the cache. Invalid tokens are not cached.
+    """
+
+    def __init__(self, maxsize: int = 10000, decode=decode_access_token):
+        self.maxsize = maxsize
+        self._decode = decode
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def claims(self, token: str) -> Optional[dict]:
+        """Verified claims for `token`, or None if it is invalid or expired."""
+        entry = self._entries.get(token)
+        if entry is not None:
+            claims, expires_at = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return claims
+            del self._entries[token]
+
+        self.misses += 1
+        claims = self._decode(token)
+        if claims is None or self.maxsize <= 0 or "exp" not in claims:
+            return claims
+        self._entries[token] = (claims, float(claims["exp"]))
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return claims
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"tokens": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions}
+
+
+class RoleCache:
+    """User id -> role, so admin checks do not query users on every request.
+
+    Entries drop whenever a User row is committed through the ORM, on this
+    worker and on the others, and expire after `ttl` seconds as a fallback
+    for changes made outside the API.
+    """
+
+    def __init__(self, ttl: float = 60.0, maxsize: int = 10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def role(self, user_id: str, db: AsyncSession) -> Optional[str]:
+        """The user's role, or None if there is no such user."""
+        entry = self._entries.get(user_id)
+        if entry is not None and (self.ttl <= 0 or time.monotonic() - entry[1] < self.ttl):
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        user = await db.get(User, user_id)
+        role = user.role if user else None
+        self._entries[user_id] = (role, time.monotonic())
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return role
+
+    def invalidate(self, user_id: Optional[str] = None):
+        """Drop one user, or everything when `user_id` is None."""
+        if user_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        return {"users": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache(maxsize=settings.AUTH_TOKEN_CACHE_SIZE)
+role_cache = RoleCache(ttl=settings.AUTH_ROLE_CACHE_TTL_SECONDS, maxsize=settings.AUTH_ROLE_CACHE_SIZE)
+
+
+def bearer_token(authorization: str) -> str:
+    return authorization[len("Bearer "):] if authorization.startswith("Bearer ") else authorization
+
+
+async def get_current_claims(authorization: Optional[str] = Header(None)) -> dict:
+    if not authorization:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    claims = token_cache.claims(bearer_token(authorization))
+    if not claims:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return claims
+
+
+async def get_current_user_id(claims: dict = Depends(get_current_claims)) -> str:
+    return claims.get("sub")
+
+
+async def verify_admin(user_id: str, db: AsyncSession, token_role: Optional[str] = None):
+    # A token minted for a non-admin is refused without a lookup; an admin
+    # token is still checked against the current role, so a demotion takes
+    # effect before the token expires
+    if token_role is not None and token_role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    if await role_cache.role(user_id, db) != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+
+async def require_admin(
+    claims: dict = Depends(get_current_claims),
+    db: AsyncSession = Depends(get_async_db)
+) -> str:
+    """Dependency: the current user's id, or 403 unless they are an admin."""
+    user_id = claims.get("sub")
+    await verify_admin(user_id, db, claims.get("role"))
+    return user_id
+
+
+async def require_metrics_access(
+    authorization: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Dependency for `/metrics`: admins only, unless METRICS_PUBLIC is set
+    (e.g. for a local load test)."""
+    if settings.METRICS_PUBLIC:
+        return
+    claims = await get_current_claims(authorization)
+    await verify_admin(claims.get("sub"), db, claims.get("role"))
+
+
+# Invalidation: remember which users a session touched and drop their roles
+# once the transaction commits, here and (via the state channel) on the other
+# workers.
+_DIRTY_KEY = "role_cache_dirty"
+
+
+def _mark_user_dirty(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_DIRTY_KEY, set()).add(target.id)
+
+
+for _event_name in ("after_insert", "after_update", "after_delete"):
+    event.listen(User, _event_name, _mark_user_dirty)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session):
+    for user_id in session.info.pop(_DIRTY_KEY, ()):
+        role_cache.invalidate(user_id)
+        state_channel.publish("roles:invalidate", user_id=user_id)
+
+
+state_channel.on("roles:invalidate", lambda change: role_cache.invalidate(change["user_id"]))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_dirty_users(session):
+    session.info.pop(_DIRTY_KEY, None)
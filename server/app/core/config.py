@@ -3,20 +3,112 @@ from typing import List
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    # Defaults to DATABASE_URL with the asyncpg/aiosqlite driver
+    ASYNC_DATABASE_URL: str = ""
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
     JWT_SECRET: str
     JWT_ALGORITHM: str = "HS256"
     JWT_EXPIRATION_HOURS: int = 24
+    # Verified token claims are cached until the token's exp; admin roles
+    # for AUTH_ROLE_CACHE_TTL_SECONDS or until the user row changes
+    AUTH_TOKEN_CACHE_SIZE: int = 10000
+    AUTH_ROLE_CACHE_SIZE: int = 10000
+    AUTH_ROLE_CACHE_TTL_SECONDS: float = 60.0
+    
+    # bcrypt runs in a bounded thread pool off the event loop
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 256
     
     STRIPE_SECRET_KEY: str
     STRIPE_PUBLISHABLE_KEY: str
     STRIPE_WEBHOOK_SECRET: str = ""
+    STRIPE_API_BASE: str = ""  # override, e.g. a local Stripe stub
+    # Stripe SDK calls run in a bounded thread pool off the event loop
+    STRIPE_WORKERS: int = 8
+    STRIPE_MAX_PENDING: int = 256
+    STRIPE_TIMEOUT_SECONDS: float = 10.0
+    # Webhook events are stored, then applied by a background worker
+    PAYMENT_EVENT_POLL_SECONDS: float = 5.0
+    PAYMENT_EVENT_BATCH_SIZE: int = 100
+    PAYMENT_EVENT_MAX_ATTEMPTS: int = 8
+    PAYMENT_EVENT_RETRY_BASE_SECONDS: float = 5.0
     
     FCM_SERVER_KEY: str = ""
+    FCM_ENDPOINT: str = ""  # override, e.g. a local fake FCM server
+    PUSH_QUEUE_SIZE: int = 10000
+    PUSH_BATCH_SIZE: int = 500
+    PUSH_WORKERS: int = 4
+    PUSH_MAX_RETRIES: int = 4
+    PUSH_RETRY_BASE_SECONDS: float = 1.0
     
     ALLOWED_ORIGINS: str = "http://localhost:3000"
     
+    # Socket.IO client manager: memory (single worker), redis or postgres
+    # (LISTEN/NOTIFY) to share rooms and live bus state across workers
+    SOCKETIO_MANAGER: str = "memory"
+    SOCKETIO_MESSAGE_QUEUE_URL: str = ""  # redis URL; postgres defaults to DATABASE_URL
+    SOCKETIO_CHANNEL: str = "bustrackr"
+    # Connect admission: token bucket per worker (0 = unlimited); refused
+    # clients get a jittered retryAfter in their connect_error
+    SOCKETIO_CONNECT_RATE: float = 200.0
+    SOCKETIO_CONNECT_BURST: int = 400
+    SOCKETIO_CONNECT_RETRY_JITTER_SECONDS: float = 2.0
+    # connect/subscribe/disconnect log lines: one in N per event kind
+    SOCKETIO_LOG_SAMPLE_EVERY: int = 100
+    
+    # bus:update coalescing: at most one update per bus per interval and
+    # room kind (0 = send every ping immediately)
+    FANOUT_ROUTE_INTERVAL_SECONDS: float = 2.0
+    FANOUT_BUS_INTERVAL_SECONDS: float = 1.0
+    # Compact bus:update format: a full keyframe every N updates per room
+    COMPACT_KEYFRAME_INTERVAL: int = 20
+    
     HOST: str = "0.0.0.0"
     PORT: int = 8000
+    # GET /metrics is admin-only unless this is set
+    METRICS_PUBLIC: bool = False
+    
+    # Telemetry ingestion (bus_update -> bus_locations)
+    TELEMETRY_QUEUE_SIZE: int = 10000
+    TELEMETRY_BATCH_SIZE: int = 500
+    TELEMETRY_FLUSH_INTERVAL_SECONDS: float = 1.0
+    
+    # GPS history: raw rows kept this many days, per-minute rollups longer;
+    # the maintenance job also creates daily Postgres partitions in advance
+    LOCATION_RETENTION_DAYS: int = 30
+    LOCATION_ROLLUP_RETENTION_DAYS: int = 365
+    LOCATION_PARTITION_DAYS_AHEAD: int = 7
+    LOCATION_ROLLUP_DELAY_SECONDS: float = 120.0
+    LOCATION_ROLLUP_LOOKBACK_MINUTES: int = 15
+    LOCATION_MAINTENANCE_INTERVAL_SECONDS: float = 300.0
+    
+    # Route geometry cache; entries also drop on Route/Stop commits
+    ROUTE_CACHE_TTL_SECONDS: float = 300.0
+    
+    # Server-side stop arrival detection
+    ROUTE_PROGRESS_WINDOW: int = 3
+    STOP_ARRIVAL_RADIUS_M: float = 50.0
+    OFF_ROUTE_DISTANCE_M: float = 250.0
+    ROUTE_PROGRESS_RESEED_AFTER: int = 5
+    
+    # ETA model: per-segment travel times by time of day (weekday/weekend
+    # buckets in ETA_TIMEZONE), learned from bus_locations
+    ETA_REFRESH_INTERVAL_SECONDS: float = 600.0
+    ETA_HISTORY_DAYS: int = 14
+    ETA_BUCKET_MINUTES: int = 15
+    ETA_TIMEZONE: str = "UTC"
+    ETA_DEFAULT_SPEED_KMH: float = 20.0
+    
+    # Alert subscription index; periodic reload picks up writes made outside the API
+    SUBSCRIPTION_INDEX_REFRESH_SECONDS: float = 300.0
+    
+    # Upcoming-stop alert deduplication
+    ALERT_LEDGER_MAX_BUSES: int = 10000
+    ALERT_LEDGER_MAX_PER_TRIP: int = 5000
     
     @property
     def ALLOWED_ORIGINS_LIST(self) -> List[str]:
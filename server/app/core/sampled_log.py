@@ -0,0 +1,29 @@
+import logging
+from collections import Counter
+
+
+class SampledLogger:
+    """Structured logging for high-volume events, one record in `every`.
+
+    Each call counts the event; every `every`-th occurrence of that event
+    name is logged as `event key=value ...` with the fields (and the running
+    count) also attached to the record as `extra`, for JSON formatters.
+    `every=1` logs everything; counts are always exact in `stats()`.
+    """
+
+    def __init__(self, logger: logging.Logger, every: int = 100):
+        self.logger = logger
+        self.every = max(every, 1)
+        self.counts: Counter = Counter()
+
+    def event(self, name: str, level: int = logging.INFO, **fields):
+        self.counts[name] += 1
+        count = self.counts[name]
+        if (count - 1) % self.every or not self.logger.isEnabledFor(level):
+            return
+        fields["count"] = count
+        message = " ".join(f"{key}={value}" for key, value in fields.items())
+        self.logger.log(level, "%s %s", name, message, extra={"event": name, "fields": fields})
+
+    def stats(self) -> dict:
+        return dict(self.counts)
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StateChannel:
+    """Cache invalidations and index updates shared between workers.
+
+    Attached to a Socket.IO client manager that can replicate state (redis,
+    postgres, inprocess), `publish(op, **data)` sends `{"op": op, ...}` to
+    every other worker, where the callbacks registered with `on(op, ...)`
+    apply it to their local copy. Receivers must not publish again. With
+    the memory manager there are no other workers and publishing is a no-op.
+
+    `publish` is synchronous so commit hooks can call it; from a thread
+    without a running loop (sync sessions in the threadpool) the message is
+    handed to the loop captured by `start()`. Messages leave in order.
+    """
+
+    def __init__(self):
+        self._manager = None
+        self._handlers: Dict[str, List[Callable[[dict], None]]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._outbox: deque = deque()
+        self._sender: Optional[asyncio.Task] = None
+        self.published = 0
+        self.received = 0
+        self.failed = 0
+
+    def attach(self, manager):
+        """Replicate through `manager` if it supports it."""
+        if manager is not None and hasattr(manager, "publish_state"):
+            self._manager = manager
+            manager.on_state(self._apply)
+
+    @property
+    def shared(self) -> bool:
+        return self._manager is not None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+
+    def on(self, op: str, callback: Callable[[dict], None]):
+        self._handlers.setdefault(op, []).append(callback)
+
+    def publish(self, op: str, **data):
+        if self._manager is None:
+            return
+        payload = {"op": op, **data}
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            if self._loop is None or self._loop.is_closed():
+                self.failed += 1
+                return
+            self._loop.call_soon_threadsafe(self._enqueue, payload)
+        else:
+            self._enqueue(payload)
+
+    def _enqueue(self, payload: dict):
+        self._outbox.append(payload)
+        if self._sender is None or self._sender.done():
+            self._sender = asyncio.get_running_loop().create_task(self._send())
+
+    async def _send(self):
+        while self._outbox:
+            payload = self._outbox.popleft()
+            try:
+                await self._manager.publish_state(payload)
+                self.published += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("Failed to publish %s", payload.get("op"))
+
+    async def _apply(self, payload: dict):
+        handlers = self._handlers.get(payload.get("op"))
+        if not handlers:
+            return
+        self.received += 1
+        for handler in handlers:
+            handler(payload)
+
+    def stats(self) -> dict:
+        return {
+            "shared": self.shared,
+            "published": self.published,
+            "received": self.received,
+            "failed": self.failed,
+        }
+
+
+state_channel = StateChannel()
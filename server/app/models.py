@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import BigInteger, Column, String, Integer, Float, Boolean, DateTime, ForeignKey, Index, Text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -15,6 +15,19 @@ class User(Base):
     
     subscriptions = relationship("Subscription", back_populates="user")
     expenses = relationship("Expense", back_populates="user")
+    device_tokens = relationship("DeviceToken", back_populates="user")
+
+class DeviceToken(Base):
+    __tablename__ = "device_tokens"
+    
+    id = Column(String, primary_key=True, index=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
+    token = Column(String, unique=True, index=True, nullable=False)
+    platform = Column(String)  # ios, android
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_seen_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    user = relationship("User", back_populates="device_tokens")
 
 class Route(Base):
     __tablename__ = "routes"
@@ -81,6 +94,25 @@ class Subscription(Base):
     route = relationship("Route", back_populates="subscriptions")
     stop = relationship("Stop", back_populates="subscriptions")
 
+class PaymentEvent(Base):
+    # Stripe webhook events, keyed by Stripe's event id so a redelivered
+    # event is a no-op; processed by PaymentEventProcessor
+    __tablename__ = "payment_events"
+    
+    id = Column(String, primary_key=True)
+    type = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending, processed, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    last_error = Column(Text)
+    received_at = Column(DateTime(timezone=True), server_default=func.now())
+    processed_at = Column(DateTime(timezone=True))
+    
+    __table_args__ = (
+        Index("ix_payment_events_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
 class Expense(Base):
     __tablename__ = "expenses"
     
@@ -92,16 +124,57 @@ class Expense(Base):
     date = Column(DateTime(timezone=True), server_default=func.now())
     
     user = relationship("User", back_populates="expenses")
+    
+    __table_args__ = (
+        # Keyset pagination walks (date, id); per-category listings and
+        # summaries over a date range use (category, date)
+        Index("ix_expenses_date_id", "date", "id"),
+        Index("ix_expenses_category_date", "category", "date"),
+    )
+
+class ExpenseRollup(Base):
+    # Per-category monthly totals, updated in the same transaction as each
+    # new expense; `month` is the first instant of the month in UTC
+    __tablename__ = "expense_rollups"
+    
+    category = Column(String, primary_key=True)
+    month = Column(DateTime(timezone=True), primary_key=True)
+    total = Column(Float, nullable=False, default=0.0)
+    count = Column(Integer, nullable=False, default=0)
 
 class BusLocation(Base):
+    # Raw GPS history. On Postgres the Alembic migration creates this table
+    # partitioned by day on `timestamp` (primary key (id, timestamp)); see
+    # app/services/location_maintenance.py for partition upkeep and retention
     __tablename__ = "bus_locations"
     
-    id = Column(String, primary_key=True, index=True)
+    # Sequential key: appends stay at the right edge of the index
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
     bus_id = Column(String, ForeignKey("buses.id"), nullable=False)
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
     speed = Column(Float, default=0.0)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
     
     bus = relationship("Bus", back_populates="locations")
+    
+    __table_args__ = (
+        Index("ix_bus_locations_bus_id_timestamp", "bus_id", "timestamp"),
+    )
+
+class BusLocationRollup(Base):
+    # One averaged point per bus per minute, kept much longer than raw rows
+    __tablename__ = "bus_location_rollups"
+    
+    bus_id = Column(String, ForeignKey("buses.id"), primary_key=True)
+    minute = Column(DateTime(timezone=True), primary_key=True)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    speed = Column(Float, nullable=False)
+    max_speed = Column(Float, nullable=False)
+    samples = Column(Integer, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_bus_location_rollups_minute", "minute"),
+    )
 
@@ -25,6 +25,18 @@ class TokenResponse(BaseModel):
     token: str
     user: UserResponse
 
+class DeviceTokenCreate(BaseModel):
+    token: str
+    platform: Optional[str] = None
+
+class DeviceTokenResponse(BaseModel):
+    id: str
+    token: str
+    platform: Optional[str]
+    
+    class Config:
+        from_attributes = True
+
 # Routes
 class StopCreate(BaseModel):
     name: str
@@ -91,6 +103,18 @@ class BusStatusResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class BusEta(BaseModel):
+    bus_id: str
+    stops_away: int
+    eta_seconds: float
+    eta_minutes: int
+    source: str  # history (learned segment times) or distance
+
+class StopEtaResponse(BaseModel):
+    route_id: str
+    stop_id: str
+    buses: List[BusEta]
+
 # Expenses
 class ExpenseCreate(BaseModel):
     category: str
@@ -0,0 +1,69 @@
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from app.core.config import settings
+
+
+class AlertLedger:
+    """Remember which upcoming-stop alerts were already sent on a bus trip.
+
+    Guarantees at most one alert per subscription per (bus, trip). A bus's
+    entry is replaced when it starts a new trip and cleared when it
+    completes one or reconnects. Memory is bounded: the least recently
+    active buses are evicted beyond `max_buses`, and a single trip records
+    at most `max_alerts_per_trip` subscriptions. Past that the oldest
+    claims of the trip are forgotten first; they belong to stops the bus
+    has already passed, so they are the least likely to be claimed again.
+    """
+
+    def __init__(self, max_buses: int = 10000, max_alerts_per_trip: int = 5000):
+        self.max_buses = max_buses
+        self.max_alerts_per_trip = max_alerts_per_trip
+        # bus_id -> (trip, subscription ids in claim order)
+        self._trips: "OrderedDict[str, Tuple[int, Dict[str, None]]]" = OrderedDict()
+        self.sent = 0
+        self.suppressed = 0
+        self.evicted = 0
+        self.forgotten = 0
+
+    def claim(self, bus_id: str, trip: int, subscription_id: str) -> bool:
+        """Return True if the alert should be sent, False if it is a duplicate."""
+        entry = self._trips.get(bus_id)
+        if entry is None or entry[0] != trip:
+            entry = (trip, {})
+            self._trips[bus_id] = entry
+        self._trips.move_to_end(bus_id)
+
+        alerted = entry[1]
+        if subscription_id in alerted:
+            self.suppressed += 1
+            return False
+        alerted[subscription_id] = None
+        if len(alerted) > self.max_alerts_per_trip:
+            del alerted[next(iter(alerted))]
+            self.forgotten += 1
+        self.sent += 1
+
+        while len(self._trips) > self.max_buses:
+            self._trips.popitem(last=False)
+            self.evicted += 1
+        return True
+
+    def reset(self, bus_id: str):
+        """Forget a bus's trip, e.g. on route completion or reconnect."""
+        self._trips.pop(bus_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "buses": len(self._trips),
+            "sent": self.sent,
+            "suppressed": self.suppressed,
+            "evicted": self.evicted,
+            "forgotten": self.forgotten,
+        }
+
+
+alert_ledger = AlertLedger(
+    max_buses=settings.ALERT_LEDGER_MAX_BUSES,
+    max_alerts_per_trip=settings.ALERT_LEDGER_MAX_PER_TRIP,
+)
@@ -0,0 +1,137 @@
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Type
+
+
+class ExecutorBusy(Exception):
+    """Raised when too many calls are already waiting for a thread."""
+
+
+class BoundedExecutor:
+    """Run blocking calls off the event loop in a small, bounded thread pool.
+
+    At most `workers` calls run at once; up to `max_pending` more wait for a
+    slot, and beyond that `run` fails fast with `busy` (an `ExecutorBusy`
+    subclass) instead of queueing without bound. A slot is released when
+    the thread returns, not when the caller stops waiting, so callers that
+    give up (e.g. on a timeout) never push the pool past `workers`. After
+    `stop`, calls already running finish and new or still-waiting ones get
+    `busy`. Queue and run times are kept for `stats`.
+    """
+
+    def __init__(self, workers: int, max_pending: int, thread_name_prefix: str,
+                 busy: Type[ExecutorBusy] = ExecutorBusy, sample_size: int = 1024):
+        self.workers = max(workers, 1)
+        self.max_pending = max_pending
+        self.thread_name_prefix = thread_name_prefix
+        self.busy = busy
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._closed = False
+        self._queue_ms = deque(maxlen=sample_size)
+        self._run_ms = deque(maxlen=sample_size)
+
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.max_queue_ms = 0.0
+
+    @property
+    def started(self) -> bool:
+        return self._executor is not None
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def start(self):
+        self._closed = False
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                thread_name_prefix=self.thread_name_prefix)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+
+    def stop(self):
+        # The semaphore stays: calls in flight still release their slot
+        self._closed = True
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def run(self, func, *args):
+        if self._executor is None and not self._closed:
+            self.start()
+        if self._closed or self.pending >= self.max_pending:
+            self.rejected += 1
+            raise self.busy()
+
+        queued = time.perf_counter()
+        self.pending += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.pending -= 1
+        if self._closed:
+            self._slots.release()
+            self.rejected += 1
+            raise self.busy()
+        started = time.perf_counter()
+        self._record_queue((started - queued) * 1000)
+
+        self.running += 1
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(self._executor, func, *args)
+        except BaseException:
+            self._finished(started, None)
+            raise
+        future.add_done_callback(lambda done: self._finished(started, done))
+        # Shielded: a caller that gives up leaves the slot taken until the
+        # thread returns
+        try:
+            result = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        self.completed += 1
+        return result
+
+    def _finished(self, started: float, future: Optional[asyncio.Future]):
+        self.running -= 1
+        self._slots.release()
+        self._run_ms.append((time.perf_counter() - started) * 1000)
+        if future is not None and not future.cancelled():
+            future.exception()  # retrieved here when the caller gave up
+
+    def _record_queue(self, elapsed_ms: float):
+        self._queue_ms.append(elapsed_ms)
+        self.max_queue_ms = max(self.max_queue_ms, elapsed_ms)
+
+    @staticmethod
+    def _percentile(samples, fraction: float) -> float:
+        if not samples:
+            return 0.0
+        ordered = sorted(samples)
+        return round(ordered[min(int(len(ordered) * fraction), len(ordered) - 1)], 3)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "queue_ms_p50": self._percentile(self._queue_ms, 0.50),
+            "queue_ms_p99": self._percentile(self._queue_ms, 0.99),
+            "max_queue_ms": round(self.max_queue_ms, 3),
+            "run_ms_p50": self._percentile(self._run_ms, 0.50),
+            "run_ms_p99": self._percentile(self._run_ms, 0.99),
+        }
@@ -0,0 +1,163 @@
+import json
+import math
+import struct
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, NamedTuple
+
+import numpy as np
+from sqlalchemy import select
+from app.core.database import AsyncSessionLocal, as_utc
+from app.models import BusLocation, BusLocationRollup
+
+RESOLUTIONS = ("raw", "minute")
+FORMATS = ("ndjson", "binary")
+
+# Binary format: BINARY_MAGIC, then one little-endian record per point:
+# int64 epoch milliseconds, int32 lat and lng in microdegrees, uint16 speed
+# in tenths
+BINARY_MAGIC = b"BTH1"
+BINARY_RECORD = struct.Struct("<qiiH")
+MICRODEGREES = 1_000_000
+
+
+class HistoryPoint(NamedTuple):
+    timestamp: datetime
+    lat: float
+    lng: float
+    speed: float
+
+
+def simplify(points: List[HistoryPoint], tolerance_m: float) -> List[HistoryPoint]:
+    """Douglas-Peucker: drop points within `tolerance_m` of the simplified
+    line. The first and last points are always kept."""
+    if tolerance_m <= 0 or len(points) < 3:
+        return points
+    lats = np.fromiter((p.lat for p in points), float, len(points))
+    lngs = np.fromiter((p.lng for p in points), float, len(points))
+    # Local equirectangular plane in meters, as in StopLocator
+    ys = lats * 110_540.0
+    xs = lngs * 111_320.0 * math.cos(math.radians(lats[0]))
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        dx, dy = xs[last] - xs[first], ys[last] - ys[first]
+        px, py = xs[first + 1:last] - xs[first], ys[first + 1:last] - ys[first]
+        length_sq = dx * dx + dy * dy
+        if length_sq == 0:
+            distances = np.hypot(px, py)
+        else:
+            # Distance to the segment (not the infinite line), so a bus
+            # doubling back is not simplified away
+            t = np.clip((px * dx + py * dy) / length_sq, 0.0, 1.0)
+            distances = np.hypot(px - t * dx, py - t * dy)
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance_m:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def ndjson_line(point: HistoryPoint) -> bytes:
+    return (json.dumps({
+        "timestamp": as_utc(point.timestamp).isoformat(),
+        "lat": point.lat,
+        "lng": point.lng,
+        "speed": point.speed,
+    }) + "\n").encode()
+
+
+def binary_record(point: HistoryPoint) -> bytes:
+    return BINARY_RECORD.pack(
+        int(as_utc(point.timestamp).timestamp() * 1000),
+        round(point.lat * MICRODEGREES),
+        round(point.lng * MICRODEGREES),
+        min(max(round(point.speed * 10), 0), 0xFFFF),
+    )
+
+
+def decode_binary(body: bytes) -> List[HistoryPoint]:
+    """Reference decoder for the binary format."""
+    if body[:len(BINARY_MAGIC)] != BINARY_MAGIC:
+        raise ValueError("Not a bus history stream")
+    return [
+        HistoryPoint(datetime.fromtimestamp(ms / 1000, timezone.utc), lat / MICRODEGREES,
+                     lng / MICRODEGREES, speed / 10)
+        for ms, lat, lng, speed in BINARY_RECORD.iter_unpack(body[len(BINARY_MAGIC):])
+    ]
+
+
+class BusHistory:
+    """Streams a bus's GPS track without materializing it.
+
+    Rows come through a server-side cursor (`yield_per` at a time) as plain
+    tuples, never ORM objects. With a tolerance, Douglas-Peucker runs over
+    chunks of `chunk_size` points; each chunk's last point is kept and
+    starts the next chunk, so every dropped point is still within the
+    tolerance of the output and memory stays bounded by the chunk.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal, yield_per: int = 2000, chunk_size: int = 5000):
+        self.session_factory = session_factory
+        self.yield_per = yield_per
+        self.chunk_size = chunk_size
+
+    def query(self, bus_id: str, start: datetime, end: datetime, resolution: str):
+        if resolution == "minute":
+            # Pre-aggregated by LocationMaintenance; one point per minute
+            model, at = BusLocationRollup, BusLocationRollup.minute
+        else:
+            model, at = BusLocation, BusLocation.timestamp
+        return select(at, model.latitude, model.longitude, model.speed).where(
+            model.bus_id == bus_id, at >= start, at < end,
+        ).order_by(at)
+
+    async def points(self, bus_id: str, start: datetime, end: datetime,
+                     resolution: str = "raw") -> AsyncIterator[HistoryPoint]:
+        stmt = self.query(bus_id, start, end, resolution).execution_options(yield_per=self.yield_per)
+        async with self.session_factory() as db:
+            result = await db.stream(stmt)
+            async for rows in result.partitions():
+                for timestamp, lat, lng, speed in rows:
+                    yield HistoryPoint(timestamp, lat, lng, speed or 0.0)
+
+    async def track(self, bus_id: str, start: datetime, end: datetime, resolution: str = "raw",
+                    tolerance_m: float = 0.0) -> AsyncIterator[HistoryPoint]:
+        points = self.points(bus_id, start, end, resolution)
+        if tolerance_m <= 0:
+            async for point in points:
+                yield point
+            return
+        chunk: List[HistoryPoint] = []
+        async for point in points:
+            chunk.append(point)
+            if len(chunk) >= self.chunk_size:
+                simplified = simplify(chunk, tolerance_m)
+                for kept in simplified[:-1]:
+                    yield kept
+                chunk = [simplified[-1]]
+        for kept in simplify(chunk, tolerance_m):
+            yield kept
+
+    async def encode(self, bus_id: str, start: datetime, end: datetime, resolution: str = "raw",
+                     tolerance_m: float = 0.0, fmt: str = "ndjson",
+                     batch_bytes: int = 64 * 1024) -> AsyncIterator[bytes]:
+        """Encoded response body in pieces of about `batch_bytes`."""
+        encode = binary_record if fmt == "binary" else ndjson_line
+        buffer = bytearray(BINARY_MAGIC if fmt == "binary" else b"")
+        async for point in self.track(bus_id, start, end, resolution, tolerance_m):
+            buffer += encode(point)
+            if len(buffer) >= batch_bytes:
+                yield bytes(buffer)
+                buffer.clear()
+        if buffer:
+            yield bytes(buffer)
+
+
+bus_history = BusHistory()
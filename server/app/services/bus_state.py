@@ -0,0 +1,151 @@
+import logging
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class BusState:
+    """Last known state of one bus; fixed fields, no per-instance dict."""
+
+    __slots__ = ("bus_id", "route_id", "sid", "lat", "lng", "speed", "updated_at",
+                 "current_stop_index", "route_progress_m", "seq")
+
+    def __init__(self, bus_id: str):
+        self.bus_id = bus_id
+        self.route_id: Optional[str] = None
+        self.sid: Optional[str] = None
+        self.lat: Optional[float] = None
+        self.lng: Optional[float] = None
+        self.speed = 0.0
+        self.updated_at: Optional[float] = None  # epoch seconds of the last ping
+        self.current_stop_index = 0
+        self.route_progress_m = 0.0
+        self.seq = 0  # bumped on every position update; lets clients drop stale ones
+
+    @property
+    def id(self) -> str:
+        return self.bus_id
+
+    @property
+    def has_position(self) -> bool:
+        return self.lat is not None and self.lng is not None
+
+    @property
+    def current_location(self) -> dict:
+        return {"lat": self.lat, "lng": self.lng}
+
+    @property
+    def last_update(self) -> Optional[datetime]:
+        if self.updated_at is None:
+            return None
+        return datetime.fromtimestamp(self.updated_at, timezone.utc)
+
+
+class BusStateStore:
+    """Live state of every connected bus, keyed by bus id.
+
+    Each worker keeps the whole table in memory, so reads (including the
+    per-route listing) are O(1) dict lookups that never touch the database.
+    Writes are applied locally and, when the Socket.IO client manager can
+    replicate state (redis, postgres, inprocess), published on its channel;
+    the other workers apply them to their own copy. A bus's pings always
+    land on one worker, so there is a single writer per bus, and its entry
+    is removed when that bus disconnects.
+    """
+
+    def __init__(self):
+        self._buses: Dict[str, BusState] = {}
+        self._routes: Dict[str, Set[str]] = {}  # route id -> bus ids
+        self._manager = None
+        self._listeners: List[Callable[[str], None]] = []
+        self.published = 0
+        self.received = 0
+
+    def attach(self, manager):
+        """Replicate through `manager` if it supports it."""
+        if manager is not None and hasattr(manager, "publish_state"):
+            self._manager = manager
+            manager.on_state(self.apply)
+
+    def add_listener(self, callback: Callable[[str], None]):
+        """Call `callback(bus_id)` whenever a bus is removed, locally or by
+        another worker."""
+        self._listeners.append(callback)
+
+    @property
+    def shared(self) -> bool:
+        return self._manager is not None
+
+    def get(self, bus_id: str) -> Optional[BusState]:
+        return self._buses.get(bus_id)
+
+    def on_route(self, route_id: str) -> List[BusState]:
+        return [self._buses[bus_id] for bus_id in self._routes.get(route_id, ())]
+
+    async def update(self, bus_id: str, **fields):
+        """Set `BusState` fields for a bus and replicate the change."""
+        self._update(bus_id, fields)
+        await self._publish({"op": "update", "bus_id": bus_id, "fields": fields})
+
+    async def remove(self, bus_id: str):
+        self._remove(bus_id)
+        await self._publish({"op": "remove", "bus_id": bus_id})
+
+    async def apply(self, payload: dict):
+        """Apply a change published by another worker."""
+        if payload.get("op") == "update":
+            self._update(payload["bus_id"], payload["fields"])
+        elif payload.get("op") == "remove":
+            self._remove(payload["bus_id"])
+        else:
+            return  # not bus state (see StateChannel)
+        self.received += 1
+
+    def stats(self) -> dict:
+        return {
+            "buses": len(self._buses),
+            "routes": len(self._routes),
+            "shared": self.shared,
+            "published": self.published,
+            "received": self.received,
+        }
+
+    async def _publish(self, payload: dict):
+        if self._manager is None:
+            return
+        try:
+            await self._manager.publish_state(payload)
+            self.published += 1
+        except Exception:
+            logger.exception("Failed to replicate state for bus %s", payload.get("bus_id"))
+
+    def _update(self, bus_id: str, fields: dict):
+        state = self._buses.get(bus_id)
+        if state is None:
+            state = self._buses[bus_id] = BusState(bus_id)
+        previous_route = state.route_id
+        for name, value in fields.items():
+            setattr(state, name, value)
+        route_id = state.route_id
+        if route_id != previous_route:
+            self._unindex(bus_id, previous_route)
+            if route_id is not None:
+                self._routes.setdefault(route_id, set()).add(bus_id)
+
+    def _remove(self, bus_id: str):
+        state = self._buses.pop(bus_id, None)
+        if state is not None:
+            self._unindex(bus_id, state.route_id)
+            for listener in self._listeners:
+                listener(bus_id)
+
+    def _unindex(self, bus_id: str, route_id: Optional[str]):
+        bus_ids = self._routes.get(route_id)
+        if bus_ids is not None:
+            bus_ids.discard(bus_id)
+            if not bus_ids:
+                del self._routes[route_id]
+
+
+bus_state = BusStateStore()
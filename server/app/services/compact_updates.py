@@ -0,0 +1,121 @@
+from datetime import datetime, timezone
+from typing import Dict, Hashable, NamedTuple, Optional, Tuple
+
+# Fixed-point scales: 1e-5 degrees (~1.1 m) and 0.1 speed units
+COORD_SCALE = 100000
+SPEED_SCALE = 10
+
+# Update payload formats a client can ask for at connect
+FORMATS = ("full", "compact")
+
+
+class Frame(NamedTuple):
+    """A bus:update quantized to integers."""
+
+    seq: int
+    t: int  # epoch seconds
+    y: int  # latitude * COORD_SCALE
+    x: int  # longitude * COORD_SCALE
+    v: int  # speed * SPEED_SCALE
+    i: int  # stop index
+
+
+def epoch_seconds(timestamp) -> int:
+    if not timestamp:
+        return 0
+    return int(datetime.fromisoformat(timestamp).replace(tzinfo=timezone.utc).timestamp())
+
+
+def quantize(payload: dict) -> Frame:
+    return Frame(
+        seq=payload.get("seq") or 0,
+        t=epoch_seconds(payload.get("timestamp")),
+        y=round((payload.get("lat") or 0) * COORD_SCALE),
+        x=round((payload.get("lng") or 0) * COORD_SCALE),
+        v=round((payload.get("speed") or 0) * SPEED_SCALE),
+        i=payload.get("stopIndex") or 0,
+    )
+
+
+def keyframe(payload: dict, frame: Frame) -> dict:
+    """Absolute compact update: `k` marks it, `r` carries the route."""
+    return {"k": 1, "b": payload["busId"], "r": payload.get("routeId"), "s": frame.seq,
+            "t": frame.t, "y": frame.y, "x": frame.x, "v": frame.v, "i": frame.i}
+
+
+def delta(bus_id: str, previous: Frame, frame: Frame) -> dict:
+    """Compact update relative to the previous frame of the same stream.
+
+    Every field is a difference; zero differences are left out, except that
+    `s` is left out when it is 1 (the usual next sequence number).
+    """
+    out = {"b": bus_id}
+    ds = frame.seq - previous.seq
+    if ds != 1:
+        out["s"] = ds
+    for field in ("t", "y", "x", "v", "i"):
+        d = getattr(frame, field) - getattr(previous, field)
+        if d:
+            out[field] = d
+    return out
+
+
+def stream_key(room) -> Hashable:
+    """One delta stream per room (or per union of rooms)."""
+    return tuple(sorted(room)) if isinstance(room, (list, tuple)) else room
+
+
+class CompactStreams:
+    """Previous frame of every (stream, bus) pair, for building deltas.
+
+    A stream is the sequence of updates sent to one room. Every
+    `keyframe_interval` frames a stream sends a keyframe to everyone instead
+    of a delta, so clients can never drift for long.
+    """
+
+    def __init__(self, keyframe_interval: int = 20):
+        self.keyframe_interval = keyframe_interval
+        self._last: Dict[Tuple[Hashable, str], Tuple[Frame, int]] = {}  # -> (frame, frames since keyframe)
+        self.keyframes = 0
+        self.deltas = 0
+
+    def encode(self, stream: Hashable, payload: dict) -> Tuple[dict, Optional[dict]]:
+        """Return (keyframe, delta) for `payload`; delta is None when the
+        stream is due a keyframe or has no previous frame."""
+        bus_id = payload["busId"]
+        frame = quantize(payload)
+        key = keyframe(payload, frame)
+        last = self._last.get((stream, bus_id))
+        if last is None or last[1] + 1 >= self.keyframe_interval:
+            self._last[(stream, bus_id)] = (frame, 0)
+            self.keyframes += 1
+            return key, None
+        previous, count = last
+        self._last[(stream, bus_id)] = (frame, count + 1)
+        self.deltas += 1
+        return key, delta(bus_id, previous, frame)
+
+    def forget(self, bus_id: str):
+        for key in [key for key in self._last if key[1] == bus_id]:
+            del self._last[key]
+
+    def stats(self) -> dict:
+        return {"streams": len(self._last), "keyframes": self.keyframes, "deltas": self.deltas}
+
+
+def apply_compact(state: Optional[dict], update: dict) -> dict:
+    """Client-side reference decoder: fold a compact update into `state`
+    (the previous decoded update of the same stream, or None)."""
+    if update.get("k"):
+        frame = Frame(update["s"], update["t"], update["y"], update["x"], update["v"], update["i"])
+        route_id = update.get("r")
+    else:
+        previous = Frame(state["seq"], state["t"], round(state["lat"] * COORD_SCALE),
+                         round(state["lng"] * COORD_SCALE), round(state["speed"] * SPEED_SCALE),
+                         state["stopIndex"])
+        frame = Frame(previous.seq + update.get("s", 1),
+                      *(getattr(previous, f) + update.get(f, 0) for f in ("t", "y", "x", "v", "i")))
+        route_id = state["routeId"]
+    return {"busId": update["b"], "routeId": route_id, "seq": frame.seq, "t": frame.t,
+            "lat": frame.y / COORD_SCALE, "lng": frame.x / COORD_SCALE,
+            "speed": frame.v / SPEED_SCALE, "stopIndex": frame.i}
@@ -0,0 +1,63 @@
+import random
+import time
+from typing import Callable, Optional
+
+
+class ConnectAdmission:
+    """Token bucket admitting at most `rate` Socket.IO connects per second
+    (bursts up to `burst`).
+
+    A refused client gets a retry hint: the time until the bucket can admit
+    it, plus a random share of the time needed to work through everyone else
+    refused recently (at least `jitter` seconds). After a restart, the
+    reconnecting clients therefore spread out over the time the server needs
+    to admit them, instead of all retrying together.
+    """
+
+    def __init__(self, rate: float = 200.0, burst: int = 400, jitter: float = 2.0,
+                 clock: Callable[[], float] = time.monotonic, rng: Callable[[], float] = random.random):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.jitter = jitter
+        self._clock = clock
+        self._rng = rng
+        self._tokens = float(self.burst)
+        # Recently refused clients, draining at `rate`
+        self._backlog = 0.0
+        self._last = clock()
+
+        self.admitted = 0
+        self.refused = 0
+
+    def _refill(self):
+        now = self._clock()
+        elapsed = now - self._last
+        self._last = now
+        self._tokens = min(self._tokens + elapsed * self.rate, self.burst)
+        self._backlog = max(self._backlog - elapsed * self.rate, 0.0)
+
+    def admit(self) -> Optional[float]:
+        """None if the connect may proceed, otherwise seconds to wait
+        before retrying."""
+        if self.rate <= 0:
+            self.admitted += 1
+            return None
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            self.admitted += 1
+            return None
+
+        self.refused += 1
+        self._backlog += 1
+        wait = (1 - self._tokens) / self.rate
+        spread = max(self._backlog / self.rate, self.jitter)
+        return round(wait + self._rng() * spread, 3)
+
+    def stats(self) -> dict:
+        return {
+            "rate": self.rate,
+            "admitted": self.admitted,
+            "refused": self.refused,
+            "backlog": round(self._backlog, 1),
+        }
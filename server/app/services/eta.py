@@ -0,0 +1,337 @@
+import asyncio
+import logging
+import time
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from sqlalchemy import select
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import Bus, BusLocation
+from app.services.route_cache import route_cache
+
+logger = logging.getLogger(__name__)
+
+
+class SegmentObservation(NamedTuple):
+    route_id: str
+    segment: int        # segment i runs from stop position i to i + 1
+    bucket: int
+    seconds: float
+
+
+class EtaEstimate(NamedTuple):
+    seconds: float
+    stops_away: int
+    source: str         # "history": learned segment times; "distance": distance / speed
+
+    @property
+    def minutes(self) -> int:
+        return max(1, round(self.seconds / 60)) if self.stops_away else 0
+
+
+class RouteEta:
+    """Published, read-only travel-time table for one route.
+
+    `seconds[bucket, segment]` is the expected time to drive each segment
+    in each time-of-day bucket (gaps filled from other buckets or distance);
+    `prefix[bucket, k]` is the time from stop 0 to stop k, so the time
+    between any two stops is one subtraction.
+    """
+
+    __slots__ = ("route_id", "stop_count", "seconds", "prefix", "observed")
+
+    def __init__(self, route_id: str, stop_count: int, seconds: np.ndarray, observed: int):
+        self.route_id = route_id
+        self.stop_count = stop_count
+        self.seconds = seconds
+        self.prefix = np.concatenate((np.zeros((seconds.shape[0], 1)), np.cumsum(seconds, axis=1)), axis=1)
+        self.observed = observed
+
+
+class _Accumulator:
+    """Running per-(bucket, segment) averages for one route's current stops."""
+
+    __slots__ = ("stop_ids", "mean", "counts")
+
+    def __init__(self, stop_ids: List[str], buckets: int):
+        self.stop_ids = list(stop_ids)
+        self.mean = np.zeros((buckets, len(stop_ids) - 1))
+        self.counts = np.zeros((buckets, len(stop_ids) - 1))
+
+
+class _BusCursor:
+    """Where a bus was at the end of the rows already processed."""
+
+    __slots__ = ("route_id", "t", "progress_m", "crossed_position", "crossed_at")
+
+    def __init__(self, route_id: str):
+        self.route_id = route_id
+        self.t: Optional[float] = None
+        self.progress_m = 0.0
+        self.crossed_position: Optional[int] = None
+        self.crossed_at = 0.0
+
+    def reset(self):
+        self.t = None
+        self.crossed_position = None
+
+
+class EtaEngine:
+    """Stop-to-stop travel times learned from bus_locations.
+
+    Every `refresh_interval` seconds the rows written since the last refresh
+    (the last `history_days` on the first run) are streamed out in
+    `batch_rows` pieces, projected onto their route in a worker thread, and
+    turned into segment traversal times: the interpolated moments a bus
+    passed consecutive stops. Each time is folded into a running average for
+    its segment and time-of-day bucket (`bucket_minutes`, weekdays and
+    weekends apart, in `tz`), weighted by at least `smoothing` so the table
+    follows changing traffic. Traversals longer than `max_segment_seconds`
+    or spanning a ping gap over `max_gap_seconds` are ignored.
+
+    `estimate` is the hot path: a bucket computation and a few array reads.
+    The part of the current segment still ahead is averaged with what the
+    bus's live speed predicts. Routes without history fall back to
+    distance / speed.
+    """
+
+    # A bus this close to the first stop is still at the terminal
+    DEPARTURE_RADIUS_M = 25.0
+    # Progress falling back this far means a new trip
+    NEW_TRIP_BACKTRACK_M = 200.0
+    # Below this the live speed says nothing useful (stopped, in traffic)
+    MIN_LIVE_SPEED_KMH = 5.0
+
+    def __init__(self, refresh_interval: float = 600.0, history_days: int = 14,
+                 bucket_minutes: int = 15, tz: str = "UTC", default_speed_kmh: float = 20.0,
+                 smoothing: float = 0.05, max_segment_seconds: float = 1800.0,
+                 max_gap_seconds: float = 300.0, batch_rows: int = 20000, lag_seconds: float = 30.0,
+                 session_factory=AsyncSessionLocal, geometry_loader=None):
+        self.refresh_interval = refresh_interval
+        self.history_days = history_days
+        self.bucket_minutes = bucket_minutes
+        self.buckets_per_day = 24 * 60 // bucket_minutes
+        self.buckets = 2 * self.buckets_per_day
+        self.tz = ZoneInfo(tz)
+        self.default_speed_kmh = default_speed_kmh
+        self.smoothing = smoothing
+        self.max_segment_seconds = max_segment_seconds
+        self.max_gap_seconds = max_gap_seconds
+        self.batch_rows = batch_rows
+        self.lag_seconds = lag_seconds
+        self.session_factory = session_factory
+        self._geometry = geometry_loader or route_cache.get
+
+        self._tables: Dict[str, RouteEta] = {}
+        self._accumulators: Dict[str, _Accumulator] = {}
+        self._cursors: Dict[str, _BusCursor] = {}
+        self._watermark: Optional[datetime] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        self.refreshes = 0
+        self.rows_read = 0
+        self.observations = 0
+        self.last_refresh_ms = 0.0
+        self.lookups = 0
+        self.fallback_lookups = 0
+
+    def start(self):
+        if self.refresh_interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("ETA refresh failed")
+            await asyncio.sleep(self.refresh_interval)
+
+    def bucket_of(self, epoch: float) -> int:
+        local = datetime.fromtimestamp(epoch, self.tz)
+        weekend = 1 if local.weekday() >= 5 else 0
+        return weekend * self.buckets_per_day + (local.hour * 60 + local.minute) // self.bucket_minutes
+
+    # Hot path
+
+    def estimate(self, geometry, position: Optional[int], progress_m: Optional[float],
+                 target_position: int, speed_kmh: float = 0.0,
+                 now: Optional[float] = None) -> Optional[EtaEstimate]:
+        """ETA from a bus's tracked position to the stop at `target_position`."""
+        if position is None or geometry.stop_count < 2:
+            return None
+        self.lookups += 1
+        stops_away = target_position - position
+        if stops_away <= 0:
+            return EtaEstimate(0.0, 0, "history")
+        stop_progress = geometry.locator.stop_progress_m
+        progress_m = min(max(progress_m or 0.0, stop_progress[position]), stop_progress[position + 1])
+        remaining_m = stop_progress[position + 1] - progress_m
+        live = speed_kmh is not None and speed_kmh >= self.MIN_LIVE_SPEED_KMH
+
+        table = self._tables.get(geometry.route_id)
+        if table is None or table.stop_count != geometry.stop_count:
+            self.fallback_lookups += 1
+            speed_ms = (speed_kmh if live else self.default_speed_kmh) / 3.6
+            return EtaEstimate((stop_progress[target_position] - progress_m) / speed_ms, stops_away, "distance")
+
+        bucket = self.bucket_of(now if now is not None else time.time())
+        segment_m = stop_progress[position + 1] - stop_progress[position]
+        current = float(table.seconds[bucket, position])
+        if segment_m > 0:
+            current *= remaining_m / segment_m
+        if live:
+            current = (current + remaining_m / (speed_kmh / 3.6)) / 2
+        ahead = float(table.prefix[bucket, target_position] - table.prefix[bucket, position + 1])
+        return EtaEstimate(current + ahead, stops_away, "history")
+
+    # Model rebuild
+
+    async def refresh(self, now: Optional[datetime] = None):
+        """Fold rows written since the last refresh into the tables."""
+        async with self._lock:
+            started = time.perf_counter()
+            now = now or datetime.now(timezone.utc)
+            since = self._watermark or now - timedelta(days=self.history_days)
+            until = now - timedelta(seconds=self.lag_seconds)
+            if since >= until:
+                return
+            stmt = select(
+                BusLocation.bus_id, Bus.route_id, BusLocation.timestamp,
+                BusLocation.latitude, BusLocation.longitude,
+            ).join(Bus, Bus.id == BusLocation.bus_id).where(
+                BusLocation.timestamp >= since, BusLocation.timestamp < until,
+            ).order_by(BusLocation.bus_id, BusLocation.timestamp).execution_options(yield_per=self.batch_rows)
+
+            geometries = {}
+            touched = set()
+            async with self.session_factory() as db:
+                result = await db.stream(stmt)
+                async for rows in result.partitions():
+                    for route_id in {row[1] for row in rows} - geometries.keys():
+                        geometries[route_id] = await self._geometry(route_id)
+                    self.rows_read += len(rows)
+                    touched |= await asyncio.to_thread(self._ingest, rows, geometries)
+            if touched:
+                await asyncio.to_thread(self._publish, touched, geometries)
+            self._watermark = until
+            self.refreshes += 1
+            self.last_refresh_ms = (time.perf_counter() - started) * 1000
+
+    def _ingest(self, rows, geometries) -> set:
+        # Runs in a worker thread; nothing here is read by the hot path
+        observations = self.observe(rows, geometries)
+        self.observations += len(observations)
+        touched = set()
+        for route_id, segment, bucket, seconds in observations:
+            geometry = geometries[route_id]
+            accumulator = self._accumulators.get(route_id)
+            if accumulator is None or accumulator.stop_ids != geometry.stop_ids:
+                accumulator = self._accumulators[route_id] = _Accumulator(geometry.stop_ids, self.buckets)
+            count = accumulator.counts[bucket, segment] + 1
+            weight = max(1.0 / count, self.smoothing)
+            accumulator.mean[bucket, segment] += weight * (seconds - accumulator.mean[bucket, segment])
+            accumulator.counts[bucket, segment] = count
+            touched.add(route_id)
+        return touched
+
+    def observe(self, rows, geometries) -> List[SegmentObservation]:
+        """Segment traversal times in `rows` of (bus_id, route_id, timestamp,
+        lat, lng), ordered by bus then time. Continues from where each bus
+        was left by the previous call."""
+        observations: List[SegmentObservation] = []
+        start = 0
+        while start < len(rows):
+            bus_id, route_id = rows[start][0], rows[start][1]
+            end = start
+            while end < len(rows) and rows[end][0] == bus_id:
+                end += 1
+            geometry = geometries.get(route_id)
+            if geometry is not None and geometry.stop_count >= 2:
+                self._observe_bus(bus_id, route_id, rows[start:end], geometry, observations)
+            start = end
+        return observations
+
+    def _observe_bus(self, bus_id, route_id, rows, geometry, observations):
+        cursor = self._cursors.get(bus_id)
+        if cursor is None or cursor.route_id != route_id:
+            cursor = self._cursors[bus_id] = _BusCursor(route_id)
+        times = [as_epoch(row[2]) for row in rows]
+        _, _, progress = geometry.locator.nearest_many([row[3] for row in rows], [row[4] for row in rows])
+        stops = geometry.locator.stop_progress_m
+
+        for t, p in zip(times, progress.tolist()):
+            if cursor.t is not None and (t - cursor.t > self.max_gap_seconds
+                                         or p < cursor.progress_m - self.NEW_TRIP_BACKTRACK_M):
+                cursor.reset()
+            if cursor.t is None:
+                cursor.t, cursor.progress_m = t, p
+            if p <= stops[0] + self.DEPARTURE_RADIUS_M and cursor.crossed_position in (None, 0):
+                # Waiting at the terminal: the trip starts when it leaves
+                cursor.crossed_position, cursor.crossed_at = 0, t
+            if p <= cursor.progress_m:
+                # GPS noise backwards; keep the furthest point
+                continue
+            for k in range(bisect_right(stops, cursor.progress_m), bisect_right(stops, p)):
+                crossed_at = cursor.t + (stops[k] - cursor.progress_m) / (p - cursor.progress_m) * (t - cursor.t)
+                if cursor.crossed_position == k - 1:
+                    seconds = crossed_at - cursor.crossed_at
+                    if 0 < seconds <= self.max_segment_seconds:
+                        observations.append(SegmentObservation(
+                            route_id, k - 1, self.bucket_of(cursor.crossed_at), seconds))
+                cursor.crossed_position, cursor.crossed_at = k, crossed_at
+            cursor.t, cursor.progress_m = t, p
+
+    def _publish(self, route_ids, geometries):
+        for route_id in route_ids:
+            accumulator = self._accumulators[route_id]
+            geometry = geometries[route_id]
+            seen = accumulator.counts > 0
+            # Gaps: the segment's average over the buckets that have data,
+            # else distance at the default speed
+            totals = np.where(seen, accumulator.mean * accumulator.counts, 0.0).sum(axis=0)
+            counts = accumulator.counts.sum(axis=0)
+            segment_m = np.diff(geometry.locator.cumulative_m)
+            fallback = np.where(counts > 0, totals / np.maximum(counts, 1), segment_m / (self.default_speed_kmh / 3.6))
+            seconds = np.where(seen, accumulator.mean, fallback)
+            self._tables[route_id] = RouteEta(route_id, geometry.stop_count, seconds, int(counts.sum()))
+
+    def stats(self) -> dict:
+        return {
+            "routes": len(self._tables),
+            "refreshes": self.refreshes,
+            "rows_read": self.rows_read,
+            "observations": self.observations,
+            "last_refresh_ms": round(self.last_refresh_ms, 3),
+            "lookups": self.lookups,
+            "fallback_lookups": self.fallback_lookups,
+        }
+
+
+def as_epoch(value: datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+eta_engine = EtaEngine(
+    refresh_interval=settings.ETA_REFRESH_INTERVAL_SECONDS,
+    history_days=settings.ETA_HISTORY_DAYS,
+    bucket_minutes=settings.ETA_BUCKET_MINUTES,
+    tz=settings.ETA_TIMEZONE,
+    default_speed_kmh=settings.ETA_DEFAULT_SPEED_KMH,
+)
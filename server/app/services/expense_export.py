@@ -0,0 +1,94 @@
+import asyncio
+import csv
+import io
+import os
+import tempfile
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from openpyxl import Workbook
+from sqlalchemy import select
+from app.core.database import AsyncSessionLocal, SessionLocal
+from app.models import Expense
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "expenses.csv"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "expenses.xlsx"),
+}
+HEADER = ("Category", "Amount", "Description", "Date")
+
+
+def export_query(start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """Export columns only (no ORM objects), oldest first; `end` is exclusive."""
+    stmt = select(Expense.category, Expense.amount, Expense.description, Expense.date)
+    if start is not None:
+        stmt = stmt.where(Expense.date >= start)
+    if end is not None:
+        stmt = stmt.where(Expense.date < end)
+    return stmt.order_by(Expense.date, Expense.id)
+
+
+def export_row(row) -> tuple:
+    category, amount, description, date = row
+    return (category, amount, description or "", date.isoformat() if date else "")
+
+
+class ExpenseExporter:
+    """Expense exports in bounded memory.
+
+    CSV is generated from a server-side cursor `chunk_rows` rows at a time
+    and streamed as it is produced. XLSX (a zip, so nothing can be sent
+    before it is complete) is written by a write-only openpyxl workbook in a
+    worker thread reading through the sync engine, spooled to a temporary
+    file and then streamed from disk.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal, sync_session_factory=SessionLocal,
+                 chunk_rows: int = 5000, file_chunk_bytes: int = 256 * 1024):
+        self.session_factory = session_factory
+        self.sync_session_factory = sync_session_factory
+        self.chunk_rows = chunk_rows
+        self.file_chunk_bytes = file_chunk_bytes
+
+    async def csv(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> AsyncIterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(HEADER)
+        yield buffer.getvalue().encode()
+
+        stmt = export_query(start, end).execution_options(yield_per=self.chunk_rows)
+        async with self.session_factory() as db:
+            result = await db.stream(stmt)
+            async for rows in result.partitions():
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows(export_row(row) for row in rows)
+                yield buffer.getvalue().encode()
+
+    def write_xlsx(self, path: str, start: Optional[datetime] = None, end: Optional[datetime] = None):
+        """Blocking: write the workbook to `path`."""
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Expenses")
+        sheet.append(HEADER)
+        stmt = export_query(start, end).execution_options(yield_per=self.chunk_rows)
+        with self.sync_session_factory() as db:
+            for row in db.execute(stmt):
+                sheet.append(export_row(row))
+        workbook.save(path)
+
+    async def xlsx(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> AsyncIterator[bytes]:
+        fd, path = tempfile.mkstemp(prefix="expenses-", suffix=".xlsx")
+        os.close(fd)
+        try:
+            await asyncio.to_thread(self.write_xlsx, path, start, end)
+            with open(path, "rb") as f:
+                while True:
+                    chunk = await asyncio.to_thread(f.read, self.file_chunk_bytes)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            os.unlink(path)
+
+
+expense_exporter = ExpenseExporter()
@@ -0,0 +1,151 @@
+import base64
+import json
+import logging
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from app.core.database import AsyncSessionLocal, as_utc, sqlite_strftime
+from app.models import Expense, ExpenseRollup
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = ("month",)
+
+
+def as_utc_or_none(value: Optional[datetime]) -> Optional[datetime]:
+    # Range bounds compare against stored UTC times (naive text on SQLite)
+    return None if value is None else as_utc(value)
+
+
+def month_start(value: datetime) -> datetime:
+    return as_utc(value).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def month_aligned(value: Optional[datetime]) -> bool:
+    return value is None or month_start(value) == as_utc(value)
+
+
+def month_bucket(column, dialect: str):
+    """SQL expression truncating `column` to the start of its month in UTC,
+    the same bucket `month_start` gives the rollups."""
+    if dialect == "postgresql":
+        # date_trunc on a timestamptz works in the session time zone
+        return func.timezone("UTC", func.date_trunc("month", func.timezone("UTC", column)))
+    return sqlite_strftime("%Y-%m-01 00:00:00.000000", column)
+
+
+def month_key(value) -> str:
+    # date_trunc gives a datetime, strftime on SQLite a string
+    return value[:7] if isinstance(value, str) else f"{as_utc(value):%Y-%m}"
+
+
+def rollup_upsert(dialect: str, category: str, date: datetime, amount: float):
+    """Statement adding one expense to its category/month rollup row."""
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = insert(ExpenseRollup).values(category=category, month=month_start(date), total=amount, count=1)
+    return stmt.on_conflict_do_update(
+        index_elements=["category", "month"],
+        set_={"total": ExpenseRollup.total + stmt.excluded.total, "count": ExpenseRollup.count + 1},
+    )
+
+
+async def reconcile_rollups(session_factory=AsyncSessionLocal) -> bool:
+    """Rebuild expense_rollups from the ledger unless they already count
+    every dated expense; returns whether it did.
+
+    Run at startup: a schema made by `create_all` starts with no rollups
+    (only migration 0002 backfills them), and summaries of month-aligned
+    ranges would otherwise miss every earlier expense.
+    """
+    async with session_factory() as db:
+        counted = await db.scalar(select(func.coalesce(func.sum(ExpenseRollup.count), 0)))
+        expenses = await db.scalar(select(func.count()).select_from(Expense).where(Expense.date.is_not(None)))
+        if counted == expenses:
+            return False
+        month = month_bucket(Expense.date, db.get_bind().dialect.name)
+        rows = select(Expense.category, month, func.sum(Expense.amount), func.count()).where(
+            Expense.date.is_not(None)
+        ).group_by(Expense.category, month)
+        try:
+            await db.execute(delete(ExpenseRollup))
+            await db.execute(insert(ExpenseRollup).from_select(["category", "month", "total", "count"], rows))
+            await db.commit()
+        except IntegrityError:
+            # Another worker rebuilt them at the same time
+            await db.rollback()
+            return False
+    logger.info("Rebuilt expense rollups for %d expenses", expenses)
+    return True
+
+
+def summary_query(dialect: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                  bucket: Optional[str] = None):
+    """(category, [month,] total, count) rows grouped in the database.
+
+    Served from expense_rollups when the range falls on month boundaries,
+    otherwise aggregated from expenses; `end` is exclusive.
+    """
+    start, end = as_utc_or_none(start), as_utc_or_none(end)
+    if month_aligned(start) and month_aligned(end):
+        category, at, month = ExpenseRollup.category, ExpenseRollup.month, ExpenseRollup.month
+        total, count = func.sum(ExpenseRollup.total), func.sum(ExpenseRollup.count)
+    else:
+        category, at, month = Expense.category, Expense.date, month_bucket(Expense.date, dialect)
+        total, count = func.sum(Expense.amount), func.count()
+
+    group_by = [category, month.label("month")] if bucket == "month" else [category]
+    stmt = select(*group_by, total, count)
+    if start is not None:
+        stmt = stmt.where(at >= start)
+    if end is not None:
+        stmt = stmt.where(at < end)
+    return stmt.group_by(*group_by).order_by(*group_by)
+
+
+def summarize(rows, bucket: Optional[str] = None) -> dict:
+    by_category = {}
+    by_month = {}
+    count = 0
+    for row in rows:
+        category, total, n = row[0], row[-2], row[-1]
+        by_category[category] = by_category.get(category, 0) + total
+        count += n
+        if bucket == "month":
+            by_month.setdefault(month_key(row[1]), {})[category] = total
+    summary = {"by_category": by_category, "total": sum(by_category.values()), "count": count}
+    if bucket == "month":
+        summary["by_month"] = dict(sorted(by_month.items()))
+    return summary
+
+
+def page_query(limit: int, after: Optional[Tuple[datetime, str]] = None, category: Optional[str] = None,
+               start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """One page of expenses oldest first, keyed on (date, id)."""
+    start, end = as_utc_or_none(start), as_utc_or_none(end)
+    stmt = select(Expense)
+    if category is not None:
+        stmt = stmt.where(Expense.category == category)
+    if start is not None:
+        stmt = stmt.where(Expense.date >= start)
+    if end is not None:
+        stmt = stmt.where(Expense.date < end)
+    if after is not None:
+        stmt = stmt.where(tuple_(Expense.date, Expense.id) > tuple_(*after))
+    return stmt.order_by(Expense.date, Expense.id).limit(limit)
+
+
+def encode_cursor(expense: Expense) -> str:
+    key = json.dumps([as_utc(expense.date).isoformat(), expense.id])
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Inverse of encode_cursor; raises ValueError on anything else."""
+    try:
+        date, expense_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return as_utc(datetime.fromisoformat(date)), str(expense_id)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("Invalid cursor") from exc
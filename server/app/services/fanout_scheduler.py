@@ -0,0 +1,134 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Emit = Callable[[dict, object, Optional[List[str]]], Awaitable[None]]
+
+
+class FanoutScheduler:
+    """Coalesce outbound bus:update broadcasts per bus.
+
+    Pings are kept as the latest payload per bus; every `route_interval`
+    seconds the newest one is sent to the bus's `route:` room, and every
+    `bus_interval` seconds to its `bus:` room. However fast buses ping, each
+    room gets at most one update per bus per interval, so outbound traffic
+    grows with the number of buses, not with the ping rate. An interval of
+    0 sends that room's updates immediately.
+
+    A client in both rooms is served by the bus-room stream only: route
+    broadcasts skip this worker's members of the bus room. (With a pub/sub
+    manager, members on other workers can still see both streams; the
+    per-bus `seq` lets them drop the repeat.) When the two intervals are
+    equal both rooms are sent one emit to their union instead.
+    """
+
+    def __init__(self, emit: Emit, bus_room_members: Callable[[str], List[str]],
+                 route_interval: float = 2.0, bus_interval: float = 1.0):
+        self._emit = emit
+        self._bus_room_members = bus_room_members
+        self.route_interval = route_interval
+        self.bus_interval = bus_interval
+        self._route_pending: Dict[str, Tuple[str, dict]] = {}  # bus id -> (route id, payload)
+        self._bus_pending: Dict[str, dict] = {}                 # bus id -> payload
+        self._tasks: List[asyncio.Task] = []
+
+        self.submitted = 0
+        self.coalesced = 0
+        self.route_emits = 0
+        self.bus_emits = 0
+
+    @property
+    def combined(self) -> bool:
+        return self.route_interval == self.bus_interval
+
+    def start(self):
+        if self._tasks:
+            return
+        if self.combined:
+            if self.route_interval > 0:
+                self._tasks.append(asyncio.create_task(self._loop(self.route_interval, self.flush_combined)))
+            return
+        if self.route_interval > 0:
+            self._tasks.append(asyncio.create_task(self._loop(self.route_interval, self.flush_route)))
+        if self.bus_interval > 0:
+            self._tasks.append(asyncio.create_task(self._loop(self.bus_interval, self.flush_bus)))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, bus_id: str, route_id: str, payload: dict):
+        """Schedule `payload` as bus_id's latest state."""
+        self.submitted += 1
+        if self.combined:
+            if self.route_interval <= 0:
+                await self._send_combined(bus_id, route_id, payload)
+            else:
+                self._queue_route(bus_id, route_id, payload)
+            return
+        if self.bus_interval <= 0:
+            await self._send_bus(bus_id, payload)
+        else:
+            if bus_id in self._bus_pending:
+                self.coalesced += 1
+            self._bus_pending[bus_id] = payload
+        if self.route_interval <= 0:
+            await self._send_route(bus_id, route_id, payload)
+        else:
+            self._queue_route(bus_id, route_id, payload)
+
+    def _queue_route(self, bus_id: str, route_id: str, payload: dict):
+        if bus_id in self._route_pending:
+            self.coalesced += 1
+        self._route_pending[bus_id] = (route_id, payload)
+
+    async def flush_route(self):
+        pending, self._route_pending = self._route_pending, {}
+        for bus_id, (route_id, payload) in pending.items():
+            await self._send_route(bus_id, route_id, payload)
+
+    async def flush_bus(self):
+        pending, self._bus_pending = self._bus_pending, {}
+        for bus_id, payload in pending.items():
+            await self._send_bus(bus_id, payload)
+
+    async def flush_combined(self):
+        pending, self._route_pending = self._route_pending, {}
+        for bus_id, (route_id, payload) in pending.items():
+            await self._send_combined(bus_id, route_id, payload)
+
+    async def _send_route(self, bus_id: str, route_id: str, payload: dict):
+        self.route_emits += 1
+        await self._emit(payload, f"route:{route_id}", self._bus_room_members(bus_id) or None)
+
+    async def _send_bus(self, bus_id: str, payload: dict):
+        self.bus_emits += 1
+        await self._emit(payload, f"bus:{bus_id}", None)
+
+    async def _send_combined(self, bus_id: str, route_id: str, payload: dict):
+        self.route_emits += 1
+        self.bus_emits += 1
+        await self._emit(payload, [f"route:{route_id}", f"bus:{bus_id}"], None)
+
+    async def _loop(self, interval: float, flush):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await flush()
+            except Exception:
+                logger.exception("bus:update fan-out failed")
+
+    def stats(self) -> dict:
+        return {
+            "route_interval": self.route_interval,
+            "bus_interval": self.bus_interval,
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "pending": len(self._route_pending) + len(self._bus_pending),
+            "route_emits": self.route_emits,
+            "bus_emits": self.bus_emits,
+        }
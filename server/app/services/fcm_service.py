@@ -1,43 +1,338 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
 from pyfcm import FCMNotification
+from sqlalchemy import delete, select, update
 from app.core.config import settings
-from app.models import User
-from sqlalchemy.orm import Session
-from app.core.database import SessionLocal
+from app.core.database import AsyncSessionLocal
+from app.models import DeviceToken
 
-push_service = None
+logger = logging.getLogger(__name__)
 
-def get_fcm_service():
-    global push_service
-    if not push_service and settings.FCM_SERVER_KEY:
-        push_service = FCMNotification(api_key=settings.FCM_SERVER_KEY)
-    return push_service
+# Legacy FCM accepts up to 1000 registration ids per multicast request
+FCM_MULTICAST_LIMIT = 1000
 
-async def send_fcm_notification(user_id: str, title: str, body: str):
-    """Send FCM push notification to user"""
-    fcm_service = get_fcm_service()
-    if not fcm_service:
-        print("FCM service not configured")
-        return
-    
-    # In production, store FCM tokens in database
-    # For now, this is a placeholder
-    db = SessionLocal()
-    try:
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
+# Per-token errors that mean the token will never work again
+DEAD_TOKEN_ERRORS = {"NotRegistered", "InvalidRegistration", "MismatchSenderId"}
+# Per-token errors worth retrying later
+RETRYABLE_TOKEN_ERRORS = {"Unavailable", "InternalServerError", "DeviceMessageRateExceeded"}
+
+
+class PyFCMClient:
+    """Blocking multicast client backed by pyfcm.
+
+    pyfcm keeps response state on the client instance, so each worker
+    thread gets its own `FCMNotification`.
+    """
+
+    def __init__(self, api_key: str, endpoint: str = ""):
+        self.api_key = api_key
+        self.endpoint = endpoint
+        self._local = threading.local()
+
+    def _client(self) -> FCMNotification:
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = FCMNotification(api_key=self.api_key)
+            if self.endpoint:
+                client.FCM_END_POINT = self.endpoint
+            self._local.client = client
+        return client
+
+    def send_multicast(self, tokens: List[str], title: str, body: str) -> List[dict]:
+        """Send one notification to many tokens; returns one result per token."""
+        response = self._client().notify_multiple_devices(
+            registration_ids=tokens, message_title=title, message_body=body
+        )
+        return response.get("results", [])
+
+
+class FakeFCMClient:
+    """In-process stand-in for FCM used by tests and benchmarks.
+
+    Tokens listed in `dead_tokens` come back as NotRegistered; tokens in
+    `flaky_tokens` fail with Unavailable that many times before succeeding.
+    """
+
+    def __init__(self, latency: float = 0.0, dead_tokens=(), flaky_tokens: Optional[Dict[str, int]] = None):
+        self.latency = latency
+        self.dead_tokens = set(dead_tokens)
+        self.flaky_tokens = dict(flaky_tokens or {})
+        self.requests: List[Tuple[List[str], str, str]] = []
+        self._lock = threading.Lock()
+
+    def send_multicast(self, tokens: List[str], title: str, body: str) -> List[dict]:
+        if self.latency:
+            time.sleep(self.latency)
+        results = []
+        with self._lock:
+            self.requests.append((list(tokens), title, body))
+            for token in tokens:
+                if token in self.dead_tokens:
+                    results.append({"error": "NotRegistered"})
+                elif self.flaky_tokens.get(token, 0) > 0:
+                    self.flaky_tokens[token] -= 1
+                    results.append({"error": "Unavailable"})
+                else:
+                    results.append({"message_id": f"fake:{len(self.requests)}:{token}"})
+        return results
+
+    @property
+    def delivered(self) -> int:
+        return sum(len(tokens) for tokens, _, _ in self.requests)
+
+
+def get_fcm_client():
+    if not settings.FCM_SERVER_KEY:
+        return None
+    return PyFCMClient(settings.FCM_SERVER_KEY, endpoint=settings.FCM_ENDPOINT)
+
+
+async def load_device_tokens(user_ids: List[str], session_factory=AsyncSessionLocal) -> Dict[str, List[str]]:
+    """Map each user id to its registered device tokens (one query)."""
+    async with session_factory() as db:
+        result = await db.execute(
+            select(DeviceToken.user_id, DeviceToken.token).where(DeviceToken.user_id.in_(user_ids))
+        )
+        rows = result.all()
+    tokens: Dict[str, List[str]] = {}
+    for user_id, token in rows:
+        tokens.setdefault(user_id, []).append(token)
+    return tokens
+
+
+async def apply_token_updates(dead: Set[str], canonical: Dict[str, str], session_factory=AsyncSessionLocal):
+    """Delete dead tokens and rewrite tokens FCM reported a canonical id for."""
+    async with session_factory() as db:
+        if dead:
+            await db.execute(delete(DeviceToken).where(DeviceToken.token.in_(dead)))
+        for old, new in canonical.items():
+            existing = await db.execute(select(DeviceToken.id).where(DeviceToken.token == new))
+            if existing.first():
+                await db.execute(delete(DeviceToken).where(DeviceToken.token == old))
+            else:
+                await db.execute(update(DeviceToken).where(DeviceToken.token == old).values(
+                    token=new, last_seen_at=datetime.now(timezone.utc)
+                ))
+        await db.commit()
+
+
+class PushMessage(NamedTuple):
+    user_id: str
+    title: str
+    body: str
+
+
+class PushDispatcher:
+    """Background push-notification delivery.
+
+    `enqueue` only puts a message on a bounded queue. A worker task drains
+    up to `batch_size` messages at a time, resolves all recipients' device
+    tokens with one query, groups identical notifications into multicast
+    requests and runs the blocking FCM client in a dedicated thread pool.
+    Transient failures are retried with exponential backoff; tokens FCM
+    reports as unregistered are deleted.
+    """
+
+    def __init__(self, client=None, max_queue_size: int = 10000, batch_size: int = 500,
+                 workers: int = 4, max_retries: int = 4, retry_base: float = 1.0,
+                 session_factory=AsyncSessionLocal):
+        self.client = client
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.session_factory = session_factory
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._retries: Set[asyncio.Task] = set()
+        self._delivering: Optional[asyncio.Future] = None  # the batch the worker holds
+        self._sending: Optional[asyncio.Semaphore] = None
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.pruned = 0
+        self.requests = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.client is not None
+
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="fcm")
+        self._sending = asyncio.Semaphore(self.workers)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0):
+        """Deliver what is queued (bounded by `timeout`) and shut down."""
+        if self._task is None:
+            return
+        # Cancelling the worker leaves a batch it already dequeued running
+        # (it is shielded); finish it before draining the queue
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        try:
+            await asyncio.wait_for(self._finish_and_drain(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Push queue not drained at shutdown, %d left", self._queue.qsize())
+        for task in list(self._retries):
+            task.cancel()
+        await asyncio.gather(*self._retries, return_exceptions=True)
+        self._executor.shutdown(wait=False)
+
+    async def _finish_and_drain(self):
+        if self._delivering is not None:
+            await asyncio.gather(self._delivering, return_exceptions=True)
+        while not self._queue.empty():
+            await self._deliver(self._take_batch())
+
+    def enqueue(self, user_id: str, title: str, body: str) -> bool:
+        if not self.enabled or self._queue is None:
+            return False
+        try:
+            self._queue.put_nowait(PushMessage(user_id, title, body))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "pruned_tokens": self.pruned,
+            "requests": self.requests,
+        }
+
+    def _take_batch(self) -> List[PushMessage]:
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            first = await self._queue.get()
+            batch = [first] + self._take_batch()
+            self._delivering = asyncio.ensure_future(self._deliver_logged(batch))
+            await asyncio.shield(self._delivering)
+            self._delivering = None
+
+    async def _deliver_logged(self, batch: List[PushMessage]):
+        try:
+            await self._deliver(batch)
+        except Exception:
+            logger.exception("Push delivery failed for %d messages", len(batch))
+
+    async def _deliver(self, batch: List[PushMessage]):
+        if not batch:
             return
-        
-        # TODO: Get FCM token from user device
-        # For now, this is a placeholder
-        # fcm_token = user.fcm_token
-        
-        # Example:
-        # result = fcm_service.notify_single_device(
-        #     registration_id=fcm_token,
-        #     message_title=title,
-        #     message_body=body
-        # )
-        print(f"FCM notification (placeholder): {title} - {body} to user {user_id}")
-    finally:
-        db.close()
+        user_ids = list({message.user_id for message in batch})
+        tokens_by_user = await load_device_tokens(user_ids, self.session_factory)
 
+        groups: Dict[Tuple[str, str], List[str]] = {}
+        for message in batch:
+            tokens = tokens_by_user.get(message.user_id)
+            if tokens:
+                groups.setdefault((message.title, message.body), []).extend(tokens)
+
+        sends = []
+        for (title, body), tokens in groups.items():
+            tokens = list(dict.fromkeys(tokens))
+            for start in range(0, len(tokens), FCM_MULTICAST_LIMIT):
+                sends.append(self._send(tokens[start:start + FCM_MULTICAST_LIMIT], title, body, attempt=0))
+        await asyncio.gather(*sends)
+
+    async def _send(self, tokens: List[str], title: str, body: str, attempt: int):
+        loop = asyncio.get_running_loop()
+        async with self._sending:
+            self.requests += 1
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, self.client.send_multicast, tokens, title, body
+                )
+            except Exception as e:
+                logger.warning("FCM request failed (attempt %d): %s", attempt + 1, e)
+                self._schedule_retry(tokens, title, body, attempt)
+                return
+
+        dead: Set[str] = set()
+        canonical: Dict[str, str] = {}
+        retry: List[str] = []
+        for token, result in zip(tokens, results):
+            error = result.get("error")
+            if error is None:
+                self.sent += 1
+                if result.get("registration_id"):
+                    canonical[token] = result["registration_id"]
+            elif error in DEAD_TOKEN_ERRORS:
+                dead.add(token)
+            elif error in RETRYABLE_TOKEN_ERRORS:
+                retry.append(token)
+            else:
+                self.failed += 1
+
+        if retry:
+            self._schedule_retry(retry, title, body, attempt)
+        if dead or canonical:
+            try:
+                await apply_token_updates(dead, canonical, self.session_factory)
+                self.pruned += len(dead)
+            except Exception:
+                logger.exception("Failed to prune %d device tokens", len(dead))
+
+    def _schedule_retry(self, tokens: List[str], title: str, body: str, attempt: int):
+        if attempt + 1 > self.max_retries:
+            self.failed += len(tokens)
+            return
+        self.retried += len(tokens)
+        delay = self.retry_base * (2 ** attempt)
+        task = asyncio.create_task(self._retry_later(delay, tokens, title, body, attempt + 1))
+        self._retries.add(task)
+        task.add_done_callback(self._retries.discard)
+
+    async def _retry_later(self, delay: float, tokens: List[str], title: str, body: str, attempt: int):
+        await asyncio.sleep(delay)
+        await self._send(tokens, title, body, attempt)
+
+
+push_dispatcher = PushDispatcher(
+    client=get_fcm_client(),
+    max_queue_size=settings.PUSH_QUEUE_SIZE,
+    batch_size=settings.PUSH_BATCH_SIZE,
+    workers=settings.PUSH_WORKERS,
+    max_retries=settings.PUSH_MAX_RETRIES,
+    retry_base=settings.PUSH_RETRY_BASE_SECONDS,
+)
+
+
+async def send_fcm_notification(user_id: str, title: str, body: str):
+    """Queue an FCM push notification to all of a user's devices"""
+    if not push_dispatcher.enabled:
+        return
+    if not push_dispatcher.enqueue(user_id, title, body):
+        logger.warning("Push queue full, dropped notification for user %s", user_id)
@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import re
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, as_utc, sqlite_strftime
+from app.models import BusLocation, BusLocationRollup
+
+logger = logging.getLogger(__name__)
+
+PARTITION_NAME = re.compile(r"^bus_locations_p(\d{8})$")
+
+
+def floor_minute(value: datetime) -> datetime:
+    return value.replace(second=0, microsecond=0)
+
+
+def minute_bucket(column, dialect: str):
+    """SQL expression truncating `column` to the minute."""
+    if dialect == "postgresql":
+        return func.date_trunc("minute", column)
+    return sqlite_strftime("%Y-%m-%d %H:%M:00.000000", column)
+
+
+def day_partition_ddl(day: date) -> str:
+    start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    end = start + timedelta(days=1)
+    return (
+        f"CREATE TABLE IF NOT EXISTS bus_locations_p{day:%Y%m%d} PARTITION OF bus_locations "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+class LocationMaintenance:
+    """Periodic upkeep of the GPS history tables.
+
+    Every `interval` seconds:
+
+    - rolls raw bus_locations rows up into bus_location_rollups, one averaged
+      point per bus per minute, for every complete minute older than
+      `rollup_delay` (so telemetry still in flight is not missed). The last
+      `rollup_lookback` minutes are recomputed on every pass and upserted,
+      so rows the batched ingestor writes late still reach their minute;
+    - on Postgres with a partitioned bus_locations, creates daily partitions
+      `days_ahead` days in advance and drops partitions older than
+      `retention_days` (plus expired rows in the DEFAULT partition);
+      elsewhere deletes expired rows in batches of `delete_batch_size`;
+    - deletes rollups older than `rollup_retention_days`.
+    """
+
+    def __init__(self, interval: float = 300.0, retention_days: int = 30,
+                 rollup_retention_days: int = 365, days_ahead: int = 7,
+                 rollup_delay: float = 120.0, rollup_lookback: int = 15,
+                 delete_batch_size: int = 10000, session_factory=AsyncSessionLocal):
+        self.interval = interval
+        self.retention_days = retention_days
+        self.rollup_retention_days = rollup_retention_days
+        self.days_ahead = days_ahead
+        self.rollup_delay = rollup_delay
+        self.rollup_lookback = rollup_lookback
+        self.delete_batch_size = delete_batch_size
+        self.session_factory = session_factory
+        self._task: Optional[asyncio.Task] = None
+
+        self.runs = 0
+        self.errors = 0
+        self.rolled_up = 0
+        self.deleted_rows = 0
+        self.deleted_rollups = 0
+        self.created_partitions = 0
+        self.dropped_partitions = 0
+        self.partitioned: Optional[bool] = None
+        self.last_run_ms = 0.0
+
+    def start(self):
+        if self.interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                self.errors += 1
+                logger.exception("Bus location maintenance failed")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self, now: Optional[datetime] = None):
+        now = now or datetime.now(timezone.utc)
+        started = time.perf_counter()
+        async with self.session_factory() as db:
+            dialect = db.get_bind().dialect.name
+            if self.partitioned is None:
+                self.partitioned = dialect == "postgresql" and await self._is_partitioned(db)
+            if self.partitioned:
+                await self._create_partitions(db, now.date())
+            await self._rollup(db, dialect, now)
+            cutoff = now - timedelta(days=self.retention_days)
+            if self.partitioned:
+                await self._drop_partitions(db, cutoff)
+            else:
+                await self._delete_expired(db, cutoff)
+            result = await db.execute(delete(BusLocationRollup).where(
+                BusLocationRollup.minute < now - timedelta(days=self.rollup_retention_days)
+            ))
+            self.deleted_rollups += result.rowcount or 0
+            await db.commit()
+        self.runs += 1
+        self.last_run_ms = (time.perf_counter() - started) * 1000
+
+    async def _is_partitioned(self, db) -> bool:
+        result = await db.execute(text(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = 'bus_locations'"
+        ))
+        return result.first() is not None
+
+    async def _rollup(self, db, dialect: str, now: datetime):
+        end = floor_minute(now - timedelta(seconds=self.rollup_delay))
+        last = await db.scalar(select(func.max(BusLocationRollup.minute)))
+        if last is not None:
+            start = min(as_utc(last) + timedelta(minutes=1),
+                        end - timedelta(minutes=self.rollup_lookback))
+        else:
+            oldest = await db.scalar(select(func.min(BusLocation.timestamp)))
+            if oldest is None:
+                return
+            start = floor_minute(as_utc(oldest))
+        if start >= end:
+            return
+
+        minute = minute_bucket(BusLocation.timestamp, dialect).label("minute")
+        rows = select(
+            BusLocation.bus_id,
+            minute,
+            func.avg(BusLocation.latitude),
+            func.avg(BusLocation.longitude),
+            func.avg(func.coalesce(BusLocation.speed, 0.0)),
+            func.max(func.coalesce(BusLocation.speed, 0.0)),
+            func.count(),
+        ).where(
+            BusLocation.timestamp >= start,
+            BusLocation.timestamp < end,
+        ).group_by(BusLocation.bus_id, minute)
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert(BusLocationRollup).from_select(
+            ["bus_id", "minute", "latitude", "longitude", "speed", "max_speed", "samples"], rows
+        )
+        # Recomputed minutes are only rewritten when late rows changed them
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["bus_id", "minute"],
+            set_={name: stmt.excluded[name] for name in ("latitude", "longitude", "speed", "max_speed", "samples")},
+            where=BusLocationRollup.samples != stmt.excluded.samples,
+        )
+        result = await db.execute(stmt)
+        self.rolled_up += result.rowcount or 0
+
+    async def _delete_expired(self, db, cutoff: datetime):
+        # Bounded batches keep each transaction (and lock) short
+        while True:
+            expired = select(BusLocation.id).where(BusLocation.timestamp < cutoff).limit(self.delete_batch_size)
+            result = await db.execute(delete(BusLocation).where(BusLocation.id.in_(expired.scalar_subquery())))
+            deleted = result.rowcount or 0
+            self.deleted_rows += deleted
+            await db.commit()
+            if deleted < self.delete_batch_size:
+                return
+
+    async def _partitions(self, db) -> List[str]:
+        result = await db.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = 'bus_locations'"
+        ))
+        return [row[0] for row in result]
+
+    async def _create_partitions(self, db, today: date):
+        existing = set(await self._partitions(db))
+        for offset in range(self.days_ahead + 1):
+            day = today + timedelta(days=offset)
+            if f"bus_locations_p{day:%Y%m%d}" in existing:
+                continue
+            try:
+                async with db.begin_nested():
+                    await db.execute(text(day_partition_ddl(day)))
+                self.created_partitions += 1
+            except Exception:
+                # e.g. the DEFAULT partition already holds rows for that day
+                logger.exception("Cannot create bus_locations partition for %s", day)
+        await db.commit()
+
+    async def _drop_partitions(self, db, cutoff: datetime):
+        for name in await self._partitions(db):
+            match = PARTITION_NAME.match(name)
+            if not match:
+                continue
+            day = datetime.strptime(match.group(1), "%Y%m%d").replace(tzinfo=timezone.utc)
+            if day + timedelta(days=1) <= cutoff:
+                await db.execute(text(f"DROP TABLE {name}"))
+                await db.commit()
+                self.dropped_partitions += 1
+        result = await db.execute(text(
+            'DELETE FROM bus_locations_default WHERE "timestamp" < :cutoff'
+        ), {"cutoff": cutoff})
+        self.deleted_rows += result.rowcount or 0
+        await db.commit()
+
+    def stats(self) -> dict:
+        return {
+            "partitioned": self.partitioned,
+            "runs": self.runs,
+            "errors": self.errors,
+            "rolled_up": self.rolled_up,
+            "deleted_rows": self.deleted_rows,
+            "deleted_rollups": self.deleted_rollups,
+            "created_partitions": self.created_partitions,
+            "dropped_partitions": self.dropped_partitions,
+            "last_run_ms": round(self.last_run_ms, 3),
+        }
+
+
+location_maintenance = LocationMaintenance(
+    interval=settings.LOCATION_MAINTENANCE_INTERVAL_SECONDS,
+    retention_days=settings.LOCATION_RETENTION_DAYS,
+    rollup_retention_days=settings.LOCATION_ROLLUP_RETENTION_DAYS,
+    days_ahead=settings.LOCATION_PARTITION_DAYS_AHEAD,
+    rollup_delay=settings.LOCATION_ROLLUP_DELAY_SECONDS,
+    rollup_lookback=settings.LOCATION_ROLLUP_LOOKBACK_MINUTES,
+)
@@ -0,0 +1,46 @@
+from app.core.config import settings
+from app.core.security import get_password_hash, verify_password
+from app.services.bounded_executor import BoundedExecutor, ExecutorBusy
+
+
+class PasswordHasherBusy(ExecutorBusy):
+    """Raised when too many hash/verify calls are already waiting."""
+
+
+class PasswordHasher:
+    """Run bcrypt in a `BoundedExecutor`.
+
+    bcrypt releases the GIL while it works, so `workers` threads give that
+    many hashes in parallel without stalling sockets or other requests.
+    Past `max_pending` waiting calls, or after `stop`, calls raise
+    `PasswordHasherBusy`.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 256, sample_size: int = 1024):
+        self._pool = BoundedExecutor(workers, max_pending, thread_name_prefix="bcrypt",
+                                     busy=PasswordHasherBusy, sample_size=sample_size)
+
+    @property
+    def workers(self) -> int:
+        return self._pool.workers
+
+    def start(self):
+        self._pool.start()
+
+    def stop(self):
+        self._pool.stop()
+
+    async def hash(self, password: str) -> str:
+        return await self._pool.run(get_password_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._pool.run(verify_password, password, hashed_password)
+
+    def stats(self) -> dict:
+        return self._pool.stats()
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import PaymentEvent, Subscription
+from app.services.subscription_index import subscription_index
+
+logger = logging.getLogger(__name__)
+
+
+async def activate_subscription(db, event: dict) -> Optional[Subscription]:
+    """checkout.session.completed: activate the subscription paid for."""
+    metadata = event["data"]["object"].get("metadata") or {}
+    result = await db.execute(select(Subscription).where(
+        Subscription.user_id == metadata.get("user_id"),
+        Subscription.route_id == metadata.get("route_id"),
+        Subscription.stop_id == metadata.get("stop_id")
+    ))
+    subscription = result.scalars().first()
+    if subscription:
+        subscription.is_active = True
+    return subscription
+
+
+# Event type -> handler(db, event) returning a Subscription to re-index
+# after commit (or None); other event types are acknowledged and dropped
+HANDLERS = {
+    "checkout.session.completed": activate_subscription,
+}
+
+
+def event_insert(dialect: str, event_id: str, event_type: str, payload: str, now: datetime):
+    """Statement storing one webhook event unless its id is already stored."""
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    return insert(PaymentEvent).values(
+        id=event_id, type=event_type, payload=payload, status="pending", attempts=0,
+        next_attempt_at=now, received_at=now,
+    ).on_conflict_do_nothing(index_elements=["id"])
+
+
+class PaymentEventProcessor:
+    """Applies stored Stripe webhook events in the background.
+
+    The webhook only verifies the signature and stores the event (`store`);
+    a redelivery hits the primary key and is a no-op. This worker applies
+    due pending events up to `batch_size` at a time, woken after each new
+    event and every `poll_interval` seconds for retries and events stored
+    by other workers. Each event runs in its own savepoint; a failure is
+    retried after `retry_base` * 2^(attempts - 1) seconds and the event is
+    marked failed after `max_attempts`. On Postgres the batch is claimed
+    with FOR UPDATE SKIP LOCKED, so every worker can run this loop.
+    """
+
+    def __init__(self, poll_interval: float = 5.0, batch_size: int = 100, max_attempts: int = 8,
+                 retry_base: float = 5.0, session_factory=AsyncSessionLocal):
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.session_factory = session_factory
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+
+        self.stored = 0
+        self.duplicates = 0
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+        self.errors = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def store(self, db, event_id: str, event_type: str, payload: str) -> bool:
+        """Persist a verified webhook event; False if it was already stored."""
+        dialect = db.get_bind().dialect.name
+        result = await db.execute(event_insert(dialect, event_id, event_type, payload, datetime.now(timezone.utc)))
+        await db.commit()
+        if not result.rowcount:
+            self.duplicates += 1
+            return False
+        self.stored += 1
+        if self._wake is not None:
+            self._wake.set()
+        return True
+
+    async def _loop(self):
+        while True:
+            self._wake.clear()
+            try:
+                while await self.run_once() >= self.batch_size:
+                    pass
+            except Exception:
+                self.errors += 1
+                logger.exception("Payment event processing failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_once(self, now: Optional[datetime] = None) -> int:
+        """Apply one batch of due events; returns how many were attempted."""
+        now = now or datetime.now(timezone.utc)
+        activated = []
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(PaymentEvent)
+                .where(PaymentEvent.status == "pending", PaymentEvent.next_attempt_at <= now)
+                .order_by(PaymentEvent.next_attempt_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            events = result.scalars().all()
+            for event in events:
+                try:
+                    async with db.begin_nested():
+                        handler = HANDLERS.get(event.type)
+                        subscription = await handler(db, json.loads(event.payload)) if handler else None
+                except Exception as e:
+                    self._failed_attempt(event, e, now)
+                    continue
+                event.status = "processed"
+                event.processed_at = now
+                self.processed += 1
+                if subscription is not None:
+                    activated.append(subscription)
+            await db.commit()
+        # Only committed subscriptions reach the in-memory index
+        for subscription in activated:
+            subscription_index.upsert(subscription)
+        return len(events)
+
+    def _failed_attempt(self, event: PaymentEvent, error: Exception, now: datetime):
+        event.attempts += 1
+        event.last_error = repr(error)[:1000]
+        if event.attempts >= self.max_attempts:
+            event.status = "failed"
+            self.failed += 1
+            logger.error("Payment event %s (%s) failed after %d attempts: %r",
+                         event.id, event.type, event.attempts, error)
+            return
+        event.next_attempt_at = now + timedelta(seconds=self.retry_base * 2 ** (event.attempts - 1))
+        self.retried += 1
+        logger.warning("Payment event %s (%s) failed, attempt %d: %r", event.id, event.type, event.attempts, error)
+
+    def stats(self) -> dict:
+        return {
+            "stored": self.stored,
+            "duplicates": self.duplicates,
+            "processed": self.processed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "errors": self.errors,
+        }
+
+
+payment_event_processor = PaymentEventProcessor(
+    poll_interval=settings.PAYMENT_EVENT_POLL_SECONDS,
+    batch_size=settings.PAYMENT_EVENT_BATCH_SIZE,
+    max_attempts=settings.PAYMENT_EVENT_MAX_ATTEMPTS,
+    retry_base=settings.PAYMENT_EVENT_RETRY_BASE_SECONDS,
+)
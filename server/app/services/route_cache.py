@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, object_session
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.state_channel import state_channel
+from app.models import Route, Stop
+from app.services.stop_locator import StopLocator
+
+logger = logging.getLogger(__name__)
+
+
+class RouteGeometry:
+    """Immutable snapshot of a route's stops, ordered by `Stop.index`.
+
+    Coordinates are held in contiguous float64 arrays so distance maths can
+    run vectorized over a whole route; ids, names and indexes are parallel
+    lists addressed by the same position.
+    """
+
+    __slots__ = ("route_id", "stop_ids", "names", "indexes", "lats", "lngs",
+                 "position_by_stop_id", "loaded_at", "_locator")
+
+    def __init__(self, route_id: str, stops: List[tuple]):
+        # stops: (id, name, index, latitude, longitude), already ordered
+        self.route_id = route_id
+        self.stop_ids = [s[0] for s in stops]
+        self.names = [s[1] for s in stops]
+        self.indexes = [s[2] for s in stops]
+        self.lats = np.array([s[3] for s in stops], dtype=np.float64)
+        self.lngs = np.array([s[4] for s in stops], dtype=np.float64)
+        self.position_by_stop_id = {stop_id: i for i, stop_id in enumerate(self.stop_ids)}
+        self.loaded_at = time.monotonic()
+        self._locator = None
+
+    @property
+    def stop_count(self) -> int:
+        return len(self.stop_ids)
+
+    @property
+    def locator(self) -> StopLocator:
+        """Spatial index over the stops, built on first use."""
+        if self._locator is None:
+            self._locator = StopLocator(self)
+        return self._locator
+
+    def stop_name(self, stop_id: str) -> Optional[str]:
+        position = self.position_by_stop_id.get(stop_id)
+        return self.names[position] if position is not None else None
+
+
+async def load_geometries(route_id: Optional[str] = None,
+                          session_factory=AsyncSessionLocal) -> Dict[str, RouteGeometry]:
+    """Read stops for one route (or all routes) in a single query."""
+    route_query = select(Route.id)
+    stop_query = select(
+        Stop.route_id, Stop.id, Stop.name, Stop.index, Stop.latitude, Stop.longitude
+    )
+    if route_id is not None:
+        route_query = route_query.where(Route.id == route_id)
+        stop_query = stop_query.where(Stop.route_id == route_id)
+
+    async with session_factory() as db:
+        route_ids = (await db.execute(route_query)).scalars().all()
+        stop_rows = (await db.execute(stop_query.order_by(Stop.route_id, Stop.index))).all()
+
+    grouped: Dict[str, List[tuple]] = {rid: [] for rid in route_ids}
+    for row in stop_rows:
+        grouped.setdefault(row[0], []).append(tuple(row[1:]))
+
+    geometries = {rid: RouteGeometry(rid, stops) for rid, stops in grouped.items()}
+    if route_id is not None and route_id not in geometries:
+        # Cache unknown routes as empty so bad route ids don't hit the DB on every ping
+        geometries[route_id] = RouteGeometry(route_id, [])
+    return geometries
+
+
+class RouteCache:
+    """Process-wide cache of `RouteGeometry` keyed by route id.
+
+    Entries are loaded lazily on first use (or all at once by `warm`), are
+    invalidated whenever a Route or Stop row is committed through the ORM (on
+    every worker), and expire after `ttl` seconds as a fallback for changes
+    made outside the API.
+    """
+
+    def __init__(self, ttl: float = 300.0, loader=load_geometries):
+        self.ttl = ttl
+        self._loader = loader
+        self._entries: Dict[str, RouteGeometry] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._listeners: List[Callable[[Optional[str]], None]] = []
+        self.hits = 0
+        self.misses = 0
+
+    def _is_fresh(self, geometry: RouteGeometry) -> bool:
+        return self.ttl <= 0 or time.monotonic() - geometry.loaded_at < self.ttl
+
+    def peek(self, route_id: str) -> Optional[RouteGeometry]:
+        """Return the cached geometry without loading, or None."""
+        geometry = self._entries.get(route_id)
+        if geometry is not None and self._is_fresh(geometry):
+            return geometry
+        return None
+
+    async def get(self, route_id: str) -> RouteGeometry:
+        geometry = self.peek(route_id)
+        if geometry is not None:
+            self.hits += 1
+            return geometry
+
+        self.misses += 1
+        # Concurrent misses for the same route share a single load
+        pending = self._inflight.get(route_id)
+        if pending is None:
+            pending = asyncio.ensure_future(self._loader(route_id))
+            self._inflight[route_id] = pending
+            try:
+                loaded = await pending
+            finally:
+                self._inflight.pop(route_id, None)
+            self._entries.update(loaded)
+            return loaded[route_id]
+        loaded = await pending
+        return loaded[route_id]
+
+    async def warm(self):
+        """Load every route's geometry in one pass."""
+        loaded = await self._loader(None)
+        self._entries = loaded
+        logger.info("Route cache warmed with %d routes", len(loaded))
+
+    def invalidate(self, route_id: Optional[str] = None):
+        """Drop one route, or everything when `route_id` is None."""
+        if route_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(route_id, None)
+        for listener in self._listeners:
+            listener(route_id)
+
+    def add_listener(self, callback: Callable[[Optional[str]], None]):
+        """Call `callback(route_id)` whenever routes are invalidated, so other
+        caches derived from routes and stops can follow the same commits."""
+        self._listeners.append(callback)
+
+    def stats(self) -> dict:
+        return {"routes": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+route_cache = RouteCache(ttl=settings.ROUTE_CACHE_TTL_SECONDS)
+
+
+# Invalidation: remember which routes a session touched and drop them from the
+# cache once the transaction commits, so readers never reload pre-commit data.
+# Other workers drop them too when the commit is published on the state channel.
+_DIRTY_KEY = "route_cache_dirty"
+
+
+def _mark_dirty(target, route_id):
+    session = object_session(target)
+    if session is not None and route_id is not None:
+        session.info.setdefault(_DIRTY_KEY, set()).add(route_id)
+
+
+def _mark_stop_dirty(mapper, connection, target):
+    _mark_dirty(target, target.route_id)
+    # A stop moved to another route also changes the route it left
+    for previous_route_id in inspect(target).attrs.route_id.history.deleted:
+        _mark_dirty(target, previous_route_id)
+
+
+def _mark_route_dirty(mapper, connection, target):
+    _mark_dirty(target, target.id)
+
+
+for _event_name in ("after_insert", "after_update", "after_delete"):
+    event.listen(Stop, _event_name, _mark_stop_dirty)
+    event.listen(Route, _event_name, _mark_route_dirty)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_routes(session):
+    for route_id in session.info.pop(_DIRTY_KEY, ()):
+        route_cache.invalidate(route_id)
+        state_channel.publish("routes:invalidate", route_id=route_id)
+
+
+state_channel.on("routes:invalidate", lambda change: route_cache.invalidate(change["route_id"]))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_dirty_routes(session):
+    session.info.pop(_DIRTY_KEY, None)
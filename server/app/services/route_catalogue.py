@@ -0,0 +1,122 @@
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import Route
+from app.schemas import RouteResponse
+from app.services.route_cache import route_cache
+
+logger = logging.getLogger(__name__)
+
+_route_list = TypeAdapter(List[RouteResponse])
+
+
+class CachedBody(NamedTuple):
+    body: bytes
+    etag: str
+
+
+class CatalogueSnapshot(NamedTuple):
+    routes: CachedBody                  # the full GET /routes body
+    by_id: Dict[str, CachedBody]        # GET /routes/{route_id} bodies
+    loaded_at: float
+
+
+def make_etag(body: bytes) -> str:
+    return '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate an If-None-Match header (weak comparison, lists and `*`)."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def _cached(payload: bytes) -> CachedBody:
+    return CachedBody(payload, make_etag(payload))
+
+
+async def load_catalogue(session_factory=AsyncSessionLocal) -> CatalogueSnapshot:
+    """Load every route with its stops (two queries) and serialize it."""
+    async with session_factory() as db:
+        result = await db.execute(select(Route).options(selectinload(Route.stops)).order_by(Route.name, Route.id))
+        routes = [RouteResponse.model_validate(route) for route in result.scalars().all()]
+    by_id = {route.id: _cached(route.model_dump_json().encode()) for route in routes}
+    return CatalogueSnapshot(_cached(_route_list.dump_json(routes)), by_id, time.monotonic())
+
+
+class RouteCatalogue:
+    """Pre-serialized JSON for the route catalogue endpoints.
+
+    The whole catalogue is loaded and rendered once, then served as bytes
+    with an ETag until a Route or Stop commit invalidates it (via the route
+    cache's commit hooks) or `ttl` seconds pass. A load that races with an
+    invalidation is used for that request but not kept.
+    """
+
+    def __init__(self, ttl: float = 300.0, loader=load_catalogue):
+        self.ttl = ttl
+        self._loader = loader
+        self._snapshot: Optional[CatalogueSnapshot] = None
+        self._inflight: Optional[asyncio.Future] = None
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def _is_fresh(self, snapshot: CatalogueSnapshot) -> bool:
+        return self.ttl <= 0 or time.monotonic() - snapshot.loaded_at < self.ttl
+
+    async def get(self) -> CatalogueSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and self._is_fresh(snapshot):
+            self.hits += 1
+            return snapshot
+
+        self.misses += 1
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._load(self._generation))
+        pending = self._inflight
+        try:
+            return await asyncio.shield(pending)
+        finally:
+            if pending.done() and self._inflight is pending:
+                self._inflight = None
+
+    async def _load(self, generation: int) -> CatalogueSnapshot:
+        snapshot = await self._loader()
+        if generation == self._generation:
+            self._snapshot = snapshot
+        return snapshot
+
+    def invalidate(self, route_id: Optional[str] = None):
+        self._generation += 1
+        self._snapshot = None
+        self._inflight = None
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "cached": snapshot is not None,
+            "routes": len(snapshot.by_id) if snapshot is not None else 0,
+            "bytes": len(snapshot.routes.body) if snapshot is not None else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+        }
+
+
+route_catalogue = RouteCatalogue(ttl=settings.ROUTE_CACHE_TTL_SECONDS)
+route_cache.add_listener(route_catalogue.invalidate)
@@ -0,0 +1,145 @@
+from typing import List, NamedTuple, Optional
+
+
+class StopArrival(NamedTuple):
+    position: int       # position in the route's ordered stop arrays
+    stop_id: str
+    stop_index: int     # Stop.index of that stop
+
+
+class ProgressUpdate(NamedTuple):
+    position: int       # last stop reached on this trip
+    progress_m: float   # distance travelled along the stop polyline
+    arrivals: List[StopArrival]
+    trip: int
+    trip_started: bool
+    trip_completed: bool
+
+
+class BusProgress:
+    """Where one bus is along its route on the current trip."""
+
+    __slots__ = ("route_id", "position", "progress_m", "misses", "trip", "completed")
+
+    def __init__(self, route_id: str):
+        self.route_id = route_id
+        self.position: Optional[int] = None
+        self.progress_m = 0.0
+        self.misses = 0
+        self.trip = 0
+        self.completed = False
+
+    def reset(self, route_id: Optional[str] = None):
+        """Forget the position; the next ping seeds a new trip."""
+        if route_id is not None:
+            self.route_id = route_id
+        self.position = None
+        self.progress_m = 0.0
+        self.misses = 0
+        self.completed = False
+
+
+class RouteProgressTracker:
+    """Advance buses monotonically along their route's stop sequence.
+
+    After the first ping (which is placed with a global nearest-stop lookup),
+    each ping is projected only onto the segments between the last reached
+    stop and `window` stops ahead of it. Progress never moves backwards
+    within a trip, so GPS noise or a route that crosses itself cannot make
+    the bus jump between stop indexes. A stop counts as reached once the
+    along-route progress is within `arrival_radius_m` of it; stops skipped
+    between two pings are reported as reached too, in order.
+
+    Pings farther than `off_route_m` from every segment in the window are
+    ignored; after `reseed_after` of them in a row the bus is re-placed
+    globally (e.g. it took a detour past the window). Reaching the last stop
+    completes the trip; a new trip starts when the bus is next seen near the
+    start of the route.
+    """
+
+    def __init__(self, window: int = 3, arrival_radius_m: float = 50.0,
+                 off_route_m: float = 250.0, reseed_after: int = 5):
+        self.window = max(window, 1)
+        self.arrival_radius_m = arrival_radius_m
+        self.off_route_m = off_route_m
+        self.reseed_after = reseed_after
+
+    def update(self, state: BusProgress, geometry, lat: float, lng: float) -> Optional[ProgressUpdate]:
+        """Apply one ping; returns None when the route has no stops."""
+        stop_count = geometry.stop_count
+        if not stop_count:
+            return None
+        if state.route_id != geometry.route_id:
+            state.reset(geometry.route_id)
+        locator = geometry.locator
+
+        if state.completed:
+            nearest = locator.nearest(lat, lng)
+            if nearest.position >= min(self.window, stop_count - 1):
+                # Still at (or heading back from) the end of the route
+                return self._unchanged(state)
+            state.reset()
+            return self._seed(state, geometry, nearest)
+        if state.position is None:
+            return self._seed(state, geometry, locator.nearest(lat, lng))
+
+        px, py = locator.project_point(lat, lng)
+        # From the segment leading into the current stop to `window` stops ahead
+        hit = locator.best_segment(px, py, state.position - 1, state.position + self.window - 1)
+        if hit is None or hit[2] > self.off_route_m:
+            state.misses += 1
+            if hit is not None and state.misses >= self.reseed_after:
+                return self._reseed(state, geometry, lat, lng)
+            return self._unchanged(state)
+
+        state.misses = 0
+        state.progress_m = max(state.progress_m, hit[1])
+        return self._advance(state, geometry, trip_started=False)
+
+    def _advance(self, state: BusProgress, geometry, trip_started: bool,
+                 window: Optional[int] = None) -> ProgressUpdate:
+        stop_progress_m = geometry.locator.stop_progress_m
+        last = geometry.stop_count - 1
+        limit = min(state.position + (window or self.window), last)
+        arrivals = []
+        while (state.position < limit
+               and stop_progress_m[state.position + 1] - self.arrival_radius_m <= state.progress_m):
+            state.position += 1
+            arrivals.append(self._arrival(geometry, state.position))
+        state.completed = state.position == last and last > 0
+        return ProgressUpdate(state.position, state.progress_m, arrivals, state.trip,
+                              trip_started, state.completed)
+
+    def _seed(self, state: BusProgress, geometry, nearest) -> ProgressUpdate:
+        state.trip += 1
+        stop_progress_m = geometry.locator.stop_progress_m
+        state.progress_m = nearest.progress_m
+        state.misses = 0
+        # The nearest stop only counts as reached if the bus is at or past it
+        position = nearest.position
+        if stop_progress_m[position] - self.arrival_radius_m > nearest.progress_m:
+            position = max(position - 1, 0)
+        state.position = position
+
+        update = self._advance(state, geometry, trip_started=True)
+        if nearest.distance_m <= self.arrival_radius_m and nearest.position == state.position:
+            update.arrivals.insert(0, self._arrival(geometry, state.position))
+        return update
+
+    def _reseed(self, state: BusProgress, geometry, lat: float, lng: float) -> ProgressUpdate:
+        previous_position = state.position
+        nearest = geometry.locator.nearest(lat, lng)
+        if nearest.position >= previous_position:
+            # Same trip, the bus just got ahead of the window
+            state.misses = 0
+            state.progress_m = max(state.progress_m, nearest.progress_m)
+            return self._advance(state, geometry, trip_started=False, window=geometry.stop_count)
+        state.reset()
+        return self._seed(state, geometry, nearest)
+
+    def _unchanged(self, state: BusProgress) -> ProgressUpdate:
+        return ProgressUpdate(state.position, state.progress_m, [], state.trip, False, state.completed)
+
+    @staticmethod
+    def _arrival(geometry, position: int) -> StopArrival:
+        return StopArrival(position, geometry.stop_ids[position], geometry.indexes[position])
@@ -0,0 +1,397 @@
+import asyncio
+import json
+import logging
+import pickle
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+import msgpack
+import socketio
+from engineio import packet as eio_packet
+from socketio import packet
+from socketio.async_pubsub_manager import AsyncPubSubManager
+
+from app.core.config import settings
+from app.services.compact_updates import FORMATS, CompactStreams, stream_key
+
+logger = logging.getLogger(__name__)
+
+# Payload encodings a client can ask for at connect
+ENCODINGS = ("json", "msgpack")
+
+# Events that clients on the compact format get as keyframes/deltas
+COMPACT_EVENTS = ("bus:update",)
+
+# Pub/sub message type carrying live bus state between workers; see BusStateStore
+STATE_METHOD = "bus_state"
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+PG_NOTIFY_MAX_BYTES = 7999
+
+
+class FanoutMixin:
+    """Cheaper local delivery of event broadcasts.
+
+    python-socketio's emit schedules one asyncio task per recipient. Here
+    the packet is encoded once per payload encoding in use and written to
+    each recipient's Engine.IO queue in a plain loop (a queue put, so it
+    never blocks). `room` may be a list; a client in several of the rooms
+    gets the event once.
+
+    Clients that negotiated `msgpack` get every event argument as a
+    msgpack binary attachment instead of JSON text. Clients on the
+    `compact` format get COMPACT_EVENTS as quantized deltas against the
+    previous update sent to the same room (see compact_updates); the first
+    update of a stream after joining or leaving a room is a keyframe.
+    """
+
+    def __init__(self, *args, keyframe_interval: int = settings.COMPACT_KEYFRAME_INTERVAL, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._encodings: Dict[str, str] = {}  # sid -> non-default encoding
+        self._synced: Dict[str, Set[Tuple[Hashable, str]]] = {}  # compact sid -> (stream, bus) it can apply deltas to
+        self._sid_rooms: Dict[Tuple[str, str], Set[Optional[str]]] = {}  # (namespace, sid) -> rooms
+        self.compact = CompactStreams(keyframe_interval)
+        self.emits = 0
+        self.encoded_packets = 0
+        self.deliveries = 0
+
+    def set_encoding(self, sid: str, encoding: str):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown encoding {encoding!r}")
+        if encoding == "json":
+            self._encodings.pop(sid, None)
+        else:
+            self._encodings[sid] = encoding
+
+    def set_format(self, sid: str, fmt: str):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format {fmt!r}")
+        if fmt == "full":
+            self._synced.pop(sid, None)
+        else:
+            self._synced.setdefault(sid, set())
+
+    async def disconnect(self, sid, namespace, **kwargs):
+        self._encodings.pop(sid, None)
+        self._synced.pop(sid, None)
+        return await super().disconnect(sid, namespace, **kwargs)
+
+    # Membership changes can make a client miss frames of a stream it keeps
+    # (e.g. route updates skip bus-room members), so start over with keyframes
+
+    async def enter_room(self, sid, namespace, room, eio_sid=None):
+        if sid in self._synced:
+            self._synced[sid].clear()
+        return await super().enter_room(sid, namespace, room, eio_sid=eio_sid)
+
+    async def leave_room(self, sid, namespace, room):
+        if sid in self._synced:
+            self._synced[sid].clear()
+        return await super().leave_room(sid, namespace, room)
+
+    # python-socketio finds a client's rooms by scanning every room in the
+    # namespace, and each user has a personal room, so a disconnect (or a
+    # refused connect) cost O(connected users). Track rooms per sid instead.
+
+    def basic_enter_room(self, sid, namespace, room, eio_sid=None):
+        super().basic_enter_room(sid, namespace, room, eio_sid=eio_sid)
+        self._sid_rooms.setdefault((namespace, sid), set()).add(room)
+
+    def basic_leave_room(self, sid, namespace, room):
+        super().basic_leave_room(sid, namespace, room)
+        rooms = self._sid_rooms.get((namespace, sid))
+        if rooms is not None:
+            rooms.discard(room)
+            if not rooms:
+                del self._sid_rooms[(namespace, sid)]
+
+    def basic_disconnect(self, sid, namespace, **kwargs):
+        for room in list(self._sid_rooms.get((namespace, sid), ())):
+            self.basic_leave_room(sid, namespace, room)
+        self.callbacks.pop(sid, None)
+        pending = self.pending_disconnect.get(namespace)
+        if pending is not None and sid in pending:
+            pending.remove(sid)
+            if not pending:
+                del self.pending_disconnect[namespace]
+
+    def get_rooms(self, sid, namespace):
+        return [room for room in self._sid_rooms.get((namespace, sid), ()) if room is not None]
+
+    async def emit(self, event, data, namespace=None, room=None, skip_sid=None,
+                   callback=None, **kwargs):
+        local = not isinstance(self, AsyncPubSubManager) or kwargs.get("ignore_queue")
+        if callback is not None or not local:
+            return await super().emit(event, data, namespace=namespace, room=room,
+                                      skip_sid=skip_sid, callback=callback, **kwargs)
+        await self._fanout(event, data, namespace or "/", room, skip_sid)
+
+    async def _handle_emit(self, message):
+        # Pub/sub delivery to this host's clients (local and remote emits)
+        if message.get("callback") is not None:
+            return await super()._handle_emit(message)
+        await self._fanout(message["event"], message["data"], message.get("namespace") or "/",
+                           message.get("room"), message.get("skip_sid"))
+
+    async def _fanout(self, event, data, namespace, room, skip_sid):
+        if namespace not in self.rooms:
+            return
+        if isinstance(data, tuple):
+            args = list(data)
+        elif data is not None:
+            args = [data]
+        else:
+            args = []
+        skip = set(skip_sid) if isinstance(skip_sid, list) else {skip_sid}
+        compact = self._synced and event in COMPACT_EVENTS and len(args) == 1 and isinstance(args[0], dict)
+        if compact:
+            stream = (stream_key(room), args[0]["busId"])
+            frames = None
+            for sid in skip:
+                if sid in self._synced:
+                    self._synced[sid].discard(stream)
+
+        self.emits += 1
+        packets: Dict[Tuple[str, str], list] = {}
+        for sid, eio_sid in self.get_participants(namespace, room):
+            if sid in skip:
+                continue
+            encoding = self._encodings.get(sid, "json")
+            variant = "full"
+            variant_args = args
+            synced = self._synced.get(sid) if compact else None
+            if synced is not None:
+                if frames is None:
+                    frames = self.compact.encode(stream[0], args[0])
+                key, delta = frames
+                if delta is not None and stream in synced:
+                    variant, variant_args = "delta", [delta]
+                else:
+                    variant, variant_args = "key", [key]
+                    synced.add(stream)
+            eio_pkts = packets.get((encoding, variant))
+            if eio_pkts is None:
+                eio_pkts = packets[encoding, variant] = self._encode(event, variant_args, namespace, encoding)
+            try:
+                for eio_pkt in eio_pkts:
+                    await self.server._send_eio_packet(eio_sid, eio_pkt)
+            except Exception:
+                logger.exception("Failed to send %s to %s", event, sid)
+                continue
+            self.deliveries += 1
+        self.encoded_packets += len(packets)
+
+    def _encode(self, event, args, namespace, encoding) -> list:
+        if encoding == "msgpack":
+            args = [msgpack.packb(arg, default=str) for arg in args]
+        encoded = self.server.packet_class(packet.EVENT, namespace=namespace, data=[event] + args).encode()
+        if not isinstance(encoded, list):
+            encoded = [encoded]
+        return [eio_packet.Packet(eio_packet.MESSAGE, p) for p in encoded]
+
+    def stats(self) -> dict:
+        return {
+            "emits": self.emits,
+            "encoded_packets": self.encoded_packets,
+            "deliveries": self.deliveries,
+            "msgpack_clients": sum(1 for e in self._encodings.values() if e == "msgpack"),
+            "compact_clients": len(self._synced),
+            **{f"compact_{k}": v for k, v in self.compact.stats().items()},
+        }
+
+
+class FanoutManager(FanoutMixin, socketio.AsyncManager):
+    """Single-process client manager (SOCKETIO_MANAGER=memory)."""
+
+    name = "memory"
+
+
+class StateReplicationMixin:
+    """Let a pub/sub client manager carry application state messages.
+
+    Socket.IO's pub/sub managers only understand their own methods (emit,
+    enter_room, ...). Messages published with `publish_state` share the same
+    channel but are intercepted on the way in and handed to the callbacks
+    registered with `on_state` instead of Socket.IO. Backends provide raw
+    messages through `_receive`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._state_callbacks: List[Callable[[dict], Awaitable[None]]] = []
+
+    def on_state(self, callback: Callable[[dict], Awaitable[None]]):
+        self._state_callbacks.append(callback)
+
+    async def publish_state(self, payload: dict):
+        await self._publish({"method": STATE_METHOD, "host_id": self.host_id, "payload": payload})
+
+    async def _listen(self):
+        async for message in self._receive():
+            data = self._decode(message)
+            if data is None:
+                continue
+            if data.get("method") == STATE_METHOD:
+                if data.get("host_id") != self.host_id:
+                    for callback in self._state_callbacks:
+                        try:
+                            await callback(data["payload"])
+                        except Exception:
+                            logger.exception("Failed to apply replicated state")
+                continue
+            # Already decoded; the base class accepts dicts as-is
+            yield data
+
+    @staticmethod
+    def _decode(message) -> Optional[dict]:
+        if isinstance(message, dict):
+            return message
+        try:
+            if isinstance(message, bytes):
+                return pickle.loads(message)
+            return json.loads(message)
+        except Exception:
+            return None
+
+
+class InProcessBroker:
+    """Pub/sub channels shared by every manager in this process.
+
+    Stands in for Redis or Postgres so several Socket.IO servers ("workers")
+    can be wired together in one test process. Messages are pickled on
+    publish, like the Redis manager does, so nothing is shared by reference.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+
+    def subscribe(self, channel: str) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(channel, []).append(queue)
+        return queue
+
+    def publish(self, channel: str, message: bytes):
+        for queue in self._subscribers.get(channel, ()):
+            queue.put_nowait(message)
+
+
+default_broker = InProcessBroker()
+
+
+class InProcessPubSubManager(FanoutMixin, StateReplicationMixin, AsyncPubSubManager):
+    name = "inprocess"
+
+    def __init__(self, broker: InProcessBroker = default_broker, channel: str = "socketio",
+                 write_only: bool = False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.broker = broker
+        self._queue: Optional[asyncio.Queue] = None
+
+    def _subscription(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = self.broker.subscribe(self.channel)
+        return self._queue
+
+    def initialize(self):
+        if not self.write_only:
+            self._subscription()  # don't miss messages published before _thread runs
+        super().initialize()
+
+    async def _publish(self, data):
+        self.broker.publish(self.channel, pickle.dumps(data))
+
+    async def _receive(self):
+        queue = self._subscription()
+        while True:
+            yield await queue.get()
+
+
+class RedisManager(FanoutMixin, StateReplicationMixin, socketio.AsyncRedisManager):
+    """Redis pub/sub manager that also replicates bus state."""
+
+    def _receive(self):
+        return socketio.AsyncRedisManager._listen(self)
+
+
+class PostgresNotifyManager(FanoutMixin, StateReplicationMixin, AsyncPubSubManager):
+    """Client manager on Postgres LISTEN/NOTIFY, via asyncpg.
+
+    Needs no infrastructure beyond the database we already run. Payloads
+    are JSON; NOTIFY caps them below 8000 bytes, so larger messages are
+    logged and dropped (bus updates and alerts are a few hundred bytes).
+    """
+
+    name = "postgres"
+
+    def __init__(self, url: str, channel: str = "socketio", write_only: bool = False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        # asyncpg wants a plain postgresql:// DSN
+        scheme, sep, rest = url.partition("://")
+        self.dsn = f"postgresql{sep}{rest}"
+        self._publisher = None
+        self._publish_lock = asyncio.Lock()
+
+    async def _connect(self):
+        import asyncpg
+        return await asyncpg.connect(self.dsn)
+
+    async def _publish(self, data):
+        payload = json.dumps(data, default=str)
+        if len(payload.encode()) > PG_NOTIFY_MAX_BYTES:
+            logger.error("Dropping %d-byte %s message: too large for NOTIFY",
+                         len(payload), data.get("method"))
+            return
+        async with self._publish_lock:
+            for attempt in range(2):
+                try:
+                    if self._publisher is None or self._publisher.is_closed():
+                        self._publisher = await self._connect()
+                    await self._publisher.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+                    return
+                except Exception:
+                    self._publisher = None
+                    if attempt:
+                        logger.exception("Cannot publish to Postgres, giving up")
+
+    async def _receive(self):
+        retry_sleep = 1
+        while True:
+            queue: asyncio.Queue = asyncio.Queue()
+            connection = None
+            try:
+                connection = await self._connect()
+                await connection.add_listener(self.channel, lambda *args: queue.put_nowait(args[3]))
+                retry_sleep = 1
+                while not connection.is_closed():
+                    try:
+                        yield await asyncio.wait_for(queue.get(), timeout=30)
+                    except asyncio.TimeoutError:
+                        await connection.execute("SELECT 1")  # keepalive
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Postgres LISTEN failed, retrying in %ds", retry_sleep)
+                await asyncio.sleep(retry_sleep)
+                retry_sleep = min(retry_sleep * 2, 60)
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+
+
+def create_client_manager(backend: str = settings.SOCKETIO_MANAGER,
+                          url: str = settings.SOCKETIO_MESSAGE_QUEUE_URL,
+                          channel: str = settings.SOCKETIO_CHANNEL):
+    """Build the Socket.IO client manager named by `backend`.
+
+    memory (default) keeps rooms in this process only; redis, postgres and
+    inprocess share them through a pub/sub channel so any number of workers
+    can serve the same rooms.
+    """
+    if backend == "memory":
+        return FanoutManager()
+    if backend == "redis":
+        return RedisManager(url or "redis://localhost:6379/0", channel=channel)
+    if backend == "postgres":
+        return PostgresNotifyManager(url or settings.DATABASE_URL, channel=channel)
+    if backend == "inprocess":
+        return InProcessPubSubManager(channel=channel)
+    raise ValueError(f"Unknown SOCKETIO_MANAGER {backend!r}")
@@ -0,0 +1,202 @@
+import math
+from typing import NamedTuple
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance in meters; accepts scalars or NumPy arrays."""
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _haversine_scalar(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(a, 1.0)))
+
+
+class NearestStop(NamedTuple):
+    position: int       # position in the route's ordered stop arrays
+    stop_id: str
+    stop_index: int     # Stop.index of that stop
+    distance_m: float   # great-circle distance from the bus to the stop
+    progress_m: float   # distance travelled along the stop polyline
+    progress_ratio: float
+
+
+class StopLocator:
+    """Nearest-stop and along-route progress lookups for one route.
+
+    Stops are projected once onto a local equirectangular plane in meters
+    (accurate to well under 1% over a city-sized route), so every query is a
+    handful of vectorized NumPy operations over the route's stop and segment
+    arrays instead of a Python loop (short routes use an equivalent scalar
+    loop, which is cheaper than NumPy's per-call overhead at that size). The
+    reported stop distance is recomputed with haversine for the winning stop
+    only.
+    """
+
+    # Upper bound on (pings x stops) matrix cells per batch chunk
+    BATCH_CELLS = 1_000_000
+    # Below this many stops plain Python beats NumPy's per-call overhead
+    SMALL_ROUTE_STOPS = 48
+
+    def __init__(self, geometry):
+        self.geometry = geometry
+        self.stop_ids = geometry.stop_ids
+        self.indexes = geometry.indexes
+        self.lats = geometry.lats
+        self.lngs = geometry.lngs
+
+        n = len(self.lats)
+        self.origin_lat = float(self.lats.mean()) if n else 0.0
+        self.origin_lng = float(self.lngs.mean()) if n else 0.0
+        self._kx = np.radians(1.0) * EARTH_RADIUS_M * np.cos(np.radians(self.origin_lat))
+        self._ky = np.radians(1.0) * EARTH_RADIUS_M
+
+        self.xs, self.ys = self.project(self.lats, self.lngs)
+
+        # Segment i runs from stop i to stop i + 1
+        self.seg_dx = np.diff(self.xs)
+        self.seg_dy = np.diff(self.ys)
+        self.seg_len_sq = self.seg_dx ** 2 + self.seg_dy ** 2
+        self.seg_len = np.sqrt(self.seg_len_sq)
+        self.cumulative_m = np.concatenate(([0.0], np.cumsum(self.seg_len)))
+        self.route_length_m = float(self.cumulative_m[-1]) if n else 0.0
+        # Avoid dividing by zero for duplicate consecutive stops
+        self._seg_len_sq_safe = np.where(self.seg_len_sq > 0, self.seg_len_sq, 1.0)
+
+        # List copies for the scalar paths (short routes, windowed lookups)
+        self._small = n <= self.SMALL_ROUTE_STOPS
+        self._xs_list = self.xs.tolist()
+        self._ys_list = self.ys.tolist()
+        self._segments = list(zip(
+            self._xs_list[:-1], self._ys_list[:-1], self.seg_dx.tolist(), self.seg_dy.tolist(),
+            self._seg_len_sq_safe.tolist(), self.seg_len.tolist(), self.cumulative_m[:-1].tolist(),
+        ))
+        self.stop_progress_m = self.cumulative_m.tolist()
+
+    def project(self, lats, lngs):
+        """Project degrees onto the route's local plane (meters)."""
+        xs = (np.asarray(lngs, dtype=np.float64) - self.origin_lng) * self._kx
+        ys = (np.asarray(lats, dtype=np.float64) - self.origin_lat) * self._ky
+        return xs, ys
+
+    def project_point(self, lat: float, lng: float):
+        """Scalar version of `project`."""
+        return (lng - self.origin_lng) * self._kx, (lat - self.origin_lat) * self._ky
+
+    def best_segment(self, px: float, py: float, first: int, last: int):
+        """Closest point to (px, py) on segments `first`..`last` inclusive.
+
+        Returns `(segment, progress_m, distance_m)`, or None when the range
+        is empty. Cost is proportional to the window, not the route.
+        """
+        best = None
+        best_d2 = math.inf
+        for seg in range(max(first, 0), min(last, len(self._segments) - 1) + 1):
+            ax, ay, dx, dy, len_sq, length, start_m = self._segments[seg]
+            t = ((px - ax) * dx + (py - ay) * dy) / len_sq
+            t = 0.0 if t < 0.0 else 1.0 if t > 1.0 else t
+            d2 = (px - ax - t * dx) ** 2 + (py - ay - t * dy) ** 2
+            if d2 < best_d2:
+                best_d2 = d2
+                best = (seg, start_m + t * length)
+        if best is None:
+            return None
+        return best[0], best[1], math.sqrt(best_d2)
+
+    def _progress(self, px, py):
+        """Along-route distance of the closest polyline point to (px, py).
+
+        `px`/`py` are column vectors of shape (m, 1); returns shape (m,).
+        """
+        if len(self.seg_len) == 0:
+            return np.zeros(px.shape[0])
+        t = ((px - self.xs[:-1]) * self.seg_dx + (py - self.ys[:-1]) * self.seg_dy) / self._seg_len_sq_safe
+        t = np.clip(t, 0.0, 1.0)
+        cx = self.xs[:-1] + t * self.seg_dx
+        cy = self.ys[:-1] + t * self.seg_dy
+        d2 = (px - cx) ** 2 + (py - cy) ** 2
+        seg = np.argmin(d2, axis=1)
+        rows = np.arange(px.shape[0])
+        return self.cumulative_m[seg] + t[rows, seg] * self.seg_len[seg]
+
+    def nearest(self, lat: float, lng: float) -> NearestStop:
+        """Resolve a single position (the per-ping hot path)."""
+        if not len(self.lats):
+            raise ValueError("Route has no stops")
+        px, py = self.project_point(lat, lng)
+
+        if self._small:
+            position, progress_m = self._nearest_small(px, py)
+        else:
+            d2 = (self.xs - px) ** 2 + (self.ys - py) ** 2
+            position = int(d2.argmin())
+            progress_m = float(self._progress(np.array([[px]]), np.array([[py]]))[0])
+
+        return NearestStop(
+            position=position,
+            stop_id=self.stop_ids[position],
+            stop_index=self.indexes[position],
+            distance_m=_haversine_scalar(lat, lng, float(self.lats[position]), float(self.lngs[position])),
+            progress_m=progress_m,
+            progress_ratio=progress_m / self.route_length_m if self.route_length_m else 0.0,
+        )
+
+    def _nearest_small(self, px, py):
+        best_d2 = math.inf
+        position = 0
+        for i, (x, y) in enumerate(zip(self._xs_list, self._ys_list)):
+            d2 = (x - px) ** 2 + (y - py) ** 2
+            if d2 < best_d2:
+                best_d2 = d2
+                position = i
+
+        best_d2 = math.inf
+        progress_m = 0.0
+        for ax, ay, dx, dy, len_sq, length, start_m in self._segments:
+            t = ((px - ax) * dx + (py - ay) * dy) / len_sq
+            t = 0.0 if t < 0.0 else 1.0 if t > 1.0 else t
+            d2 = (px - ax - t * dx) ** 2 + (py - ay - t * dy) ** 2
+            if d2 < best_d2:
+                best_d2 = d2
+                progress_m = start_m + t * length
+        return position, progress_m
+
+    def nearest_many(self, lats, lngs):
+        """Resolve many positions at once.
+
+        Returns `(positions, distances_m, progress_m)` arrays aligned with
+        the input. Large inputs are processed in chunks so the intermediate
+        pings x stops matrices stay bounded.
+        """
+        if not len(self.lats):
+            raise ValueError("Route has no stops")
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        positions = np.empty(len(lats), dtype=np.intp)
+        progress = np.empty(len(lats), dtype=np.float64)
+
+        chunk = max(1, self.BATCH_CELLS // len(self.lats))
+        for start in range(0, len(lats), chunk):
+            stop = start + chunk
+            px, py = self.project(lats[start:stop], lngs[start:stop])
+            px = px[:, None]
+            py = py[:, None]
+            d2 = (px - self.xs) ** 2 + (py - self.ys) ** 2
+            positions[start:stop] = np.argmin(d2, axis=1)
+            progress[start:stop] = self._progress(px, py)
+
+        distances = haversine_m(lats, lngs, self.lats[positions], self.lngs[positions])
+        return positions, distances, progress
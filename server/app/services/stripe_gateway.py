@@ -0,0 +1,70 @@
+import asyncio
+import functools
+
+import stripe
+from stripe.http_client import RequestsClient
+from app.core.config import settings
+from app.services.bounded_executor import BoundedExecutor, ExecutorBusy
+
+
+class StripeGatewayBusy(ExecutorBusy):
+    """Raised when too many Stripe calls are already waiting."""
+
+
+class StripeGateway:
+    """Run the blocking stripe SDK in a `BoundedExecutor`.
+
+    Each call, waiting included, is bounded by `timeout` seconds
+    (`asyncio.TimeoutError`); the SDK's HTTP client uses the same timeout,
+    so an abandoned request frees its thread soon after. Past `max_pending`
+    waiting calls, or after `stop`, calls raise `StripeGatewayBusy`.
+    """
+
+    def __init__(self, api_key: str, workers: int = 8, max_pending: int = 256,
+                 timeout: float = 10.0, api_base: str = ""):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.api_base = api_base
+        self._pool = BoundedExecutor(workers, max_pending, thread_name_prefix="stripe",
+                                     busy=StripeGatewayBusy)
+        self.timeouts = 0
+
+    @property
+    def workers(self) -> int:
+        return self._pool.workers
+
+    def start(self):
+        if not self._pool.started:
+            # The SDK's HTTP client and API base are process-wide
+            stripe.default_http_client = RequestsClient(timeout=self.timeout)
+            if self.api_base:
+                stripe.api_base = self.api_base
+        self._pool.start()
+
+    def stop(self):
+        self._pool.stop()
+
+    async def create_checkout_session(self, **params):
+        return await self._call(stripe.checkout.Session.create, **params)
+
+    async def _call(self, func, **params):
+        if not self._pool.started and not self._pool.closed:
+            self.start()
+        call = functools.partial(func, api_key=self.api_key, **params)
+        try:
+            return await asyncio.wait_for(self._pool.run(call), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+    def stats(self) -> dict:
+        return {**self._pool.stats(), "timeouts": self.timeouts}
+
+
+stripe_gateway = StripeGateway(
+    api_key=settings.STRIPE_SECRET_KEY,
+    workers=settings.STRIPE_WORKERS,
+    max_pending=settings.STRIPE_MAX_PENDING,
+    timeout=settings.STRIPE_TIMEOUT_SECONDS,
+    api_base=settings.STRIPE_API_BASE,
+)
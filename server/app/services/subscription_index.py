@@ -0,0 +1,142 @@
+import asyncio
+import logging
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.state_channel import state_channel
+from app.models import Subscription
+
+logger = logging.getLogger(__name__)
+
+
+class AlertTarget(NamedTuple):
+    subscription_id: str
+    user_id: str
+    stop_id: str
+    stop_index: int
+
+
+async def load_alert_targets(session_factory=AsyncSessionLocal) -> List[Tuple[str, AlertTarget]]:
+    """Read every alert-eligible subscription as (route_id, target) pairs."""
+    async with session_factory() as db:
+        result = await db.execute(select(
+            Subscription.route_id, Subscription.id, Subscription.user_id,
+            Subscription.stop_id, Subscription.stop_index,
+        ).where(
+            Subscription.is_active == True,
+            Subscription.notifications_enabled == True
+        ))
+        rows = result.all()
+    return [(row[0], AlertTarget(*row[1:])) for row in rows]
+
+
+class SubscriptionIndex:
+    """In-memory index of alert-eligible subscriptions.
+
+    Subscriptions are bucketed by `(route_id, stop_index)`, so finding who to
+    alert when a bus reaches a stop is a single dictionary lookup. The index
+    is loaded in full at startup and kept current by `upsert`/`remove` from
+    the code paths that change subscriptions; those changes are also
+    published on `channel`, so the other workers' indexes follow at once.
+    It is rebuilt every `refresh_interval` seconds to pick up writes made
+    outside the API (or missed while a worker was disconnected).
+    """
+
+    def __init__(self, refresh_interval: float = 300.0, loader=load_alert_targets, channel=None):
+        self.refresh_interval = refresh_interval
+        self._loader = loader
+        self._channel = channel
+        if channel is not None:
+            channel.on("subscription:upsert", self._apply_upsert)
+            channel.on("subscription:remove", lambda change: self._remove(change["id"]))
+        self._buckets: Dict[Tuple[str, int], Dict[str, AlertTarget]] = {}
+        self._keys: Dict[str, Tuple[str, int]] = {}  # subscription id -> bucket key
+        self._task: Optional[asyncio.Task] = None
+        self.loaded = False
+
+    async def load(self):
+        """Rebuild the whole index from the database."""
+        rows = await self._loader()
+        buckets: Dict[Tuple[str, int], Dict[str, AlertTarget]] = {}
+        keys: Dict[str, Tuple[str, int]] = {}
+        for route_id, target in rows:
+            key = (route_id, target.stop_index)
+            buckets.setdefault(key, {})[target.subscription_id] = target
+            keys[target.subscription_id] = key
+        self._buckets, self._keys = buckets, keys
+        self.loaded = True
+
+    def start(self):
+        if self.refresh_interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.load()
+            except Exception:
+                logger.exception("Failed to refresh subscription index")
+
+    def upsert(self, subscription: Subscription):
+        """Reflect a committed subscription: index it if it should receive
+        alerts, otherwise drop it."""
+        change = {
+            "id": subscription.id,
+            "route_id": subscription.route_id,
+            "user_id": subscription.user_id,
+            "stop_id": subscription.stop_id,
+            "stop_index": subscription.stop_index,
+            "eligible": bool(subscription.is_active and subscription.notifications_enabled),
+        }
+        self._apply_upsert(change)
+        if self._channel is not None:
+            self._channel.publish("subscription:upsert", **change)
+
+    def remove(self, subscription_id: str):
+        self._remove(subscription_id)
+        if self._channel is not None:
+            self._channel.publish("subscription:remove", id=subscription_id)
+
+    def _apply_upsert(self, change: dict):
+        self._remove(change["id"])
+        if not change["eligible"]:
+            return
+        key = (change["route_id"], change["stop_index"])
+        self._buckets.setdefault(key, {})[change["id"]] = AlertTarget(
+            change["id"], change["user_id"], change["stop_id"], change["stop_index"]
+        )
+        self._keys[change["id"]] = key
+
+    def _remove(self, subscription_id: str):
+        key = self._keys.pop(subscription_id, None)
+        if key is None:
+            return
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket.pop(subscription_id, None)
+            if not bucket:
+                del self._buckets[key]
+
+    def lookup(self, route_id: str, stop_index: int) -> List[AlertTarget]:
+        bucket = self._buckets.get((route_id, stop_index))
+        return list(bucket.values()) if bucket else []
+
+    def stats(self) -> dict:
+        return {"subscriptions": len(self._keys), "buckets": len(self._buckets)}
+
+
+subscription_index = SubscriptionIndex(
+    refresh_interval=settings.SUBSCRIPTION_INDEX_REFRESH_SECONDS, channel=state_channel
+)
@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import insert
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import BusLocation
+
+logger = logging.getLogger(__name__)
+
+
+class TelemetryIngestor:
+    """Buffer bus GPS pings in memory and write them to bus_locations in bulk.
+
+    `submit` never touches the database: it stamps the ping and puts it on a
+    bounded queue. A single background task drains the queue and flushes a
+    batch when either `batch_size` rows are waiting or `flush_interval`
+    seconds have passed since the first row of the batch arrived. The insert
+    itself goes through the async engine, so the event loop is never blocked
+    on Postgres. When the queue is full new pings are rejected and counted as
+    dropped rather than growing memory without bound. `stop` queues a
+    sentinel rather than cancelling the task, so the batch the task already
+    holds is written before it exits.
+    """
+
+    def __init__(
+        self,
+        max_queue_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        session_factory=AsyncSessionLocal,
+    ):
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.session_factory = session_factory
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._carry: List[dict] = []  # rows from a failed flush, retried first
+        self._stopping = False
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.flushed_rows = 0
+        self.flush_count = 0
+        self.flush_errors = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start the background flush task on the running event loop."""
+        if self.running:
+            return
+        self._stopping = False
+        # Unbounded so `stop` can always queue its sentinel; `submit`
+        # enforces max_queue_size
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush task and write everything still buffered."""
+        if self._task is not None:
+            self._stopping = True
+            self._queue.put_nowait(None)
+            try:
+                await self._task
+            except Exception:
+                logger.exception("Telemetry flush task failed")
+            self._task = None
+
+        while self._carry or (self._queue is not None and not self._queue.empty()):
+            batch = self._take_carry()
+            while self._queue is not None and len(batch) < self.batch_size:
+                try:
+                    row = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if row is not None:
+                    batch.append(row)
+            if not await self._flush(batch):
+                # Nothing more we can do at shutdown; account for the loss
+                self.dropped += len(self._carry)
+                self._carry = []
+                break
+
+    def submit(self, bus_id: str, lat: float, lng: float, speed: float = 0.0,
+               timestamp: Optional[datetime] = None) -> bool:
+        """Queue a ping for persistence. Returns False if it was dropped."""
+        if self._queue is None or self._stopping or self._queue.qsize() >= self.max_queue_size:
+            self.dropped += 1
+            return False
+        row = {
+            "bus_id": bus_id,
+            "latitude": lat,
+            "longitude": lng,
+            "speed": speed or 0.0,
+            "timestamp": timestamp or datetime.now(timezone.utc),
+        }
+        self._queue.put_nowait(row)
+        self.enqueued += 1
+        return True
+
+    @property
+    def queue_depth(self) -> int:
+        depth = len(self._carry)
+        if self._queue is not None:
+            depth += self._queue.qsize()
+        return depth
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth,
+            "queue_capacity": self.max_queue_size,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "flushed_rows": self.flushed_rows,
+            "flush_count": self.flush_count,
+            "flush_errors": self.flush_errors,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "max_flush_ms": round(self.max_flush_ms, 3),
+            "avg_flush_ms": round(self.total_flush_ms / self.flush_count, 3) if self.flush_count else 0.0,
+        }
+
+    def _take_carry(self) -> List[dict]:
+        batch, self._carry = self._carry[:self.batch_size], self._carry[self.batch_size:]
+        return batch
+
+    async def _next_batch(self) -> Tuple[List[dict], bool]:
+        """The next batch to flush, and whether the stop sentinel was seen."""
+        batch = self._take_carry()
+        if not batch:
+            row = await self._queue.get()
+            if row is None:
+                return batch, True
+            batch.append(row)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                row = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if row is None:
+                return batch, True
+            batch.append(row)
+        return batch, False
+
+    async def _run(self):
+        stopped = False
+        while not stopped:
+            batch, stopped = await self._next_batch()
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[dict]) -> bool:
+        if not batch:
+            return True
+        started = time.perf_counter()
+        try:
+            await self._write(batch)
+        except Exception:
+            self.flush_errors += 1
+            logger.exception("Failed to flush %d bus locations", len(batch))
+            # Keep the rows for the next attempt, but never more than the
+            # queue itself would hold
+            room = max(self.max_queue_size - len(self._carry), 0)
+            self.dropped += max(len(batch) - room, 0)
+            self._carry = batch[:room] + self._carry
+            return False
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.flush_count += 1
+        self.flushed_rows += len(batch)
+        self.last_flush_ms = elapsed_ms
+        self.total_flush_ms += elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        return True
+
+    async def _write(self, batch: List[dict]):
+        async with self.session_factory() as db:
+            # A list of parameter dicts makes SQLAlchemy emit batched
+            # multi-row INSERTs instead of one statement per ping
+            await db.execute(insert(BusLocation), batch)
+            await db.commit()
+
+
+telemetry_ingestor = TelemetryIngestor(
+    max_queue_size=settings.TELEMETRY_QUEUE_SIZE,
+    batch_size=settings.TELEMETRY_BATCH_SIZE,
+    flush_interval=settings.TELEMETRY_FLUSH_INTERVAL_SECONDS,
+)
@@ -1,39 +1,125 @@
+import logging
 import socketio
-from fastapi import Request
-from sqlalchemy.orm import Session
-from app.core.database import SessionLocal
+from app.core.auth import token_cache
 from app.core.config import settings
-from app.core.security import decode_access_token
-from app.models import Bus, BusLocation, Subscription, Stop
+from app.core.sampled_log import SampledLogger
+from app.core.state_channel import state_channel
 from app.services.fcm_service import send_fcm_notification
-import uuid
+from app.services.telemetry import telemetry_ingestor
+from app.services.route_cache import route_cache
+from app.services.route_progress import BusProgress, RouteProgressTracker
+from app.services.subscription_index import subscription_index
+from app.services.alert_ledger import alert_ledger
+from app.services.bus_state import bus_state
+from app.services.socketio_manager import ENCODINGS, create_client_manager
+from app.services.fanout_scheduler import FanoutScheduler
+from app.services.compact_updates import FORMATS
+from app.services.eta import EtaEstimate, eta_engine
+from app.services.connect_admission import ConnectAdmission
 from datetime import datetime
+import time
 
 sio = socketio.AsyncServer(
     cors_allowed_origins=settings.ALLOWED_ORIGINS_LIST,
-    async_mode="asgi"
+    async_mode="asgi",
+    client_manager=create_client_manager()
 )
-sio_app = socketio.ASGIApp(sio)
+# Mounted at /socket.io/ in main.py; the mount strips that prefix, so
+# Engine.IO serves the whole mounted path. With the default socketio_path
+# clients would have to use /socket.io/socket.io/ and /socket.io/ is a 404
+sio_app = socketio.ASGIApp(sio, socketio_path="")
 
-# Store active bus connections
-active_buses = {}  # {bus_id: {route_id, current_stop_index, ...}}
+logger = logging.getLogger(__name__)
+# Per-connection events are far too frequent to log each one
+event_log = SampledLogger(logger, every=settings.SOCKETIO_LOG_SAMPLE_EVERY)
+
+# Paces connects so a reconnect storm after a restart cannot monopolize the loop
+connect_admission = ConnectAdmission(
+    rate=settings.SOCKETIO_CONNECT_RATE,
+    burst=settings.SOCKETIO_CONNECT_BURST,
+    jitter=settings.SOCKETIO_CONNECT_RETRY_JITTER_SECONDS,
+)
+
+# Live bus state (a BusState per bus), shared across
+# workers when the client manager is backed by a message queue
+bus_state.attach(sio.manager)
+# Subscription index updates and cache invalidations ride the same channel
+state_channel.attach(sio.manager)
+# Server-side position of each bus along its route; local to the worker
+# the bus is connected to
+bus_progress = {}  # {bus_id: BusProgress}
+# Which bus each bus device socket reports for, so its state can be
+# dropped when it disconnects
+bus_sockets = {}  # {sid: bus_id}
+
+def forget_bus(bus_id: str):
+    """Drop per-bus bookkeeping once a bus leaves the live state, whether
+    it disconnected here or on another worker."""
+    bus_progress.pop(bus_id, None)
+    compact = getattr(sio.manager, "compact", None)
+    if compact is not None:
+        compact.forget(bus_id)
+
+bus_state.add_listener(forget_bus)
+
+async def emit_bus_update(payload, room, skip_sid=None):
+    await sio.emit("bus:update", payload, room=room, skip_sid=skip_sid)
+
+def bus_room_members(bus_id: str):
+    return [sid for sid, _ in sio.manager.get_participants("/", f"bus:{bus_id}")]
+
+# Coalesces bus:update broadcasts; started from the app lifespan
+fanout_scheduler = FanoutScheduler(
+    emit_bus_update,
+    bus_room_members,
+    route_interval=settings.FANOUT_ROUTE_INTERVAL_SECONDS,
+    bus_interval=settings.FANOUT_BUS_INTERVAL_SECONDS,
+)
+
+progress_tracker = RouteProgressTracker(
+    window=settings.ROUTE_PROGRESS_WINDOW,
+    arrival_radius_m=settings.STOP_ARRIVAL_RADIUS_M,
+    off_route_m=settings.OFF_ROUTE_DISTANCE_M,
+    reseed_after=settings.ROUTE_PROGRESS_RESEED_AFTER,
+)
+
+def start_client_manager(server: socketio.AsyncServer = sio):
+    """Initialize the client manager now rather than on the first socket
+    connection, so a pub/sub manager starts receiving messages (and
+    replicated bus state) as soon as the worker starts."""
+    if not server.manager_initialized:
+        server.manager_initialized = True
+        server.manager.initialize()
 
 @sio.event
 async def connect(sid, environ, auth):
     """Handle client connection"""
-    token = auth.get("token") if auth else None
-    if not token:
-        await sio.disconnect(sid)
-        return False
+    # Refused before any token work; the client gets connect_error with
+    # {"message": "server busy", "data": {"retryAfter": seconds}}
+    retry_after = connect_admission.admit()
+    if retry_after is not None:
+        event_log.event("socket.refused", retry_after=retry_after)
+        raise socketio.exceptions.ConnectionRefusedError("server busy", {"retryAfter": retry_after})
     
-    payload = decode_access_token(token)
+    token = auth.get("token") if auth else None
+    payload = token_cache.claims(token) if token else None
     if not payload:
-        await sio.disconnect(sid)
-        return False
+        event_log.event("socket.unauthorized", sid=sid)
+        raise socketio.exceptions.ConnectionRefusedError("unauthorized")
     
     user_id = payload.get("sub")
     await sio.save_session(sid, {"user_id": user_id})
-    print(f"Client connected: {sid}, user: {user_id}")
+    # Optional compact payload encoding, e.g. {"token": ..., "encoding": "msgpack"}
+    encoding = auth.get("encoding")
+    if encoding in ENCODINGS and hasattr(sio.manager, "set_encoding"):
+        sio.manager.set_encoding(sid, encoding)
+    # Optional quantized/delta bus:update format: {"format": "compact"}
+    fmt = auth.get("format")
+    if fmt in FORMATS and hasattr(sio.manager, "set_format"):
+        sio.manager.set_format(sid, fmt)
+    # Personal room for alert:upcoming_stop
+    await sio.enter_room(sid, f"user:{user_id}")
+    event_log.event("socket.connect", sid=sid, user=user_id)
     return True
 
 @sio.event
@@ -41,7 +127,15 @@ async def disconnect(sid):
     """Handle client disconnection"""
     session = await sio.get_session(sid)
     user_id = session.get("user_id")
-    print(f"Client disconnected: {sid}, user: {user_id}")
+    event_log.event("socket.disconnect", sid=sid, user=user_id)
+    bus_id = bus_sockets.pop(sid, None)
+    if bus_id is not None:
+        state = bus_state.get(bus_id)
+        # A bus that already reconnected on a new socket stays live
+        if state is not None and state.sid in (sid, None):
+            await bus_state.remove(bus_id)
+            alert_ledger.reset(bus_id)
+        logger.info("Bus %s disconnected", bus_id)
 
 @sio.event
 async def bus_connect(sid, data):
@@ -51,14 +145,14 @@ async def bus_connect(sid, data):
     route_id = data.get("route_id")
     
     if bus_id and route_id:
-        active_buses[bus_id] = {
-            "route_id": route_id,
-            "sid": sid,
-            "current_stop_index": 0
-        }
+        bus_sockets[sid] = bus_id
+        await bus_state.update(bus_id, route_id=route_id, sid=sid, current_stop_index=0)
+        # A (re)connecting bus starts a fresh trip
+        bus_progress[bus_id] = BusProgress(route_id)
+        alert_ledger.reset(bus_id)
         await sio.enter_room(sid, f"route:{route_id}")
         await sio.enter_room(sid, f"bus:{bus_id}")
-        print(f"Bus {bus_id} connected to route {route_id}")
+        logger.info("Bus %s connected to route %s", bus_id, route_id)
 
 @sio.event
 async def bus_update(sid, data):
@@ -72,74 +166,89 @@ async def bus_update(sid, data):
     if not all([bus_id, route_id, lat, lng]):
         return
     
-    # Save to database
-    db = SessionLocal()
-    try:
-        bus_location = BusLocation(
-            id=str(uuid.uuid4()),
-            bus_id=bus_id,
-            latitude=lat,
-            longitude=lng,
-            speed=speed
-        )
-        db.add(bus_location)
-        db.commit()
-        
-        # Update active bus info
-        if bus_id in active_buses:
-            active_buses[bus_id]["current_location"] = {"lat": lat, "lng": lng}
+    bus_sockets[sid] = bus_id
+    # Queue for batched persistence; the live broadcast below does not
+    # wait on the database
+    if not telemetry_ingestor.submit(bus_id, lat, lng, speed):
+        event_log.event("telemetry.dropped", logging.WARNING, bus=bus_id)
+    
+    previous = bus_state.get(bus_id)
+    state = {
+        "route_id": route_id, "sid": sid, "lat": lat, "lng": lng, "speed": speed or 0.0,
+        "updated_at": time.time(), "seq": (previous.seq if previous else 0) + 1,
+    }
+    
+    # Advance the bus along its route using cached geometry
+    geometry = await route_cache.get(route_id)
+    progress = bus_progress.get(bus_id)
+    if progress is None:
+        progress = bus_progress[bus_id] = BusProgress(route_id)
+    update = progress_tracker.update(progress, geometry, lat, lng)
+    
+    if update:
+        state["current_stop_index"] = update.position
+        state["route_progress_m"] = update.progress_m
+    await bus_state.update(bus_id, **state)
+    
+    if update:
+        for arrival in update.arrivals:
+            await emit_bus_stop(bus_id, arrival.stop_id, arrival.stop_index)
         
-        # Calculate current stop index
-        route = db.query(Bus).filter(Bus.route_id == route_id).first()
-        if route:
-            stops = db.query(Stop).filter(
-                Stop.route_id == route_id
-            ).order_by(Stop.index).all()
-            
-            # Simple distance-based stop detection (in production, use more sophisticated algorithm)
-            current_stop_index = 0
-            min_distance = float("inf")
-            for i, stop in enumerate(stops):
-                distance = ((lat - stop.latitude) ** 2 + (lng - stop.longitude) ** 2) ** 0.5
-                if distance < min_distance:
-                    min_distance = distance
-                    current_stop_index = i
-            
-            if bus_id in active_buses:
-                active_buses[bus_id]["current_stop_index"] = current_stop_index
-            
+        # Alerts only need checking when the bus reaches a new stop
+        alert_positions = [arrival.position for arrival in update.arrivals]
+        if update.trip_started and update.position not in alert_positions:
+            alert_positions.insert(0, update.position)
+        for position in alert_positions:
             # Check for upcoming stop alerts (2 stops before)
-            await check_upcoming_stop_alerts(
-                db, route_id, bus_id, current_stop_index
-            )
+            await check_upcoming_stop_alerts(route_id, bus_id, position, update.trip)
         
-    finally:
-        db.close()
+        if update.trip_completed and update.arrivals:
+            alert_ledger.reset(bus_id)
     
-    # Broadcast to subscribers
-    update_payload = {
-        "busId": bus_id,
-        "routeId": route_id,
-        "lat": lat,
-        "lng": lng,
-        "speed": speed,
-        "timestamp": datetime.utcnow().isoformat()
+    # Broadcast to subscribers, coalesced per room kind
+    await fanout_scheduler.submit(bus_id, route_id, bus_payload(bus_state.get(bus_id)))
+
+def bus_payload(state) -> dict:
+    """bus:update body for a BusState; also used for subscribe snapshots"""
+    return {
+        "busId": state.bus_id,
+        "routeId": state.route_id,
+        "lat": state.lat,
+        "lng": state.lng,
+        "speed": state.speed,
+        "stopIndex": state.current_stop_index,
+        "seq": state.seq,
+        "timestamp": datetime.utcfromtimestamp(state.updated_at).isoformat()
     }
-    
-    await sio.emit("bus:update", update_payload, room=f"route:{route_id}")
-    await sio.emit("bus:update", update_payload, room=f"bus:{bus_id}")
+
+async def send_snapshot(sid, states, **target):
+    """Send a newly subscribed client the current state of the buses it now
+    follows, as one bus:snapshot event. The socket is on this worker, so the
+    emit skips the message queue."""
+    await sio.emit("bus:snapshot", {
+        **target,
+        "buses": [bus_payload(state) for state in states if state.has_position]
+    }, to=sid, ignore_queue=True)
 
 @sio.event
 async def bus_stop(sid, data):
-    """Bus reaches a stop"""
+    """Bus reaches a stop (legacy device-reported event)"""
     bus_id = data.get("bus_id")
     stop_id = data.get("stop_id")
     stop_index = data.get("stop_index")
     
-    if bus_id in active_buses:
-        active_buses[bus_id]["current_stop_index"] = stop_index
+    progress = bus_progress.get(bus_id)
+    if progress is not None and progress.position is not None:
+        # Arrivals for tracked buses are derived from bus_update pings
+        return
     
-    # Broadcast stop event
+    if bus_state.get(bus_id) is not None:
+        await bus_state.update(bus_id, current_stop_index=stop_index)
+    
+    await emit_bus_stop(bus_id, stop_id, stop_index)
+
+async def emit_bus_stop(bus_id: str, stop_id: str, stop_index: int):
+    """Broadcast a stop arrival to the bus room"""
     await sio.emit("bus:stop", {
         "busId": bus_id,
         "stopId": stop_id,
@@ -151,15 +260,19 @@ async def bus_stop(sid, data):
 async def subscribe_route(sid, route_id):
     """Client subscribes to a route"""
     if route_id:
+        # Join first so no update falls between the snapshot and the room
         await sio.enter_room(sid, f"route:{route_id}")
-        print(f"Client {sid} subscribed to route {route_id}")
+        await send_snapshot(sid, bus_state.on_route(route_id), routeId=route_id)
+        event_log.event("socket.subscribe", sid=sid, route=route_id)
 
 @sio.on("subscribe:bus")
 async def subscribe_bus(sid, bus_id):
     """Client subscribes to a specific bus"""
     if bus_id:
         await sio.enter_room(sid, f"bus:{bus_id}")
-        print(f"Client {sid} subscribed to bus {bus_id}")
+        state = bus_state.get(bus_id)
+        await send_snapshot(sid, [state] if state else [], busId=bus_id)
+        event_log.event("socket.subscribe", sid=sid, bus=bus_id)
 
 @sio.on("unsubscribe:route")
 async def unsubscribe_route(sid, route_id):
@@ -173,44 +286,54 @@ async def unsubscribe_bus(sid, bus_id):
     if bus_id:
         await sio.leave_room(sid, f"bus:{bus_id}")
 
-async def check_upcoming_stop_alerts(
-    db: Session, route_id: str, bus_id: str, current_stop_index: int
-):
-    """Check if bus is 2 stops before any subscribed stop and send alerts"""
-    # Get all active subscriptions for this route
-    subscriptions = db.query(Subscription).filter(
-        Subscription.route_id == route_id,
-        Subscription.is_active == True,
-        Subscription.notifications_enabled == True
-    ).all()
-    
-    for subscription in subscriptions:
-        # Check if bus is 2 stops before subscribed stop
-        if current_stop_index == subscription.stop_index - 2:
-            stop = db.query(Stop).filter(Stop.id == subscription.stop_id).first()
-            if stop:
-                # Calculate ETA (simplified - 5 minutes per stop)
-                eta_minutes = 10  # 2 stops * 5 minutes
-                
-                alert_payload = {
-                    "busId": bus_id,
-                    "routeId": route_id,
-                    "stopId": subscription.stop_id,
-                    "stopIndex": subscription.stop_index,
-                    "stopName": stop.name,
-                    "eta": eta_minutes
-                }
-                
-                # Emit socket event
-                await sio.emit("alert:upcoming_stop", alert_payload, room=f"user:{subscription.user_id}")
-                
-                # Send FCM notification (for offline users)
-                try:
-                    await send_fcm_notification(
-                        subscription.user_id,
-                        "Bus Approaching",
-                        f"Your stop {stop.name} is coming up in {eta_minutes} minutes"
-                    )
-                except Exception as e:
-                    print(f"FCM notification failed: {e}")
+def estimate_eta(geometry, bus_id: str, stop_id: str) -> EtaEstimate:
+    """ETA of a bus to one of its route's stops, from its live state"""
+    state = bus_state.get(bus_id)
+    target = geometry.position_by_stop_id[stop_id]
+    eta = None
+    if state is not None:
+        eta = eta_engine.estimate(geometry, state.current_stop_index, state.route_progress_m,
+                                  target, state.speed)
+    if eta is None:
+        # Untracked bus: assume it is at the alert position, 2 stops out
+        eta = eta_engine.estimate(geometry, max(target - 2, 0), None, target)
+    return eta or EtaEstimate(0.0, 0, "distance")
 
+async def check_upcoming_stop_alerts(route_id: str, bus_id: str, current_stop_index: int, trip: int = 0):
+    """Check if bus is 2 stops before any subscribed stop and send alerts
+    (at most once per subscription per trip)"""
+    targets = subscription_index.lookup(route_id, current_stop_index + 2)
+    if not targets:
+        return
+    
+    geometry = await route_cache.get(route_id)
+    for target in targets:
+        stop_name = geometry.stop_name(target.stop_id)
+        if stop_name is None:
+            continue
+        if not alert_ledger.claim(bus_id, trip, target.subscription_id):
+            continue
+        
+        eta_minutes = estimate_eta(geometry, bus_id, target.stop_id).minutes
+        
+        alert_payload = {
+            "busId": bus_id,
+            "routeId": route_id,
+            "stopId": target.stop_id,
+            "stopIndex": target.stop_index,
+            "stopName": stop_name,
+            "eta": eta_minutes
+        }
+        
+        # Emit socket event
+        await sio.emit("alert:upcoming_stop", alert_payload, room=f"user:{target.user_id}")
+        
+        # Send FCM notification (for offline users)
+        try:
+            await send_fcm_notification(
+                target.user_id,
+                "Bus Approaching",
+                f"Your stop {stop_name} is coming up in {eta_minutes} minutes"
+            )
+        except Exception as e:
+            logger.warning("FCM notification failed: %s", e)
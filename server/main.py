@@ -1,20 +1,56 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-import socketio
+from app.core.auth import require_metrics_access, role_cache, token_cache
 from app.core.config import settings
 from app.core.database import engine, Base
-from app.api import auth, routes, subscriptions, admin, payments
-from app.socketio_app import sio_app
+from app.core.state_channel import state_channel
+from app.api import auth, routes, subscriptions, admin, payments, devices, buses
+from app.socketio_app import sio, sio_app, start_client_manager, fanout_scheduler, connect_admission, event_log
+from app.services.telemetry import telemetry_ingestor
+from app.services.location_maintenance import location_maintenance
+from app.services.eta import eta_engine
+from app.services.route_cache import route_cache
+from app.services.route_catalogue import route_catalogue
+from app.services.subscription_index import subscription_index
+from app.services.alert_ledger import alert_ledger
+from app.services.fcm_service import push_dispatcher
+from app.services.password_hasher import password_hasher
+from app.services.stripe_gateway import stripe_gateway
+from app.services.payment_events import payment_event_processor
+from app.services.bus_state import bus_state
+from app.services.expense_summary import reconcile_rollups
 
 # Create database tables
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     Base.metadata.create_all(bind=engine)
+    await reconcile_rollups()
+    start_client_manager()
+    state_channel.start()
+    await route_cache.warm()
+    await subscription_index.load()
+    subscription_index.start()
+    telemetry_ingestor.start()
+    location_maintenance.start()
+    eta_engine.start()
+    push_dispatcher.start()
+    password_hasher.start()
+    stripe_gateway.start()
+    payment_event_processor.start()
+    fanout_scheduler.start()
     yield
     # Shutdown
-    pass
+    await fanout_scheduler.stop()
+    await push_dispatcher.stop()
+    await subscription_index.stop()
+    await telemetry_ingestor.stop()
+    await location_maintenance.stop()
+    await eta_engine.stop()
+    await payment_event_processor.stop()
+    password_hasher.stop()
+    stripe_gateway.stop()
 
 app = FastAPI(
     title="BusTrackr API",
@@ -38,6 +74,8 @@ app.include_router(routes.router, prefix="/routes", tags=["routes"])
 app.include_router(subscriptions.router, prefix="/routes", tags=["subscriptions"])
 app.include_router(admin.router, prefix="/admin", tags=["admin"])
 app.include_router(payments.router, prefix="", tags=["payments"])
+app.include_router(devices.router, prefix="/auth", tags=["devices"])
+app.include_router(buses.router, prefix="", tags=["buses"])
 
 # Mount Socket.IO app
 app.mount("/socket.io/", sio_app)
@@ -50,6 +88,29 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+@app.get("/metrics", dependencies=[Depends(require_metrics_access)])
+async def metrics():
+    return {
+        "telemetry": telemetry_ingestor.stats(),
+        "location_maintenance": location_maintenance.stats(),
+        "route_cache": route_cache.stats(),
+        "eta": eta_engine.stats(),
+        "route_catalogue": route_catalogue.stats(),
+        "subscription_index": subscription_index.stats(),
+        "alerts": alert_ledger.stats(),
+        "push": push_dispatcher.stats(),
+        "password_hasher": password_hasher.stats(),
+        "stripe": stripe_gateway.stats(),
+        "payment_events": payment_event_processor.stats(),
+        "auth": {"tokens": token_cache.stats(), "roles": role_cache.stats()},
+        "bus_state": bus_state.stats(),
+        "state_channel": state_channel.stats(),
+        "fanout": sio.manager.stats(),
+        "fanout_scheduler": fanout_scheduler.stats(),
+        "connect_admission": connect_admission.stats(),
+        "socket_events": event_log.stats(),
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host=settings.HOST, port=settings.PORT)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Per-request authentication overhead.
+
+Serves three endpoints from one in-process FastAPI app against a throwaway
+SQLite database and calls each `--requests` times, cycling through tokens
+for `--users` admins:
+
+    none     no authentication (baseline)
+    legacy   the old per-router dependency: verify the JWT with python-jose,
+             then load the User row to check the role, on every request
+    cached   app.core.auth.require_admin: claims from the token LRU, role
+             from the role cache
+
+Reports p50/p99 latency and the mean overhead over the baseline:
+
+    python scripts/bench_auth.py --requests 5000 --users 100
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+_db_dir = tempfile.mkdtemp(prefix="bench-auth-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+os.environ.setdefault("JWT_SECRET", "bench")
+os.environ.setdefault("STRIPE_SECRET_KEY", "sk_test_bench")
+os.environ.setdefault("STRIPE_PUBLISHABLE_KEY", "pk_test_bench")
+
+import httpx
+from fastapi import Depends, FastAPI, Header, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core import auth
+from app.core.database import Base, SessionLocal, engine, get_async_db
+from app.core.security import create_access_token, decode_access_token
+from app.models import User
+
+
+def legacy_user_id(authorization: Optional[str] = Header(None)):
+    if not authorization:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    token = authorization.replace("Bearer ", "") if authorization.startswith("Bearer ") else authorization
+    payload = decode_access_token(token)
+    if not payload:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return payload.get("sub")
+
+
+async def legacy_verify_admin(user_id: str, db: AsyncSession):
+    user = await db.get(User, user_id)
+    if not user or user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
+
+app = FastAPI()
+
+
+@app.get("/none")
+async def no_auth():
+    return {}
+
+
+@app.get("/legacy")
+async def legacy(db: AsyncSession = Depends(get_async_db), user_id: str = Depends(legacy_user_id)):
+    await legacy_verify_admin(user_id, db)
+    return {}
+
+
+@app.get("/cached")
+async def cached(user_id: str = Depends(auth.require_admin)):
+    return {}
+
+
+def seed(users):
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.add_all([
+            User(id=f"admin-{i}", email=f"admin{i}@example.com", hashed_password="-", name="Admin", role="admin")
+            for i in range(users)
+        ])
+        db.commit()
+    return [
+        {"Authorization": f"Bearer {create_access_token({'sub': f'admin-{i}', 'role': 'admin'})}"}
+        for i in range(users)
+    ]
+
+
+async def measure(client, path, headers, requests):
+    samples = []
+    for i in range(requests):
+        started = time.perf_counter()
+        response = await client.get(path, headers=headers[i % len(headers)])
+        samples.append((time.perf_counter() - started) * 1_000_000)
+        assert response.status_code == 200, response.text
+    return sorted(samples)
+
+
+async def run(args):
+    headers = seed(args.users)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for path in ("/none", "/legacy", "/cached"):
+            await measure(client, path, headers, min(args.requests, 200))  # warm up
+        results = {path: await measure(client, path, headers, args.requests)
+                   for path in ("/none", "/legacy", "/cached")}
+
+    baseline = statistics.mean(results["/none"])
+    print(f"{'endpoint':<9}{'p50 us':>9}{'p99 us':>9}{'mean us':>9}{'auth us':>9}")
+    for path, samples in results.items():
+        mean = statistics.mean(samples)
+        p99 = samples[min(int(len(samples) * 0.99), len(samples) - 1)]
+        print(f"{path[1:]:<9}{statistics.median(samples):>9.0f}{p99:>9.0f}{mean:>9.0f}{mean - baseline:>9.0f}")
+    print(f"token cache {auth.token_cache.stats()}, role cache {auth.role_cache.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000, help="requests per endpoint")
+    parser.add_argument("--users", type=int, default=100, help="distinct admin tokens to cycle through")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Wire size and broadcast cost of the full vs compact bus:update format.
+
+A bus drives a straight-ish path pinging every `--ping-interval` seconds;
+each update is broadcast to `--clients` fake clients in its route room, all
+on one format and encoding. Reports bytes per update per client (Socket.IO
+packets as queued, before websocket framing/compression) and server-side
+ms per broadcast:
+
+    python scripts/bench_compact.py
+    python scripts/bench_compact.py --clients 10000 --updates 500 --keyframe-interval 20
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JWT_SECRET", "bench")
+os.environ.setdefault("STRIPE_SECRET_KEY", "sk_test_bench")
+os.environ.setdefault("STRIPE_PUBLISHABLE_KEY", "pk_test_bench")
+
+import socketio
+from app.services.socketio_manager import FanoutManager
+
+
+class QueueSocket:
+    closed = False
+
+    def __init__(self):
+        self.queue = []
+
+    async def send(self, pkt):
+        self.queue.append(pkt)
+
+
+def path(updates, ping_interval):
+    """bus:update payloads along a gently curving path at ~30 km/h."""
+    started = datetime(2024, 9, 2, 7, 30)
+    lat, lng = 37.774929, -122.419416
+    for seq in range(1, updates + 1):
+        heading = seq / 50
+        step = 30 / 3.6 * ping_interval / 111_000  # degrees per ping
+        lat += step * math.cos(heading)
+        lng += step * math.sin(heading) / math.cos(math.radians(lat))
+        yield {
+            "busId": "bus-1", "routeId": "route-1", "lat": lat, "lng": lng,
+            "speed": round(30 + 5 * math.sin(seq / 7), 1), "stopIndex": seq // 60, "seq": seq,
+            "timestamp": (started + timedelta(seconds=seq * ping_interval)).isoformat(),
+        }
+
+
+def wire_bytes(pkt):
+    encoded = pkt.encode()
+    return len(encoded.encode() if isinstance(encoded, str) else encoded)
+
+
+async def run_case(fmt, encoding, args):
+    manager = FanoutManager(keyframe_interval=args.keyframe_interval)
+    server = socketio.AsyncServer(async_mode="asgi", client_manager=manager)
+    sockets = []
+    for i in range(args.clients):
+        eio_sid = f"eio-{i}"
+        socket = server.eio.sockets[eio_sid] = QueueSocket()
+        sockets.append(socket)
+        sid = await manager.connect(eio_sid, "/")
+        await manager.enter_room(sid, "/", "route:route-1")
+        manager.set_encoding(sid, encoding)
+        manager.set_format(sid, fmt)
+
+    elapsed = 0.0
+    total_bytes = 0
+    for payload in path(args.updates, args.ping_interval):
+        started = time.perf_counter()
+        await server.emit("bus:update", payload, room="route:route-1")
+        elapsed += time.perf_counter() - started
+        total_bytes += sum(wire_bytes(pkt) for pkt in sockets[0].queue)
+        for socket in sockets:
+            socket.queue.clear()
+    return total_bytes / args.updates, elapsed / args.updates * 1000
+
+
+async def run(args):
+    print(f"{args.clients} clients, {args.updates} updates, keyframe every {args.keyframe_interval}")
+    print(f"{'format':<10}{'encoding':<10}{'bytes/update':>14}{'vs full json':>14}{'ms/update':>11}{'MB/h/client':>13}")
+    baseline = None
+    for fmt in ("full", "compact"):
+        for encoding in ("json", "msgpack"):
+            size, ms = await run_case(fmt, encoding, args)
+            baseline = baseline or size
+            per_hour = size * 3600 / args.ping_interval / 1e6
+            print(f"{fmt:<10}{encoding:<10}{size:>14.1f}{size / baseline:>13.0%} {ms:>10.2f}{per_hour:>13.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--updates", type=int, default=300)
+    parser.add_argument("--ping-interval", type=float, default=2.0, help="seconds between bus updates")
+    parser.add_argument("--keyframe-interval", type=int, default=20)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Peak RSS and time-to-first-byte of GET /admin/expenses/export.
+
+Seeds a throwaway SQLite database with N expenses, then runs each export in
+a fresh subprocess (so peak RSS is per export) against the real app served
+by uvicorn on localhost, reading the body in chunks as a client would.
+`--legacy` also times the old pandas/BytesIO implementation, if pandas is
+installed:
+
+    python scripts/bench_export.py
+    python scripts/bench_export.py --rows 10000 100000 1000000 --formats csv xlsx --legacy
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def configure(db_path):
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("JWT_SECRET", "bench")
+    os.environ.setdefault("STRIPE_SECRET_KEY", "sk_test_bench")
+    os.environ.setdefault("STRIPE_PUBLISHABLE_KEY", "pk_test_bench")
+
+
+def seed(db_path, rows):
+    configure(db_path)
+    from datetime import datetime, timedelta, timezone
+    from sqlalchemy import insert
+    from app.core.database import Base, SessionLocal, engine
+    from app.models import Expense, User
+
+    Base.metadata.create_all(bind=engine)
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    with SessionLocal() as db:
+        db.add(User(id="admin", email="admin@example.com", hashed_password="-", name="Admin", role="admin"))
+        for offset in range(0, rows, 50_000):
+            db.execute(insert(Expense), [
+                {"id": f"e{i}", "user_id": "admin", "category": ("fuel", "repairs", "salaries")[i % 3],
+                 "amount": round(10 + (i % 997) * 1.37, 2), "description": f"Expense number {i}",
+                 "date": start + timedelta(minutes=i)}
+                for i in range(offset, min(offset + 50_000, rows))
+            ])
+        db.commit()
+
+
+def legacy_export(fmt):
+    """The pre-streaming implementation, for comparison."""
+    import pandas as pd
+    from io import BytesIO
+    from fastapi import Response
+    from sqlalchemy import select
+    from app.core.database import AsyncSessionLocal
+    from app.models import Expense
+
+    async def export():
+        async with AsyncSessionLocal() as db:
+            expenses = (await db.execute(select(Expense))).scalars().all()
+        df = pd.DataFrame([{
+            "Category": exp.category, "Amount": exp.amount, "Description": exp.description,
+            "Date": exp.date.isoformat() if exp.date else "",
+        } for exp in expenses])
+        output = BytesIO()
+        if fmt == "csv":
+            df.to_csv(output, index=False)
+        else:
+            df.to_excel(output, index=False, engine="openpyxl")
+        output.seek(0)
+        return Response(content=output.read())
+    return export
+
+
+async def child(args):
+    configure(args.db)
+    import httpx
+    import uvicorn
+    from app.core.security import create_access_token
+    from main import app
+
+    path = "/admin/expenses/export"
+    if args.legacy:
+        app.router.routes = [r for r in app.router.routes if getattr(r, "path", None) != path]
+        app.get(path)(legacy_export(args.format))
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'admin'})}"}
+
+    # A real server: httpx's ASGI transport buffers whole responses
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=None) as client:
+        started = time.perf_counter()
+        ttfb = None
+        size = 0
+        async with client.stream("GET", path, params={"format": args.format}, headers=headers) as response:
+            assert response.status_code == 200, response.status_code
+            async for chunk in response.aiter_raw():
+                if ttfb is None:
+                    ttfb = time.perf_counter() - started
+                size += len(chunk)
+        total = time.perf_counter() - started
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    server.should_exit = True
+    await serving
+    print(json.dumps({"ttfb": ttfb, "total": total, "bytes": size,
+                      "peak_mb": peak_kb / 1024, "growth_mb": (peak_kb - baseline_kb) / 1024}))
+
+
+def run(args):
+    print(f"{'rows':>9}  {'format':<7}{'impl':<11}{'TTFB s':>9}{'total s':>9}{'MB':>9}{'peak RSS MB':>13}{'RSS growth MB':>15}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory(prefix="bench-export-") as tmp:
+            db_path = os.path.join(tmp, "bench.db")
+            subprocess.run([sys.executable, __file__, "--seed", str(rows), "--db", db_path], check=True)
+            for fmt in args.formats:
+                impls = ["streaming"] + (["legacy"] if args.legacy else [])
+                for impl in impls:
+                    cmd = [sys.executable, __file__, "--child", "--db", db_path, "--format", fmt,
+                           "--port", str(args.port)]
+                    if impl == "legacy":
+                        cmd.append("--legacy")
+                    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+                    r = json.loads(out.strip().splitlines()[-1])
+                    print(f"{rows:>9}  {fmt:<7}{impl:<11}{r['ttfb']:>9.3f}{r['total']:>9.2f}"
+                          f"{r['bytes'] / 1e6:>9.1f}{r['peak_mb']:>13.0f}{r['growth_mb']:>15.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--formats", nargs="+", choices=["csv", "xlsx"], default=["csv", "xlsx"])
+    parser.add_argument("--legacy", action="store_true", help="also run the old pandas implementation")
+    parser.add_argument("--seed", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    parser.add_argument("--format", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=8765, help="local port for the benchmark server")
+    args = parser.parse_args()
+    if args.seed is not None:
+        seed(args.db, args.seed)
+    elif args.child:
+        asyncio.run(child(args))
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Encode + emit cost of one bus:update at 1k, 10k and 50k connected clients.
+
+Every client follows the route; `--bus-share` of them also follow the bus
+itself. Compares python-socketio's stock manager, emitting once per room as
+bus_update used to (two encodes, one task per recipient, duplicates for
+clients in both rooms), with FanoutManager emitting once to the union of
+both rooms. Clients are fake Engine.IO sockets that just queue packets,
+so the numbers are server-side CPU only:
+
+    python scripts/bench_fanout.py
+    python scripts/bench_fanout.py --clients 1000 10000 50000 --msgpack-share 0.2
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JWT_SECRET", "bench")
+os.environ.setdefault("STRIPE_SECRET_KEY", "sk_test_bench")
+os.environ.setdefault("STRIPE_PUBLISHABLE_KEY", "pk_test_bench")
+
+import socketio
+from app.services.socketio_manager import FanoutManager
+
+PAYLOAD = {
+    "busId": "bus-1", "routeId": "route-1", "lat": 37.774929, "lng": -122.419416,
+    "speed": 31.5, "stopIndex": 4, "seq": 1042, "timestamp": "2024-09-02T07:41:12.512345",
+}
+
+
+class QueueSocket:
+    """Engine.IO socket stand-in: sending is a queue append, as for a real
+    websocket client."""
+
+    closed = False
+
+    def __init__(self):
+        self.queue = []
+
+    async def send(self, pkt):
+        self.queue.append(pkt)
+
+
+async def build_server(manager, clients, bus_share, msgpack_share):
+    server = socketio.AsyncServer(async_mode="asgi", client_manager=manager)
+    sockets = []
+    bus_every = int(1 / bus_share) if bus_share else 0
+    msgpack_every = int(1 / msgpack_share) if msgpack_share else 0
+    for i in range(clients):
+        eio_sid = f"eio-{i}"
+        socket = server.eio.sockets[eio_sid] = QueueSocket()
+        sockets.append(socket)
+        sid = await manager.connect(eio_sid, "/")
+        await manager.enter_room(sid, "/", "route:route-1")
+        if bus_every and i % bus_every == 0:
+            await manager.enter_room(sid, "/", "bus:bus-1")
+        if msgpack_every and i % msgpack_every == 0 and hasattr(manager, "set_encoding"):
+            manager.set_encoding(sid, "msgpack")
+    return server, sockets
+
+
+async def measure(server, sockets, updates, emit):
+    started = time.perf_counter()
+    for _ in range(updates):
+        await emit(server)
+    elapsed = time.perf_counter() - started
+    delivered = sum(len(s.queue) for s in sockets)
+    for s in sockets:
+        s.queue.clear()
+    return elapsed / updates * 1000, delivered / updates
+
+
+async def emit_per_room(server):
+    await server.emit("bus:update", PAYLOAD, room="route:route-1")
+    await server.emit("bus:update", PAYLOAD, room="bus:bus-1")
+
+
+async def emit_union(server):
+    await server.emit("bus:update", PAYLOAD, room=["route:route-1", "bus:bus-1"])
+
+
+async def run(args):
+    print(f"{'clients':>8}  {'manager':<28}{'ms/update':>10}{'us/client':>11}{'packets/update':>16}")
+    for clients in args.clients:
+        updates = max(3, min(args.updates, 200_000 // clients))
+        cases = [
+            ("stock, emit per room", socketio.AsyncManager(), 0.0, emit_per_room),
+            ("fanout, union of rooms", FanoutManager(), 0.0, emit_union),
+        ]
+        if args.msgpack_share:
+            cases.append((f"fanout, {args.msgpack_share:.0%} msgpack", FanoutManager(), args.msgpack_share, emit_union))
+        for label, manager, msgpack_share, emit in cases:
+            server, sockets = await build_server(manager, clients, args.bus_share, msgpack_share)
+            await emit(server)  # warm up
+            for s in sockets:
+                s.queue.clear()
+            ms, packets = await measure(server, sockets, updates, emit)
+            print(f"{clients:>8}  {label:<28}{ms:>10.2f}{ms * 1000 / clients:>11.2f}{packets:>16,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--updates", type=int, default=50, help="updates per case (capped for large fleets)")
+    parser.add_argument("--bus-share", type=float, default=0.1, help="fraction of clients also in the bus room")
+    parser.add_argument("--msgpack-share", type=float, default=0.2, help="fraction of clients negotiating msgpack")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
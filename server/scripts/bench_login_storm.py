@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Event-loop latency during a login storm.
+
+Runs the real FastAPI app in-process against a throwaway SQLite database,
+fires a burst of concurrent POST /auth/login requests and meanwhile probes
+GET /health and the Socket.IO `bus_update` handler (broadcasting to
+`--listeners` fake clients) on a fixed interval. Reports p50/p99/max probe
+latency with bcrypt run inline on the event loop (the old behaviour) and
+through the bounded PasswordHasher pool:
+
+    python scripts/bench_login_storm.py --logins 100 --listeners 1000
+    python scripts/bench_login_storm.py --mode pool --workers 4
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+_db_dir = tempfile.mkdtemp(prefix="bench-login-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+os.environ.setdefault("JWT_SECRET", "bench")
+os.environ.setdefault("STRIPE_SECRET_KEY", "sk_test_bench")
+os.environ.setdefault("STRIPE_PUBLISHABLE_KEY", "pk_test_bench")
+
+import logging
+import httpx
+from app.api import auth
+from app.core.database import SessionLocal
+from app.core.security import get_password_hash, verify_password
+from app.models import Route, Stop, User
+from app.services.password_hasher import PasswordHasher
+from app import socketio_app
+from main import app, lifespan
+
+PASSWORD = "correct horse battery staple"
+
+
+class InlineHasher:
+    """The pre-pool behaviour: bcrypt runs directly on the event loop."""
+
+    async def hash(self, password):
+        return get_password_hash(password)
+
+    async def verify(self, password, hashed_password):
+        return verify_password(password, hashed_password)
+
+    def stats(self):
+        return {}
+
+
+class FakeSocket:
+    """Engine.IO socket stand-in that just counts outgoing packets."""
+
+    sent = 0
+    closed = False
+
+    async def send(self, pkt):
+        FakeSocket.sent += 1
+
+
+def seed(users):
+    db = SessionLocal()
+    hashed = get_password_hash(PASSWORD)
+    db.add_all([
+        User(id=f"user-{i}", email=f"parent{i}@example.com", hashed_password=hashed, name="Parent")
+        for i in range(users)
+    ])
+    db.add(Route(id="route-1", name="Route 1", price=10.0))
+    db.add_all([
+        Stop(id=f"stop-{i}", route_id="route-1", name=f"Stop {i}", address="-",
+             latitude=37.77 + i * 0.002, longitude=-122.42, index=i)
+        for i in range(20)
+    ])
+    db.commit()
+    db.close()
+
+
+async def add_listeners(count):
+    sio = socketio_app.sio
+    for i in range(count):
+        eio_sid = f"bench-eio-{i}"
+        sio.eio.sockets[eio_sid] = FakeSocket()
+        sid = await sio.manager.connect(eio_sid, "/")
+        await sio.manager.enter_room(sid, "/", "route:route-1")
+
+
+def summary(samples):
+    ordered = sorted(samples)
+    p99 = ordered[min(int(len(ordered) * 0.99), len(ordered) - 1)]
+    return f"p50 {statistics.median(ordered):7.2f} ms  p99 {p99:7.2f} ms  max {ordered[-1]:7.2f} ms  (n={len(ordered)})"
+
+
+async def probe(samples, call, interval, stop):
+    # Latency is measured from when the probe was due, so time spent
+    # waiting for a blocked event loop counts
+    due = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(max(due - time.perf_counter(), 0))
+        await call()
+        finished = time.perf_counter()
+        samples.append((finished - due) * 1000)
+        due = max(due + interval, finished)
+
+
+async def run_mode(mode, args, client):
+    auth.password_hasher = InlineHasher() if mode == "inline" else PasswordHasher(
+        workers=args.workers, max_pending=args.logins
+    )
+    health_ms, update_ms = [], []
+    stop = asyncio.Event()
+    step = 0
+
+    async def health():
+        response = await client.get("/health")
+        assert response.status_code == 200
+
+    async def bus_update():
+        nonlocal step
+        step += 1
+        await socketio_app.bus_update("bench-bus-sid", {
+            "bus_id": "bus-1", "route_id": "route-1",
+            "lat": 37.77 + (step % 20) * 0.002, "lng": -122.42, "speed": 30.0,
+        })
+
+    async def login(i):
+        response = await client.post("/auth/login", json={
+            "email": f"parent{i % args.users}@example.com", "password": PASSWORD,
+        })
+        return response.status_code
+
+    probes = [
+        asyncio.create_task(probe(health_ms, health, args.interval, stop)),
+        asyncio.create_task(probe(update_ms, bus_update, args.interval, stop)),
+    ]
+    await asyncio.sleep(0.2)  # baseline samples before the storm
+    started = time.perf_counter()
+    codes = await asyncio.gather(*(login(i) for i in range(args.logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await asyncio.gather(*probes)
+
+    ok = codes.count(200)
+    print(f"[{mode}] {ok}/{args.logins} logins in {elapsed:.2f}s ({ok / elapsed:.1f}/s)")
+    print(f"  /health     {summary(health_ms)}")
+    print(f"  bus_update  {summary(update_ms)}")
+    hasher_stats = auth.password_hasher.stats()
+    if hasher_stats:
+        print(f"  hasher queue p99 {hasher_stats['queue_ms_p99']} ms, run p99 {hasher_stats['run_ms_p99']} ms")
+    if isinstance(auth.password_hasher, PasswordHasher):
+        auth.password_hasher.stop()
+
+
+async def run(args):
+    logging.getLogger("socketio").setLevel(logging.ERROR)
+    async with lifespan(app):
+        seed(args.users)
+        await add_listeners(args.listeners)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            modes = ["inline", "pool"] if args.mode == "both" else [args.mode]
+            for mode in modes:
+                await run_mode(mode, args, client)
+    print(f"bus:update packets delivered to fake listeners: {FakeSocket.sent}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["inline", "pool", "both"], default="both")
+    parser.add_argument("--logins", type=int, default=100, help="concurrent login requests in the storm")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=2, help="bcrypt threads in pool mode")
+    parser.add_argument("--listeners", type=int, default=1000, help="clients in the bus's route room")
+    parser.add_argument("--interval", type=float, default=0.01, help="seconds between probes")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
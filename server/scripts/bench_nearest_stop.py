@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: nearest-stop lookup in bus_update.
+
+Compares the original per-ping Python loop (planar distance on raw degrees)
+against StopLocator.nearest and the batched StopLocator.nearest_many for
+routes of 10, 100 and 1,000 stops. Run from the server directory:
+
+    python scripts/bench_nearest_stop.py
+"""
+
+import os
+import random
+import sys
+import timeit
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+from app.services.stop_locator import StopLocator
+
+STOP_COUNTS = [10, 100, 1000]
+PINGS = 1000
+BATCH_SIZE = 500
+
+def make_route(stop_count):
+    # A meandering route around San Francisco, ~150 m between stops
+    lat, lng = 37.7749, -122.4194
+    stops = []
+    for i in range(stop_count):
+        lat += random.uniform(-0.0015, 0.0015)
+        lng += random.uniform(-0.0015, 0.0015)
+        stops.append(SimpleNamespace(id=f"stop-{i}", name=f"Stop {i}", index=i, latitude=lat, longitude=lng))
+    return stops
+
+def make_geometry(stops):
+    return SimpleNamespace(
+        stop_ids=[s.id for s in stops],
+        indexes=[s.index for s in stops],
+        lats=np.array([s.latitude for s in stops]),
+        lngs=np.array([s.longitude for s in stops]),
+    )
+
+def legacy_nearest(stops, lat, lng):
+    current_stop_index = 0
+    min_distance = float("inf")
+    for i, stop in enumerate(stops):
+        distance = ((lat - stop.latitude) ** 2 + (lng - stop.longitude) ** 2) ** 0.5
+        if distance < min_distance:
+            min_distance = distance
+            current_stop_index = i
+    return current_stop_index
+
+def per_call_us(fn, number):
+    best = min(timeit.repeat(fn, number=1, repeat=5))
+    return best / number * 1e6
+
+def main():
+    random.seed(42)
+    print(f"{'stops':>6} {'legacy loop':>14} {'locator':>14} {'batch/ping':>14} {'agree':>7}")
+    for stop_count in STOP_COUNTS:
+        stops = make_route(stop_count)
+        locator = StopLocator(make_geometry(stops))
+        pings = [
+            (s.latitude + random.uniform(-0.0005, 0.0005), s.longitude + random.uniform(-0.0005, 0.0005))
+            for s in random.choices(stops, k=PINGS)
+        ]
+        lats = np.array([p[0] for p in pings])
+        lngs = np.array([p[1] for p in pings])
+
+        legacy = per_call_us(lambda: [legacy_nearest(stops, lat, lng) for lat, lng in pings], PINGS)
+        single = per_call_us(lambda: [locator.nearest(lat, lng) for lat, lng in pings], PINGS)
+        batch = per_call_us(
+            lambda: [locator.nearest_many(lats[i:i + BATCH_SIZE], lngs[i:i + BATCH_SIZE]) for i in range(0, PINGS, BATCH_SIZE)],
+            PINGS,
+        )
+
+        # Planar degrees and projected meters usually pick the same stop; they
+        # diverge only where east-west and north-south scales matter
+        positions, _, _ = locator.nearest_many(lats, lngs)
+        agree = np.mean([legacy_nearest(stops, lat, lng) == p for (lat, lng), p in zip(pings, positions)])
+
+        print(f"{stop_count:>6} {legacy:>11.2f} us {single:>11.2f} us {batch:>11.2f} us {agree:>6.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the push-notification worker.
+
+Registers N users with one device token each in a throwaway SQLite
+database, queues one notification per user (as an alert burst would) and
+measures how long the PushDispatcher takes to deliver them through either
+the in-process FakeFCMClient or a real HTTP endpoint such as
+scripts/fake_fcm_server.py:
+
+    python scripts/bench_push.py --users 20000
+    python scripts/bench_push.py --users 20000 --endpoint http://127.0.0.1:9099/fcm/send
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JWT_SECRET", "bench")
+os.environ.setdefault("STRIPE_SECRET_KEY", "sk_test_bench")
+os.environ.setdefault("STRIPE_PUBLISHABLE_KEY", "pk_test_bench")
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from app.core.database import Base
+from app.models import DeviceToken, User
+from app.services.fcm_service import FakeFCMClient, PushDispatcher, PyFCMClient
+
+async def make_session_factory(users):
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(User), [
+            {"id": f"user-{i}", "email": f"user{i}@example.com", "hashed_password": "x", "name": "Bench"}
+            for i in range(users)
+        ])
+        await conn.execute(insert(DeviceToken), [
+            {"id": f"token-{i}", "user_id": f"user-{i}", "token": f"device-{i}"}
+            for i in range(users)
+        ])
+    return async_sessionmaker(engine, expire_on_commit=False)
+
+async def run(args):
+    client = PyFCMClient("fake", endpoint=args.endpoint) if args.endpoint else FakeFCMClient(latency=args.latency)
+    dispatcher = PushDispatcher(
+        client=client, batch_size=args.batch_size, workers=args.workers,
+        max_queue_size=args.users, session_factory=await make_session_factory(args.users),
+    )
+    dispatcher.start()
+
+    started = time.perf_counter()
+    for i in range(args.users):
+        # Alerts for the same stop share a notification body
+        dispatcher.enqueue(f"user-{i}", "Bus Approaching", f"Your stop Stop {i % 20} is coming up in 10 minutes")
+    while dispatcher.sent + dispatcher.failed < args.users:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    await dispatcher.stop()
+
+    stats = dispatcher.stats()
+    print(f"delivered {stats['sent']} notifications in {elapsed:.2f}s "
+          f"({stats['sent'] / elapsed:,.0f}/s) using {stats['requests']} FCM requests")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated FCM latency per request (fake client)")
+    parser.add_argument("--endpoint", default="", help="FCM-compatible HTTP endpoint instead of the in-process fake")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
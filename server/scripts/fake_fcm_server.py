@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Local fake of the legacy FCM HTTP endpoint (POST /fcm/send).
+
+Point the server at it for end-to-end push tests and throughput runs:
+
+    python scripts/fake_fcm_server.py --port 9099
+    FCM_SERVER_KEY=fake FCM_ENDPOINT=http://localhost:9099/fcm/send uvicorn main:app
+
+Tokens starting with "dead-" are answered with NotRegistered, tokens
+starting with "flaky-" with Unavailable; everything else succeeds.
+"""
+
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FakeFCMHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    delivered = 0
+
+    def do_POST(self):
+        if self.path != "/fcm/send":
+            self.send_error(404)
+            return
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        tokens = payload.get("registration_ids") or [payload.get("to")]
+        if self.latency:
+            time.sleep(self.latency)
+
+        results = []
+        for token in tokens:
+            if token.startswith("dead-"):
+                results.append({"error": "NotRegistered"})
+            elif token.startswith("flaky-"):
+                results.append({"error": "Unavailable"})
+            else:
+                results.append({"message_id": f"0:{time.time_ns()}"})
+        success = sum(1 for r in results if "message_id" in r)
+        FakeFCMHandler.delivered += success
+
+        body = json.dumps({
+            "multicast_id": time.time_ns(),
+            "success": success,
+            "failure": len(results) - success,
+            "canonical_ids": 0,
+            "results": results,
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9099)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every request")
+    args = parser.parse_args()
+
+    FakeFCMHandler.latency = args.latency
+    server = ThreadingHTTPServer((args.host, args.port), FakeFCMHandler)
+    print(f"Fake FCM listening on http://{args.host}:{args.port}/fcm/send")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nDelivered {FakeFCMHandler.delivered} messages")
+
+if __name__ == "__main__":
+    main()
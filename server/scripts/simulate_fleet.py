@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+"""
+Fleet simulator: load-test a running server with buses and subscribers.
+
+Connects `--subscribers` parent clients, each subscribed to one route, then
+`--buses` bus clients that drive their route (synthetic loops, or
+`--routes-file` with {"route_id": [[lat, lng], ...]}) and emit `bus_update`
+every `--ping-interval` seconds (+/- `--ping-jitter`) for `--duration`
+seconds. Clients go through the real Socket.IO connect path, including
+connect admission: a refused client waits for the `retryAfter` it was sent.
+
+Every ping carries a unique position, so each `bus:update` a subscriber
+receives is matched to the ping by (busId, lat, lng) for the end-to-end
+latency. For every subscriber and bus on its route, pings it never saw are
+split into `coalesced` (a later ping of that bus arrived; the server
+deliberately sent only the newest position) and `dropped` (nothing later
+arrived, so the subscriber was left with a stale position).
+
+Server CPU and RSS come from /proc/<pid> (`--server-pid`, or the server
+started by `--spawn`), as do the simulator's own, so a saturated load
+generator is easy to spot. Ingest figures include the server's telemetry
+counters from `GET /metrics` (pass `--metrics-token` with an admin token
+for a server that does not set METRICS_PUBLIC). Results are written as JSON to `--output`:
+
+    python scripts/simulate_fleet.py --spawn --buses 200 --subscribers 2000 --duration 60
+    python scripts/simulate_fleet.py --url http://localhost:8000 --server-pid 4242 \\
+        --buses 2000 --subscribers 20000 --output fleet.json
+
+Tokens are signed with this checkout's JWT_SECRET (environment or .env),
+which must match the server's. Run from the server directory.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import aiohttp
+import socketio
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def synthetic_routes(count: int, stops: int, rng: random.Random) -> dict:
+    """Closed loops of `stops` points, 1-3 km across, around San Francisco."""
+    routes = {}
+    for r in range(count):
+        lat, lng = 37.70 + rng.uniform(0, 0.12), -122.50 + rng.uniform(0, 0.12)
+        radius = rng.uniform(0.005, 0.015)
+        routes[f"sim-route-{r}"] = [
+            (lat + radius * math.sin(2 * math.pi * i / stops), lng + radius * math.cos(2 * math.pi * i / stops))
+            for i in range(stops)
+        ]
+    return routes
+
+
+def load_routes(path: str) -> dict:
+    with open(path) as f:
+        return {route_id: [tuple(point) for point in points] for route_id, points in json.load(f).items()}
+
+
+def along(points, position: float):
+    """Point `position` segments along a closed route."""
+    i = int(position) % len(points)
+    frac = position - int(position)
+    (lat1, lng1), (lat2, lng2) = points[i], points[(i + 1) % len(points)]
+    return lat1 + (lat2 - lat1) * frac, lng1 + (lng2 - lng1) * frac
+
+
+def percentiles(samples, scale: float = 1.0) -> dict:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def at(q):
+        return round(ordered[min(int(len(ordered) * q), len(ordered) - 1)] * scale, 3)
+
+    return {"p50": at(0.5), "p90": at(0.9), "p99": at(0.99), "max": round(ordered[-1] * scale, 3),
+            "mean": round(statistics.fmean(ordered) * scale, 3), "count": len(ordered)}
+
+
+async def probe_lag(samples, interval: float, stop: asyncio.Event):
+    """Event-loop lag of the simulator itself; high values mean the load
+    generator, not the server, is the bottleneck."""
+    due = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(max(due - time.perf_counter(), 0))
+        finished = time.perf_counter()
+        samples.append(finished - due)
+        due = max(due + interval, finished)
+
+
+class ProcSampler:
+    """CPU (% of one core) and RSS of a process, sampled from /proc."""
+
+    def __init__(self, pid: int, interval: float = 1.0):
+        self.pid = pid
+        self.interval = interval
+        self.cpu = []
+        self.rss_mb = []
+
+    def read(self):
+        with open(f"/proc/{self.pid}/stat") as f:
+            # Fields after the parenthesised command name; utime and stime
+            # are fields 14 and 15 of the full line
+            fields = f.read().rsplit(")", 1)[1].split()
+        ticks = int(fields[11]) + int(fields[12])
+        with open(f"/proc/{self.pid}/status") as f:
+            rss_kb = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        return ticks, rss_kb / 1024
+
+    async def run(self, stop: asyncio.Event):
+        try:
+            ticks, rss = self.read()
+            self.rss_mb.append(rss)
+            started = time.perf_counter()
+            while not stop.is_set():
+                try:
+                    await asyncio.wait_for(stop.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                now_ticks, rss = self.read()
+                now = time.perf_counter()
+                self.cpu.append((now_ticks - ticks) / CLOCK_TICKS / (now - started) * 100)
+                self.rss_mb.append(rss)
+                ticks, started = now_ticks, now
+        except (FileNotFoundError, ProcessLookupError):
+            pass
+
+    def summary(self) -> dict:
+        if not self.rss_mb:
+            return {"pid": self.pid}
+        return {
+            "pid": self.pid,
+            "cpu_percent": {"mean": round(statistics.fmean(self.cpu), 1) if self.cpu else 0.0,
+                            "max": round(max(self.cpu, default=0.0), 1)},
+            "rss_mb": {"start": round(self.rss_mb[0], 1), "max": round(max(self.rss_mb), 1),
+                       "end": round(self.rss_mb[-1], 1)},
+        }
+
+
+class Fleet:
+    def __init__(self, args, http: aiohttp.ClientSession):
+        self.args = args
+        # One session (and connection pool) shared by every client
+        self.http = http
+        self.connect_slots = asyncio.Semaphore(args.connect_concurrency)
+        # (bus_id, lat, lng) -> (send time, ping number of that bus)
+        self.sent = {}
+        self.pings = {}
+        self.latencies = []
+        # One (route_id, {bus_id: [received, newest ping number]}) per subscriber
+        self.views = []
+        self.counters = {"refusals": 0, "connect_failures": 0, "disconnects": 0, "send_errors": 0, "unmatched": 0}
+        self.connect_seconds = []
+        self.running = True
+
+    async def connect(self, sio: socketio.AsyncClient, token: str) -> bool:
+        refusal = {}
+
+        @sio.event
+        def connect_error(data):
+            refusal.update(data if isinstance(data, dict) else {"message": data})
+
+        for _ in range(self.args.connect_attempts):
+            refusal.clear()
+            try:
+                async with self.connect_slots:
+                    started = time.perf_counter()
+                    await sio.connect(self.args.url, auth={"token": token}, transports=["websocket"],
+                                      wait_timeout=30)
+                self.connect_seconds.append(time.perf_counter() - started)
+                return True
+            except socketio.exceptions.ConnectionError:
+                if refusal.get("message") == "unauthorized":
+                    raise SystemExit("Server refused the token; is JWT_SECRET the same as the server's?")
+                retry_after = (refusal.get("data") or {}).get("retryAfter")
+                self.counters["refusals" if retry_after is not None else "connect_failures"] += 1
+                await asyncio.sleep(retry_after if retry_after is not None else random.uniform(0.5, 2.0))
+        return False
+
+    def watch_disconnects(self, sio: socketio.AsyncClient):
+        @sio.event
+        def disconnect():
+            if self.running:
+                self.counters["disconnects"] += 1
+
+    async def subscriber(self, route_id: str, token: str):
+        view = {}
+        sio = socketio.AsyncClient(reconnection=False, http_session=self.http)
+
+        @sio.on("bus:update")
+        def bus_update(payload):
+            self.received(view, payload)
+
+        if not await self.connect(sio, token):
+            return None
+        self.watch_disconnects(sio)
+        # Acknowledged once the server has joined the room
+        await sio.call("subscribe:route", route_id, timeout=60)
+        self.views.append((route_id, view))
+        return sio
+
+    def received(self, view: dict, payload: dict):
+        now = time.perf_counter()
+        sent = self.sent.get((payload.get("busId"), payload.get("lat"), payload.get("lng")))
+        if sent is None:
+            self.counters["unmatched"] += 1
+            return
+        self.latencies.append(now - sent[0])
+        seen = view.setdefault(payload["busId"], [0, 0])
+        seen[0] += 1
+        seen[1] = max(seen[1], sent[1])
+
+    async def bus(self, bus_id: str, route_id: str, token: str):
+        sio = socketio.AsyncClient(reconnection=False, http_session=self.http)
+        if not await self.connect(sio, token):
+            return None
+        self.watch_disconnects(sio)
+        await sio.call("bus_connect", {"bus_id": bus_id, "route_id": route_id}, timeout=60)
+        return sio
+
+    async def drive(self, sio: socketio.AsyncClient, bus_id: str, route_id: str, points, until: float):
+        args = self.args
+        rng = random.Random(bus_id)
+        position = rng.uniform(0, len(points))
+        # Buses do not ping in lockstep
+        await asyncio.sleep(rng.uniform(0, args.ping_interval))
+        while time.perf_counter() < until and sio.connected:
+            position += 1 / args.pings_per_segment
+            lat, lng = along(points, position)
+            # Unique per ping, so receipts can be matched to it
+            lat, lng = round(lat + rng.uniform(-1e-4, 1e-4), 7), round(lng + rng.uniform(-1e-4, 1e-4), 7)
+            number = self.pings.get(bus_id, 0) + 1
+            self.sent[(bus_id, lat, lng)] = (time.perf_counter(), number)
+            try:
+                await sio.emit("bus_update", {"bus_id": bus_id, "route_id": route_id, "lat": lat, "lng": lng,
+                                              "speed": round(rng.uniform(20, 50), 1)})
+            except socketio.exceptions.SocketIOError:
+                self.counters["send_errors"] += 1
+                del self.sent[(bus_id, lat, lng)]
+                break
+            self.pings[bus_id] = number
+            await asyncio.sleep(args.ping_interval * rng.uniform(1 - args.ping_jitter, 1 + args.ping_jitter))
+
+    def delivery(self, route_buses: dict) -> dict:
+        expected = delivered = coalesced = dropped = 0
+        for route_id, view in self.views:
+            for bus_id in route_buses.get(route_id, ()):
+                pings = self.pings.get(bus_id, 0)
+                received, newest = view.get(bus_id, (0, 0))
+                expected += pings
+                delivered += received
+                coalesced += newest - received
+                dropped += pings - newest
+        return {
+            "expected": expected,
+            "delivered": delivered,
+            "coalesced": coalesced,
+            "dropped": dropped,
+            "unmatched": self.counters["unmatched"],
+            "latency_ms": percentiles(self.latencies, 1000),
+        }
+
+
+async def server_metrics(url: str, token: str = None) -> dict:
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    try:
+        async with aiohttp.ClientSession(headers=headers) as session:
+            async with session.get(f"{url}/metrics", timeout=aiohttp.ClientTimeout(total=10)) as response:
+                if response.status != 200:
+                    return {}
+                return await response.json()
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+        return {}
+
+
+async def wait_healthy(url: str, process: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.perf_counter() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.perf_counter() < deadline:
+            if process.poll() is not None:
+                raise SystemExit(f"Server exited with {process.returncode}")
+            try:
+                async with session.get(f"{url}/health") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise SystemExit(f"Server at {url} did not become healthy in {timeout:.0f}s")
+
+
+async def gather_limited(coros, limit: int):
+    slots = asyncio.Semaphore(limit)
+
+    async def run(coro):
+        async with slots:
+            return await coro
+
+    return await asyncio.gather(*(run(coro) for coro in coros))
+
+
+async def run(args, create_access_token) -> dict:
+    started_at = datetime.now(timezone.utc).isoformat()
+    rng = random.Random(args.seed)
+    routes = load_routes(args.routes_file) if args.routes_file else synthetic_routes(args.routes, args.stops, rng)
+    route_ids = sorted(routes)
+    bus_routes = {f"sim-bus-{i}": route_ids[i % len(route_ids)] for i in range(args.buses)}
+    route_buses = {}
+    for bus_id, route_id in bus_routes.items():
+        route_buses.setdefault(route_id, []).append(bus_id)
+    # Subscribers only follow routes that have buses
+    followed = sorted(route_buses)
+
+    process = None
+    if args.spawn:
+        port = urlparse(args.url).port or 8000
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--log-level", "warning"],
+            cwd=SERVER_DIR,
+        )
+        args.server_pid = process.pid
+    try:
+        if process is not None:
+            await wait_healthy(args.url, process)
+        http = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0))
+        fleet = Fleet(args, http)
+        stop = asyncio.Event()
+        samplers = {"simulator": ProcSampler(os.getpid(), args.sample_interval)}
+        if args.server_pid:
+            samplers["server"] = ProcSampler(args.server_pid, args.sample_interval)
+        sampling = [asyncio.create_task(sampler.run(stop)) for sampler in samplers.values()]
+        lag = []
+        sampling.append(asyncio.create_task(probe_lag(lag, 0.05, stop)))
+        before = await server_metrics(args.url, args.metrics_token)
+
+        started = time.perf_counter()
+        # Fleet.connect bounds the connects in flight; refused clients
+        # back off without holding a slot
+        subscribers = await asyncio.gather(*(
+            fleet.subscriber(followed[i % len(followed)],
+                             create_access_token({"sub": f"sim-parent-{i}", "role": "parent"}))
+            for i in range(args.subscribers)
+        ))
+        buses = await asyncio.gather(*(
+            fleet.bus(bus_id, route_id, create_access_token({"sub": bus_id, "role": "driver"}))
+            for bus_id, route_id in bus_routes.items()
+        ))
+        connected_at = time.perf_counter()
+        print(f"connected {sum(s is not None for s in subscribers)} subscribers and "
+              f"{sum(b is not None for b in buses)} buses in {connected_at - started:.1f}s", file=sys.stderr)
+
+        until = connected_at + args.duration
+        await asyncio.gather(*(
+            fleet.drive(sio, bus_id, route_id, routes[route_id], until)
+            for sio, (bus_id, route_id) in zip(buses, bus_routes.items()) if sio is not None
+        ))
+        driven = time.perf_counter() - connected_at
+        # Coalesced updates are flushed on the fanout interval
+        await asyncio.sleep(args.drain)
+        after = await server_metrics(args.url, args.metrics_token)
+        fleet.running = False
+        stop.set()
+        await asyncio.gather(*sampling)
+
+        await gather_limited((sio.disconnect() for sio in subscribers + buses if sio is not None),
+                             args.connect_concurrency)
+        await http.close()
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    pings = sum(fleet.pings.values())
+    telemetry_before, telemetry_after = before.get("telemetry", {}), after.get("telemetry", {})
+    ingest = {
+        "pings_sent": pings,
+        "send_errors": fleet.counters["send_errors"],
+        "pings_per_second": round(pings / driven, 1),
+    }
+    if telemetry_after:
+        enqueued = telemetry_after["enqueued"] - telemetry_before.get("enqueued", 0)
+        ingest.update({
+            "server_enqueued": enqueued,
+            "server_dropped": telemetry_after["dropped"] - telemetry_before.get("dropped", 0),
+            "server_enqueued_per_second": round(enqueued / driven, 1),
+            "server_flushed_rows": telemetry_after["flushed_rows"] - telemetry_before.get("flushed_rows", 0),
+        })
+    return {
+        "started_at": started_at,
+        # Server and simulator share these when both run on this host
+        "host_cpus": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "metrics_token")},
+        "clients": {
+            "subscribers": sum(s is not None for s in subscribers),
+            "buses": sum(b is not None for b in buses),
+            "connect_phase_seconds": round(connected_at - started, 3),
+            "connect_ms": percentiles(fleet.connect_seconds, 1000),
+            "refusals": fleet.counters["refusals"],
+            "connect_failures": fleet.counters["connect_failures"],
+            "disconnects": fleet.counters["disconnects"],
+        },
+        "ingest": ingest,
+        "delivery": fleet.delivery(route_buses),
+        "processes": {name: sampler.summary() for name, sampler in samplers.items()},
+        "simulator_loop_lag_ms": percentiles(lag, 1000),
+        "server_metrics": {key: after[key] for key in ("fanout_scheduler", "connect_admission") if key in after},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--spawn", action="store_true", help="start a uvicorn server on --url's port for the run")
+    parser.add_argument("--server-pid", type=int, help="pid of the server to sample CPU/RSS from")
+    parser.add_argument("--buses", type=int, default=100)
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--routes", type=int, default=10, help="synthetic routes (ignored with --routes-file)")
+    parser.add_argument("--stops", type=int, default=15, help="points per synthetic route")
+    parser.add_argument("--routes-file", help='JSON {"route_id": [[lat, lng], ...]}')
+    parser.add_argument("--ping-interval", type=float, default=5.0, help="seconds between pings of one bus")
+    parser.add_argument("--ping-jitter", type=float, default=0.2, help="+/- fraction of the ping interval")
+    parser.add_argument("--pings-per-segment", type=float, default=6.0)
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds buses keep pinging")
+    parser.add_argument("--drain", type=float, default=5.0, help="seconds to wait for updates after the last ping")
+    parser.add_argument("--connect-concurrency", type=int, default=200, help="connects in flight at once")
+    parser.add_argument("--connect-attempts", type=int, default=20)
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="seconds between CPU/RSS samples")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--metrics-token", help="admin token for GET /metrics")
+    parser.add_argument("--output", default="fleet_results.json")
+    args = parser.parse_args()
+    args.url = args.url.rstrip("/")
+    args.output = os.path.abspath(args.output)
+    if args.routes_file:
+        args.routes_file = os.path.abspath(args.routes_file)
+
+    # One socket per simulated client
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    if soft < hard < args.buses + args.subscribers + 100:
+        print(f"warning: open file limit {hard} is below the number of clients", file=sys.stderr)
+
+    if args.spawn:
+        os.environ.setdefault("DATABASE_URL", "sqlite:///./fleet_sim.db")
+        os.environ.setdefault("JWT_SECRET", "fleet-sim")
+        os.environ.setdefault("STRIPE_SECRET_KEY", "sk_test_fleet")
+        os.environ.setdefault("STRIPE_PUBLISHABLE_KEY", "pk_test_fleet")
+        os.environ.setdefault("METRICS_PUBLIC", "true")
+        os.chdir(SERVER_DIR)
+    from app.core.security import create_access_token
+
+    results = asyncio.run(run(args, create_access_token))
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps({key: results[key] for key in ("clients", "ingest", "delivery", "processes", "simulator_loop_lag_ms")}, indent=2))
+    print(f"results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import asyncio
+import os
+
+# Settings are read at import time; give the test run a self-contained
+# configuration when no .env is present
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
+os.environ.setdefault("JWT_SECRET", "test-secret")
+os.environ.setdefault("STRIPE_SECRET_KEY", "sk_test_dummy")
+os.environ.setdefault("STRIPE_PUBLISHABLE_KEY", "pk_test_dummy")
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture
+def database_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'test.db'}"
+
+
+@pytest.fixture
+def sync_session_factory(database_url):
+    """Sync sessions on a fresh per-test database, for seeding and asserts."""
+    from app.core.database import Base
+    engine = create_engine(database_url, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def async_session_factory(database_url, sync_session_factory):
+    """Async sessions on the same database the sync factory created."""
+    from app.core.database import async_database_url
+    engine = create_async_engine(async_database_url(database_url))
+    yield async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    await engine.dispose()
+
+
+class FakeSocket:
+    """Engine.IO socket stand-in recording the encoded packets sent to it."""
+
+    closed = False
+
+    def __init__(self):
+        self.packets = []
+
+    async def send(self, pkt):
+        self.packets.append(pkt.encode())
+
+
+@pytest.fixture
+def add_client():
+    """Attach a fake connected client to a Socket.IO server, optionally in
+    some rooms; returns (sid, socket)."""
+    async def add(server, eio_sid, *rooms):
+        socket = server.eio.sockets[eio_sid] = FakeSocket()
+        sid = await server.manager.connect(eio_sid, "/")
+        for room in rooms:
+            await server.manager.enter_room(sid, "/", room)
+        return sid, socket
+    return add
+
+
+@pytest.fixture
+def wait_for():
+    """Poll until `condition()` is true, failing after `timeout` seconds."""
+    async def wait(condition, timeout=2.0):
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not condition():
+            assert asyncio.get_running_loop().time() < deadline
+            await asyncio.sleep(0.01)
+    return wait
@@ -0,0 +1,40 @@
+from app.services.alert_ledger import AlertLedger
+
+def test_one_alert_per_subscription_per_trip():
+    ledger = AlertLedger()
+    assert ledger.claim("bus-1", 1, "sub-a")
+    assert not ledger.claim("bus-1", 1, "sub-a")
+    assert ledger.claim("bus-1", 1, "sub-b")
+    assert ledger.claim("bus-2", 1, "sub-a")
+    assert ledger.stats()["suppressed"] == 1
+
+    # Next trip alerts again
+    assert ledger.claim("bus-1", 2, "sub-a")
+
+def test_reset_forgets_the_trip():
+    ledger = AlertLedger()
+    ledger.claim("bus-1", 1, "sub-a")
+    ledger.reset("bus-1")
+    assert ledger.claim("bus-1", 1, "sub-a")
+
+def test_least_recent_buses_are_evicted():
+    ledger = AlertLedger(max_buses=2)
+    ledger.claim("bus-1", 1, "sub-a")
+    ledger.claim("bus-2", 1, "sub-a")
+    ledger.claim("bus-1", 1, "sub-b")  # bus-1 is now most recent
+    ledger.claim("bus-3", 1, "sub-a")
+    assert ledger.stats()["buses"] == 2
+    assert not ledger.claim("bus-1", 1, "sub-a")
+    assert ledger.claim("bus-2", 1, "sub-a")
+
+def test_trip_cap_forgets_oldest_claims_and_keeps_deduplicating():
+    ledger = AlertLedger(max_alerts_per_trip=2)
+    assert ledger.claim("bus-1", 1, "sub-a")
+    assert ledger.claim("bus-1", 1, "sub-b")
+    assert ledger.claim("bus-1", 1, "sub-c")
+    # Past the cap, recent claims are still deduplicated
+    assert not ledger.claim("bus-1", 1, "sub-b")
+    assert not ledger.claim("bus-1", 1, "sub-c")
+    # and only the oldest one was forgotten
+    assert ledger.stats()["forgotten"] == 1
+    assert ledger.claim("bus-1", 1, "sub-a")
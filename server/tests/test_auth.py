@@ -1,10 +1,17 @@
 import pytest
 from fastapi.testclient import TestClient
+from app.core.config import settings
+from app.core.database import Base, engine
 from main import app
 
-client = TestClient(app)
+@pytest.fixture(scope="module")
+def client():
+    # Entering the client runs the app lifespan, which creates the tables
+    with TestClient(app) as client:
+        yield client
+    Base.metadata.drop_all(bind=engine)
 
-def test_register():
+def test_register(client):
     response = client.post(
         "/auth/register",
         json={
@@ -19,7 +26,7 @@ def test_register():
     assert "user" in data
     assert data["user"]["email"] == "test@example.com"
 
-def test_login():
+def test_login(client):
     # First register
     client.post(
         "/auth/register",
@@ -43,7 +50,7 @@ def test_login():
     assert "token" in data
     assert "user" in data
 
-def test_login_invalid_credentials():
+def test_login_invalid_credentials(client):
     response = client.post(
         "/auth/login",
         json={
@@ -53,3 +60,17 @@ def test_login_invalid_credentials():
     )
     assert response.status_code == 401
 
+
+def test_metrics_are_admin_only(client, monkeypatch):
+    token = client.post(
+        "/auth/register",
+        json={"email": "metrics@example.com", "password": "testpassword123", "name": "Metrics Test"}
+    ).json()["token"]
+
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": f"Bearer {token}"}).status_code == 403
+
+    monkeypatch.setattr(settings, "METRICS_PUBLIC", True)
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "telemetry" in response.json()
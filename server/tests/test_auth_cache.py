@@ -0,0 +1,111 @@
+import time
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from app.core import auth
+from app.core.auth import RoleCache, TokenCache
+from app.core.database import get_async_db
+from app.core.security import create_access_token
+from app.models import User
+
+class CountingDecoder:
+    def __init__(self, claims):
+        self.claims = claims
+        self.calls = 0
+
+    def __call__(self, token):
+        self.calls += 1
+        return self.claims.get(token)
+
+def test_token_cache_skips_verification_until_exp():
+    decode = CountingDecoder({
+        "good": {"sub": "u1", "exp": time.time() + 60},
+        "stale": {"sub": "u2", "exp": time.time() - 1},
+    })
+    cache = TokenCache(maxsize=10, decode=decode)
+
+    assert cache.claims("good")["sub"] == "u1"
+    assert cache.claims("good")["sub"] == "u1"
+    assert decode.calls == 1
+
+    # Already past exp: re-verified every time (the real decoder rejects it)
+    cache.claims("stale")
+    cache.claims("stale")
+    assert decode.calls == 3
+    # Invalid tokens are not cached
+    assert cache.claims("forged") is None
+    assert cache.claims("forged") is None
+    assert decode.calls == 5
+    assert cache.stats()["hits"] == 1
+
+def test_token_cache_evicts_least_recently_used():
+    exp = time.time() + 60
+    decode = CountingDecoder({f"t{i}": {"sub": f"u{i}", "exp": exp} for i in range(3)})
+    cache = TokenCache(maxsize=2, decode=decode)
+    cache.claims("t0")
+    cache.claims("t1")
+    cache.claims("t0")
+    cache.claims("t2")  # evicts t1
+    calls = decode.calls
+    cache.claims("t0")
+    cache.claims("t2")
+    assert decode.calls == calls
+    cache.claims("t1")
+    assert decode.calls == calls + 1
+    assert cache.stats()["evictions"] == 2
+
+@pytest.fixture
+def client(sync_session_factory, async_session_factory, monkeypatch):
+    with sync_session_factory() as db:
+        db.add_all([User(id="admin-1", email="a@example.com", hashed_password="-", name="A", role="admin"),
+                    User(id="parent-1", email="p@example.com", hashed_password="-", name="P")])
+        db.commit()
+
+    async def get_test_db():
+        async with async_session_factory() as db:
+            yield db
+
+    monkeypatch.setattr(auth, "token_cache", TokenCache())
+    monkeypatch.setattr(auth, "role_cache", RoleCache(ttl=60))
+    app = FastAPI()
+
+    @app.get("/admin-only")
+    async def admin_only(user_id: str = Depends(auth.require_admin)):
+        return {"user_id": user_id}
+
+    @app.get("/me")
+    async def me(user_id: str = Depends(auth.get_current_user_id)):
+        return {"user_id": user_id}
+
+    app.dependency_overrides[get_async_db] = get_test_db
+    test_client = TestClient(app)
+    test_client.sync_session_factory = sync_session_factory
+    return test_client
+
+def bearer(**claims):
+    return {"Authorization": f"Bearer {create_access_token(claims)}"}
+
+def test_shared_dependency_rejects_missing_and_invalid_tokens(client):
+    assert client.get("/me").status_code == 401
+    assert client.get("/me", headers={"Authorization": "Bearer nope"}).status_code == 401
+    headers = bearer(sub="parent-1", role="parent")
+    assert client.get("/me", headers=headers).json() == {"user_id": "parent-1"}
+    assert client.get("/me", headers=headers).status_code == 200
+    assert auth.token_cache.stats()["hits"] == 1
+
+def test_admin_role_is_cached_and_invalidated_on_commit(client):
+    admin = bearer(sub="admin-1", role="admin")
+    for _ in range(3):
+        assert client.get("/admin-only", headers=admin).json() == {"user_id": "admin-1"}
+    assert auth.role_cache.stats() == {"users": 1, "hits": 2, "misses": 1}
+
+    # A non-admin token is refused without looking the user up
+    assert client.get("/admin-only", headers=bearer(sub="parent-1", role="parent")).status_code == 403
+    assert auth.role_cache.stats()["misses"] == 1
+    # Tokens minted before roles were embedded fall back to the lookup
+    assert client.get("/admin-only", headers=bearer(sub="parent-1")).status_code == 403
+
+    with client.sync_session_factory() as db:
+        db.get(User, "admin-1").role = "parent"
+        db.commit()
+    assert client.get("/admin-only", headers=admin).status_code == 403
@@ -0,0 +1,86 @@
+import json
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from app.api import buses as buses_api
+from app.core.auth import get_current_claims
+from app.core.database import get_async_db
+from app.models import Bus, BusLocation, User
+from app.services import bus_history as bus_history_module
+from app.services.bus_history import BusHistory, HistoryPoint, decode_binary, simplify
+
+START = datetime(2024, 9, 2, 7, 0, tzinfo=timezone.utc)
+
+def point(i, lat, lng):
+    return HistoryPoint(START + timedelta(seconds=i), lat, lng, 30.0)
+
+def test_simplify_keeps_corners_within_tolerance():
+    # East along a street (with ~1 m GPS jitter), then north
+    east = [point(i, 37.0 + (0.000009 if i % 2 else 0), -122.0 + i * 0.0001) for i in range(50)]
+    north = [point(50 + i, 37.0 + i * 0.0001, -122.0 + 49 * 0.0001) for i in range(1, 50)]
+    track = east + north
+
+    simplified = simplify(track, tolerance_m=5)
+
+    assert simplified[0] == track[0] and simplified[-1] == track[-1]
+    assert track[49] in simplified
+    assert len(simplified) <= 4
+    assert simplify(track, tolerance_m=0) == track
+
+@pytest.fixture
+def client(sync_session_factory, async_session_factory, monkeypatch):
+    with sync_session_factory() as db:
+        db.add_all([User(id="admin-1", email="a@example.com", hashed_password="-", name="A", role="admin"),
+                    User(id="parent-1", email="p@example.com", hashed_password="-", name="P"),
+                    Bus(id="bus-1", route_id="r1")])
+        db.execute(insert(BusLocation), [
+            {"bus_id": "bus-1", "latitude": 37.0 + i * 0.0001, "longitude": -122.0, "speed": 20.0,
+             "timestamp": START + timedelta(seconds=2 * i)}
+            for i in range(300)
+        ])
+        db.commit()
+
+    async def get_test_db():
+        async with async_session_factory() as db:
+            yield db
+
+    monkeypatch.setattr(bus_history_module, "bus_history",
+                        BusHistory(async_session_factory, yield_per=50, chunk_size=100))
+    app = FastAPI()
+    app.include_router(buses_api.router)
+    app.dependency_overrides[get_async_db] = get_test_db
+    user = {"id": "admin-1"}
+    app.dependency_overrides[get_current_claims] = lambda: {"sub": user["id"]}
+    test_client = TestClient(app)
+    test_client.user = user
+    return test_client
+
+RANGE = {"from": "2024-09-02T07:00:00+00:00", "to": "2024-09-02T07:05:00+00:00"}
+
+def test_history_streams_ndjson_in_time_order(client):
+    response = client.get("/buses/bus-1/history", params=RANGE)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 150  # 07:00:00 up to, not including, 07:05:00
+    assert lines[0] == {"timestamp": "2024-09-02T07:00:00+00:00", "lat": 37.0, "lng": -122.0, "speed": 20.0}
+    assert lines[-1]["timestamp"] == "2024-09-02T07:04:58+00:00"
+
+def test_history_binary_with_simplification(client):
+    response = client.get("/buses/bus-1/history", params={**RANGE, "format": "binary", "tolerance": 10})
+
+    assert response.headers["content-type"] == "application/octet-stream"
+    points = decode_binary(response.content)
+    # A straight line: chunk boundaries (every 100 points) and the ends survive
+    assert [p.timestamp for p in points] == [START + timedelta(seconds=s) for s in (0, 198, 298)]
+    assert points[0].lat == 37.0 and points[0].speed == 20.0
+
+def test_history_is_admin_only_and_validated(client):
+    assert client.get("/buses/bus-1/history", params={**RANGE, "resolution": "hour"}).status_code == 400
+    assert client.get("/buses/bus-1/history", params={"from": RANGE["to"], "to": RANGE["from"]}).status_code == 400
+    assert client.get("/buses/bus-9/history", params=RANGE).status_code == 404
+    client.user["id"] = "parent-1"
+    assert client.get("/buses/bus-1/history", params=RANGE).status_code == 403
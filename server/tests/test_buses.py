@@ -0,0 +1,50 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import buses as buses_api
+from app.services.bus_state import BusState, BusStateStore
+
+@pytest.fixture
+def store(monkeypatch):
+    store = BusStateStore()
+    monkeypatch.setattr(buses_api, "bus_state", store)
+    return store
+
+@pytest.fixture
+def client(store):
+    app = FastAPI()
+    app.include_router(buses_api.router)
+    app.dependency_overrides[buses_api.get_current_user_id] = lambda: "user-1"
+    return TestClient(app)
+
+@pytest.mark.asyncio
+async def test_bus_status_from_live_state(client, store):
+    await store.update("bus-1", route_id="r1", sid="sid-1", current_stop_index=0)
+    assert client.get("/buses/bus-1/status").status_code == 404  # connected, no ping yet
+
+    await store.update("bus-1", lat=37.5, lng=-122.1, speed=28.0, updated_at=1_700_000_000.0,
+                       current_stop_index=3)
+    data = client.get("/buses/bus-1/status").json()
+    assert data == {
+        "id": "bus-1",
+        "route_id": "r1",
+        "current_location": {"lat": 37.5, "lng": -122.1},
+        "speed": 28.0,
+        "last_update": "2023-11-14T22:13:20Z",
+        "current_stop_index": 3,
+    }
+    assert client.get("/buses/unknown/status").status_code == 404
+
+@pytest.mark.asyncio
+async def test_route_buses_lists_positioned_buses(client, store):
+    await store.update("bus-1", route_id="r1", lat=37.0, lng=-122.0, updated_at=1.0)
+    await store.update("bus-2", route_id="r1")
+    await store.update("bus-3", route_id="r2", lat=38.0, lng=-121.0, updated_at=1.0)
+
+    assert [bus["id"] for bus in client.get("/routes/r1/buses").json()] == ["bus-1"]
+    assert client.get("/routes/empty/buses").json() == []
+
+def test_bus_state_has_fixed_fields():
+    state = BusState("bus-1")
+    with pytest.raises(AttributeError):
+        state.colour = "yellow"
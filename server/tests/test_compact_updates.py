@@ -0,0 +1,54 @@
+import json
+import pytest
+import socketio
+from app.services.compact_updates import CompactStreams, apply_compact, quantize
+from app.services.socketio_manager import FanoutManager
+
+def update(seq, lat, lng, speed=30.0, stop_index=2, second=0):
+    return {"busId": "b1", "routeId": "r1", "lat": lat, "lng": lng, "speed": speed,
+            "stopIndex": stop_index, "seq": seq, "timestamp": f"2024-09-02T07:41:{second:02d}.512345"}
+
+def decode(packet):
+    return json.loads(packet[2:])[1]
+
+def test_deltas_round_trip_to_quantized_positions():
+    streams = CompactStreams(keyframe_interval=3)
+    updates = [update(1, 37.774929, -122.419416, second=0), update(2, 37.775011, -122.419301, second=2),
+               update(4, 37.775102, -122.419188, speed=31.26, stop_index=3, second=5),
+               update(5, 37.775200, -122.419100, second=7)]
+    state = None
+    sent = []
+    for payload in updates:
+        key, delta = streams.encode("route:r1", payload)
+        sent.append(delta or key)
+        state = apply_compact(state, delta or key)
+        frame = quantize(payload)
+        assert (state["seq"], state["lat"], state["lng"], state["stopIndex"]) == \
+            (payload["seq"], frame.y / 100000, frame.x / 100000, payload["stopIndex"])
+
+    assert sent[0]["k"] == 1 and sent[0]["t"] == 1725262860
+    assert sent[1] == {"b": "b1", "t": 2, "y": 8, "x": 12}
+    assert sent[2] == {"b": "b1", "s": 2, "t": 3, "y": 9, "x": 11, "v": 13, "i": 1}
+    assert sent[3]["k"] == 1  # keyframe_interval reached
+    assert streams.stats() == {"streams": 1, "keyframes": 2, "deltas": 2}
+
+@pytest.mark.asyncio
+async def test_compact_clients_get_keyframe_then_deltas(add_client):
+    server = socketio.AsyncServer(async_mode="asgi", client_manager=FanoutManager(keyframe_interval=20))
+    _, full = await add_client(server, "eio-1", "route:r1")
+    compact_sid, compact = await add_client(server, "eio-2", "route:r1")
+    server.manager.set_format(compact_sid, "compact")
+
+    for seq in (1, 2):
+        await server.emit("bus:update", update(seq, 37.0 + seq / 1000, -122.0), room="route:r1")
+
+    assert [decode(p) for p in full.packets] == [update(1, 37.001, -122.0), update(2, 37.002, -122.0)]
+    assert decode(compact.packets[0])["k"] == 1
+    assert decode(compact.packets[1]) == {"b": "b1", "y": 100}
+    assert len(compact.packets[1]) < len(full.packets[1]) / 3
+
+    # Joining another room restarts every stream with a keyframe
+    await server.manager.enter_room(compact_sid, "/", "bus:b1")
+    await server.emit("bus:update", update(3, 37.003, -122.0), room="route:r1")
+    assert decode(compact.packets[2])["k"] == 1
+    assert server.manager.stats()["compact_clients"] == 1
@@ -0,0 +1,94 @@
+import json
+import logging
+import pytest
+from app import socketio_app
+from app.core.auth import TokenCache
+from app.core.sampled_log import SampledLogger
+from app.core.security import create_access_token
+from app.services.connect_admission import ConnectAdmission
+
+class ClientSocket:
+    """Engine.IO socket stand-in with the session store the connect
+    handler writes to."""
+
+    closed = False
+
+    def __init__(self):
+        self.packets = []
+        self.session = {}
+
+    async def send(self, pkt):
+        self.packets.append(pkt.encode())
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_bucket_admits_burst_then_paces_with_spread_out_retries():
+    clock = Clock()
+    admission = ConnectAdmission(rate=10, burst=5, jitter=0.5, clock=clock, rng=lambda: 1.0)
+
+    assert [admission.admit() for _ in range(5)] == [None] * 5
+    hints = [admission.admit() for _ in range(20)]
+    # Each refused client waits for a token plus a share of the backlog
+    # ahead of it, so hints grow with the size of the storm
+    assert hints[0] == pytest.approx(0.1 + 0.5)
+    assert hints[-1] == pytest.approx(0.1 + 20 / 10)
+    assert hints == sorted(hints)
+
+    clock.now += 0.25
+    assert admission.admit() is None
+    assert admission.admit() is None
+    assert admission.admit() is not None
+    assert admission.stats()["admitted"] == 7
+    assert admission.stats()["refused"] == 21
+
+def test_zero_rate_admits_everything():
+    admission = ConnectAdmission(rate=0, burst=1)
+    assert all(admission.admit() is None for _ in range(1000))
+
+def test_sampled_logger_logs_one_in_n_and_counts_all(caplog):
+    log = SampledLogger(logging.getLogger("test.sampled"), every=3)
+    with caplog.at_level(logging.INFO, logger="test.sampled"):
+        for i in range(7):
+            log.event("socket.connect", sid=f"s{i}")
+    assert [record.getMessage() for record in caplog.records] == [
+        "socket.connect sid=s0 count=1", "socket.connect sid=s3 count=4", "socket.connect sid=s6 count=7",
+    ]
+    assert caplog.records[0].fields == {"sid": "s0", "count": 1}
+    assert log.stats() == {"socket.connect": 7}
+
+async def connect(eio_sid, auth):
+    """Run a Socket.IO CONNECT through the real server; returns the reply."""
+    socket = socketio_app.sio.eio.sockets[eio_sid] = ClientSocket()
+    await socketio_app.sio._handle_eio_connect(eio_sid, {})
+    await socketio_app.sio._handle_eio_message(eio_sid, "0" + json.dumps(auth))
+    packet = socket.packets[-1]
+    # Engine.IO MESSAGE ("4"), then Socket.IO CONNECT ("0") or CONNECT_ERROR ("4")
+    return packet[1], json.loads(packet[2:])
+
+@pytest.mark.asyncio
+async def test_connect_refuses_with_retry_hint_and_caches_tokens(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(socketio_app, "connect_admission",
+                        ConnectAdmission(rate=1, burst=2, jitter=1.0, clock=clock, rng=lambda: 0.5))
+    monkeypatch.setattr(socketio_app, "token_cache", TokenCache())
+    token = create_access_token({"sub": "parent-1", "role": "parent"})
+
+    kind, reply = await connect("eio-admit-1", {"token": token})
+    assert kind == "0" and "sid" in reply
+    kind, reply = await connect("eio-admit-2", {"token": "forged"})
+    assert (kind, reply) == ("4", {"message": "unauthorized"})
+
+    kind, reply = await connect("eio-admit-3", {"token": token})
+    assert kind == "4" and reply["message"] == "server busy"
+    assert reply["data"]["retryAfter"] == pytest.approx(1.0 + 0.5)
+
+    clock.now += 1
+    kind, reply = await connect("eio-admit-3", {"token": token})
+    assert kind == "0"
+    # The reconnect reused the verified claims
+    assert socketio_app.token_cache.stats()["hits"] == 1
@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from app.api import buses as buses_api
+from app.models import Bus, BusLocation
+from app.services import route_cache as route_cache_module
+from app.services.bus_state import BusStateStore
+from app.services.eta import EtaEngine
+from app.services.route_cache import RouteCache, RouteGeometry
+
+MONDAY_8AM = datetime(2024, 9, 2, 8, 0, tzinfo=timezone.utc)
+STOP_SPACING = 0.009  # degrees of latitude, ~1 km
+
+def geometry():
+    return RouteGeometry("r1", [(f"s{k}", f"Stop {k}", k, 37.0 + k * STOP_SPACING, -122.0) for k in range(4)])
+
+def trip(bus_id, start, wait=60, step_seconds=5, speed_deg=STOP_SPACING / 100):
+    """Wait at the first stop, then drive the route in 300 s (~100 s per stop)."""
+    rows = [{"bus_id": bus_id, "latitude": 37.0, "longitude": -122.0, "speed": 0.0,
+             "timestamp": start + timedelta(seconds=s)} for s in range(0, wait + 1, step_seconds)]
+    for s in range(step_seconds, 301, step_seconds):
+        rows.append({"bus_id": bus_id, "latitude": 37.0 + s * speed_deg, "longitude": -122.0, "speed": 36.0,
+                     "timestamp": start + timedelta(seconds=wait + s)})
+    return rows
+
+@pytest.fixture
+def engine(sync_session_factory, async_session_factory):
+    with sync_session_factory() as db:
+        db.add(Bus(id="bus-1", route_id="r1"))
+        db.execute(insert(BusLocation), trip("bus-1", MONDAY_8AM))
+        db.commit()
+    route = geometry()
+
+    async def load(route_id):
+        return route
+
+    return EtaEngine(session_factory=async_session_factory, geometry_loader=load, lag_seconds=0)
+
+@pytest.mark.asyncio
+async def test_segment_times_learned_from_history(engine):
+    route = geometry()
+    at_8 = MONDAY_8AM.timestamp()
+    assert engine.estimate(route, 0, 0.0, 3, now=at_8).source == "distance"
+
+    await engine.refresh(now=MONDAY_8AM + timedelta(hours=1))
+
+    assert engine.stats()["observations"] == 3
+    eta = engine.estimate(route, 0, 0.0, 3, now=at_8)
+    assert eta.source == "history"
+    assert eta.seconds == pytest.approx(300, abs=1)
+    assert eta.minutes == 5 and eta.stops_away == 3
+    # Halfway along the first segment, no live speed
+    halfway = route.locator.stop_progress_m[1] / 2
+    assert engine.estimate(route, 0, halfway, 2, now=at_8).seconds == pytest.approx(150, abs=1)
+    # Live speed agrees with history here (36 km/h = 10 m/s, ~1000 m per 100 s)
+    assert engine.estimate(route, 0, halfway, 2, speed_kmh=36.0, now=at_8).seconds == pytest.approx(150, abs=1)
+    # Other buckets borrow the segment's average; passed stops are due now
+    assert engine.estimate(route, 1, None, 3, now=(MONDAY_8AM + timedelta(hours=10)).timestamp()).seconds \
+        == pytest.approx(200, abs=1)
+    assert engine.estimate(route, 2, None, 1).seconds == 0
+
+@pytest.mark.asyncio
+async def test_refresh_is_incremental(engine, sync_session_factory):
+    await engine.refresh(now=MONDAY_8AM + timedelta(hours=1))
+    with sync_session_factory() as db:
+        # A slower trip (~200 s per stop, so 1.5 stops) in the next hour
+        db.execute(insert(BusLocation), trip("bus-1", MONDAY_8AM + timedelta(hours=1, minutes=5),
+                                             speed_deg=STOP_SPACING / 200, step_seconds=10))
+        db.commit()
+
+    await engine.refresh(now=MONDAY_8AM + timedelta(hours=2))
+
+    assert engine.stats()["rows_read"] == 73 + 37
+    # 09:00 bucket learned from the new trip only; 08:00 unchanged
+    route = geometry()
+    assert engine.estimate(route, 0, None, 1, now=(MONDAY_8AM + timedelta(hours=1)).timestamp()).seconds \
+        == pytest.approx(200, abs=2)
+    assert engine.estimate(route, 0, None, 1, now=MONDAY_8AM.timestamp()).seconds == pytest.approx(100, abs=1)
+
+@pytest.mark.asyncio
+async def test_stop_eta_endpoint(engine, monkeypatch):
+    await engine.refresh(now=MONDAY_8AM + timedelta(hours=1))
+    route = geometry()
+
+    async def load(route_id):
+        return {route_id: route}
+
+    store = BusStateStore()
+    await store.update("bus-1", route_id="r1", lat=37.0, lng=-122.0, speed=0.0, updated_at=1.0,
+                       current_stop_index=0, route_progress_m=0.0)
+    await store.update("bus-2", route_id="r1", lat=37.02, lng=-122.0, speed=0.0, updated_at=1.0,
+                       current_stop_index=2, route_progress_m=route.locator.stop_progress_m[2])
+    monkeypatch.setattr(buses_api, "bus_state", store)
+    monkeypatch.setattr(buses_api, "eta_engine", engine)
+    monkeypatch.setattr(route_cache_module, "route_cache", RouteCache(loader=load))
+    app = FastAPI()
+    app.include_router(buses_api.router)
+    app.dependency_overrides[buses_api.get_current_user_id] = lambda: "user-1"
+    client = TestClient(app)
+
+    data = client.get("/routes/r1/eta", params={"stop_id": "s2"}).json()
+    assert data["stop_id"] == "s2"
+    assert [(bus["bus_id"], bus["stops_away"]) for bus in data["buses"]] == [("bus-1", 2)]
+    assert data["buses"][0]["source"] in ("history", "distance")
+    assert client.get("/routes/r1/eta", params={"stop_id": "nope"}).status_code == 404
@@ -0,0 +1,71 @@
+import csv
+import io
+from datetime import datetime, timezone
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from openpyxl import load_workbook
+from app.api import admin as admin_api
+from app.core.auth import get_current_claims
+from app.core.database import get_async_db
+from app.models import Expense, User
+from app.services.expense_export import ExpenseExporter
+
+@pytest.fixture
+def client(sync_session_factory, async_session_factory, monkeypatch):
+    with sync_session_factory() as db:
+        db.add_all([User(id="admin-1", email="a@example.com", hashed_password="-", name="A", role="admin"),
+                    User(id="parent-1", email="p@example.com", hashed_password="-", name="P")])
+        db.add_all([
+            Expense(id=f"e{i}", user_id="admin-1", category="fuel" if i % 2 else "repairs",
+                    amount=10.5 * i, description=None if i == 3 else f"item, {i}",
+                    date=datetime(2024, 1 + i % 12, 1, 9, tzinfo=timezone.utc))
+            for i in range(25)
+        ])
+        db.commit()
+
+    async def get_test_db():
+        async with async_session_factory() as db:
+            yield db
+
+    monkeypatch.setattr(admin_api, "expense_exporter",
+                        ExpenseExporter(async_session_factory, sync_session_factory, chunk_rows=4))
+    app = FastAPI()
+    app.include_router(admin_api.router, prefix="/admin")
+    app.dependency_overrides[get_async_db] = get_test_db
+    user = {"id": "admin-1"}
+    app.dependency_overrides[get_current_claims] = lambda: {"sub": user["id"]}
+    test_client = TestClient(app)
+    test_client.user = user
+    return test_client
+
+def test_csv_export_streams_all_rows_in_date_order(client):
+    response = client.get("/admin/expenses/export", params={"format": "csv"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == ["Category", "Amount", "Description", "Date"]
+    assert len(rows) == 26
+    dates = [row[3] for row in rows[1:]]
+    assert dates == sorted(dates)
+    assert ["fuel", "31.5", "", "2024-04-01T09:00:00"] in rows
+    assert ["repairs", "21.0", "item, 2", "2024-03-01T09:00:00"] in rows
+
+def test_date_filters_and_xlsx(client):
+    params = {"from": "2024-03-01T00:00:00Z", "to": "2024-05-01T00:00:00Z"}
+    csv_rows = list(csv.reader(io.StringIO(
+        client.get("/admin/expenses/export", params={**params, "format": "csv"}).text)))
+    assert {row[3][:7] for row in csv_rows[1:]} == {"2024-03", "2024-04"}
+
+    response = client.get("/admin/expenses/export", params=params)
+    assert response.headers["content-disposition"] == "attachment; filename=expenses.xlsx"
+    sheet = load_workbook(io.BytesIO(response.content), read_only=True)["Expenses"]
+    xlsx_rows = [list(row) for row in sheet.iter_rows(values_only=True)]
+    assert xlsx_rows[0] == ["Category", "Amount", "Description", "Date"]
+    assert [str(row[3]) for row in xlsx_rows[1:]] == [row[3] for row in csv_rows[1:]]
+
+def test_export_rejects_unknown_format_and_non_admins(client):
+    assert client.get("/admin/expenses/export", params={"format": "pdf"}).status_code == 400
+    client.user["id"] = "parent-1"
+    assert client.get("/admin/expenses/export").status_code == 403
@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql
+from app.api import admin as admin_api
+from app.core.auth import get_current_claims
+from app.core.database import get_async_db
+from app.models import Expense, ExpenseRollup, User
+from app.services.expense_summary import month_bucket, month_key, reconcile_rollups, rollup_upsert
+
+EXPENSES = [
+    (f"e{i:02d}", "fuel" if i % 3 else "repairs", float(i + 1),
+     datetime(2024, 1 + i % 4, 1 + i, 9, tzinfo=timezone.utc))
+    for i in range(25)
+]
+
+def expected(start=None, end=None):
+    totals = {}
+    for _, category, amount, date in EXPENSES:
+        if (start is None or date >= start) and (end is None or date < end):
+            totals[category] = totals.get(category, 0) + amount
+    return totals
+
+@pytest.fixture
+def client(sync_session_factory, async_session_factory):
+    with sync_session_factory() as db:
+        db.add(User(id="admin-1", email="a@example.com", hashed_password="-", name="A", role="admin"))
+        for expense_id, category, amount, date in EXPENSES:
+            db.add(Expense(id=expense_id, user_id="admin-1", category=category, amount=amount,
+                           description="-", date=date))
+            db.execute(rollup_upsert("sqlite", category, date, amount))
+        db.commit()
+
+    async def get_test_db():
+        async with async_session_factory() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(admin_api.router, prefix="/admin")
+    app.dependency_overrides[get_async_db] = get_test_db
+    app.dependency_overrides[get_current_claims] = lambda: {"sub": "admin-1"}
+    test_client = TestClient(app)
+    test_client.sync_session_factory = sync_session_factory
+    return test_client
+
+def test_summary_matches_ledger_for_any_range(client):
+    body = client.get("/admin/expenses/summary").json()
+    assert body["by_category"] == pytest.approx(expected())
+    assert body["total"] == pytest.approx(sum(amount for _, _, amount, _ in EXPENSES))
+    assert body["count"] == 25
+
+    # Month boundaries are served from the rollups, anything else from expenses
+    for start, end in [(datetime(2024, 2, 1, tzinfo=timezone.utc), datetime(2024, 4, 1, tzinfo=timezone.utc)),
+                       (datetime(2024, 1, 10, tzinfo=timezone.utc), datetime(2024, 3, 20, tzinfo=timezone.utc))]:
+        body = client.get("/admin/expenses/summary",
+                          params={"from": start.isoformat(), "to": end.isoformat()}).json()
+        assert body["by_category"] == pytest.approx(expected(start, end))
+
+def test_range_bounds_with_offsets_use_utc(client):
+    # Both bounds are UTC month starts written with other offsets
+    body = client.get("/admin/expenses/summary",
+                      params={"from": "2024-02-01T05:00:00+05:00", "to": "2024-03-31T22:00:00-02:00"}).json()
+    assert body["by_category"] == pytest.approx(expected(datetime(2024, 2, 1, tzinfo=timezone.utc),
+                                                         datetime(2024, 4, 1, tzinfo=timezone.utc)))
+    body = client.get("/admin/expenses/summary", params={"from": "2024-01-10T12:00:00+03:00"}).json()
+    assert body["by_category"] == pytest.approx(expected(datetime(2024, 1, 10, 9, tzinfo=timezone.utc)))
+
+@pytest.mark.asyncio
+async def test_missing_rollups_are_rebuilt_from_the_ledger(client, async_session_factory):
+    # As after `create_all` on a database that already has expenses
+    with client.sync_session_factory() as db:
+        db.execute(delete(ExpenseRollup))
+        db.commit()
+    assert client.get("/admin/expenses/summary").json()["count"] == 0
+
+    assert await reconcile_rollups(async_session_factory)
+    assert not await reconcile_rollups(async_session_factory)
+
+    body = client.get("/admin/expenses/summary", params={"bucket": "month"}).json()
+    assert body["by_category"] == pytest.approx(expected())
+    assert body["count"] == 25
+    assert list(body["by_month"]) == ["2024-01", "2024-02", "2024-03", "2024-04"]
+
+def test_monthly_buckets(client):
+    for params in [{}, {"from": "2024-01-05T00:00:00Z"}]:
+        by_month = client.get("/admin/expenses/summary", params={**params, "bucket": "month"}).json()["by_month"]
+        assert list(by_month) == ["2024-01", "2024-02", "2024-03", "2024-04"]
+        assert by_month["2024-03"] == pytest.approx(expected(datetime(2024, 3, 1, tzinfo=timezone.utc),
+                                                             datetime(2024, 4, 1, tzinfo=timezone.utc)))
+    assert client.get("/admin/expenses/summary", params={"bucket": "week"}).status_code == 400
+
+def test_month_buckets_are_utc():
+    sql = str(month_bucket(Expense.date, "postgresql").compile(dialect=postgresql.dialect()))
+    assert sql.count("timezone(") == 2
+    # 1 March 01:00 at +05:00 is still February in UTC
+    assert month_key(datetime(2024, 3, 1, 1, tzinfo=timezone(timedelta(hours=5)))) == "2024-02"
+
+def test_create_expense_updates_rollup(client):
+    before = client.get("/admin/expenses/summary").json()
+    for _ in range(2):
+        response = client.post("/admin/expenses", json={"category": "tolls", "amount": 4.25, "description": "bridge"})
+        assert response.status_code == 200
+
+    after = client.get("/admin/expenses/summary").json()
+    assert after["by_category"]["tolls"] == pytest.approx(8.5)
+    assert after["count"] == before["count"] + 2
+    with client.sync_session_factory() as db:
+        rollup = db.execute(select(ExpenseRollup).where(ExpenseRollup.category == "tolls")).scalar_one()
+    assert (rollup.total, rollup.count) == (8.5, 2)
+    assert rollup.month.day == 1 and rollup.month.hour == 0
+
+def test_keyset_pagination(client):
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 7, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/admin/expenses", params=params)
+        assert response.status_code == 200
+        seen += [expense["id"] for expense in response.json()]
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    by_date = sorted(EXPENSES, key=lambda expense: (expense[3], expense[0]))
+    assert seen == [expense_id for expense_id, *_ in by_date]
+
+    page = client.get("/admin/expenses", params={"category": "repairs", "limit": 100})
+    assert [expense["category"] for expense in page.json()] == ["repairs"] * 9
+    assert "x-next-cursor" not in page.headers
+    assert client.get("/admin/expenses", params={"cursor": "not-a-cursor"}).status_code == 400
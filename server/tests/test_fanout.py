@@ -0,0 +1,55 @@
+import json
+import msgpack
+import pytest
+import socketio
+from app.services.socketio_manager import FanoutManager, InProcessBroker, InProcessPubSubManager
+from app.socketio_app import start_client_manager
+
+@pytest.fixture
+def server():
+    return socketio.AsyncServer(async_mode="asgi", client_manager=FanoutManager())
+
+@pytest.mark.asyncio
+async def test_union_of_rooms_is_delivered_once(server, add_client):
+    _, both = await add_client(server, "eio-1", "route:r1", "bus:b1")
+    _, route_only = await add_client(server, "eio-2", "route:r1")
+    _, bus_only = await add_client(server, "eio-3", "bus:b1")
+    _, elsewhere = await add_client(server, "eio-4", "route:r2")
+
+    await server.emit("bus:update", {"busId": "b1"}, room=["route:r1", "bus:b1"])
+
+    assert [len(s.packets) for s in (both, route_only, bus_only, elsewhere)] == [1, 1, 1, 0]
+    assert both.packets[0] == '42["bus:update",{"busId":"b1"}]'
+    assert server.manager.stats()["encoded_packets"] == 1
+    assert server.manager.stats()["deliveries"] == 3
+
+@pytest.mark.asyncio
+async def test_msgpack_clients_get_binary_payloads(server, add_client):
+    json_sid, json_client = await add_client(server, "eio-1", "route:r1")
+    packed_sid, packed_client = await add_client(server, "eio-2", "route:r1")
+    server.manager.set_encoding(packed_sid, "msgpack")
+
+    payload = {"busId": "b1", "lat": 37.5, "lng": -122.25}
+    await server.emit("bus:update", payload, room="route:r1")
+
+    assert json.loads(json_client.packets[0][2:]) == ["bus:update", payload]
+    header, attachment = packed_client.packets
+    assert header.startswith('451-["bus:update",{"_placeholder":true,"num":0}]')
+    assert msgpack.unpackb(attachment) == payload
+    assert server.manager.stats()["encoded_packets"] == 2
+
+    await server.manager.disconnect(packed_sid, "/")
+    assert server.manager.stats()["msgpack_clients"] == 0
+
+@pytest.mark.asyncio
+async def test_skip_sid_and_pubsub_path(add_client):
+    server = socketio.AsyncServer(async_mode="asgi", client_manager=InProcessPubSubManager(InProcessBroker()))
+    start_client_manager(server)
+    sender, sender_socket = await add_client(server, "eio-1", "route:r1", "bus:b1")
+    _, other = await add_client(server, "eio-2", "route:r1", "bus:b1")
+
+    await server.emit("bus:update", {"busId": "b1"}, room=["route:r1", "bus:b1"], skip_sid=sender)
+    server.manager.thread.cancel()
+
+    assert sender_socket.packets == []
+    assert len(other.packets) == 1
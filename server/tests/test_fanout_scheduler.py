@@ -0,0 +1,74 @@
+import asyncio
+import json
+import pytest
+import socketio
+from app.services.fanout_scheduler import FanoutScheduler
+from app.services.socketio_manager import FanoutManager
+
+@pytest.fixture
+def server():
+    return socketio.AsyncServer(async_mode="asgi", client_manager=FanoutManager())
+
+def scheduler_for(server, **intervals):
+    async def emit(payload, room, skip_sid=None):
+        await server.emit("bus:update", payload, room=room, skip_sid=skip_sid)
+
+    def members(bus_id):
+        return [sid for sid, _ in server.manager.get_participants("/", f"bus:{bus_id}")]
+
+    return FanoutScheduler(emit, members, **intervals)
+
+def seqs(socket):
+    return [json.loads(packet[2:])[1]["seq"] for packet in socket.packets]
+
+@pytest.mark.asyncio
+async def test_updates_coalesce_to_latest_per_room(server, add_client):
+    _, route_client = await add_client(server, "eio-1", "route:r1")
+    _, bus_client = await add_client(server, "eio-2", "bus:b1")
+    _, both = await add_client(server, "eio-3", "route:r1", "bus:b1")
+    scheduler = scheduler_for(server, route_interval=10, bus_interval=5)
+
+    for seq in range(1, 6):
+        await scheduler.submit("b1", "r1", {"busId": "b1", "seq": seq})
+    await scheduler.submit("b2", "r1", {"busId": "b2", "seq": 1})
+    assert route_client.packets == bus_client.packets == both.packets == []
+
+    await scheduler.flush_bus()
+    await scheduler.flush_route()
+
+    assert seqs(bus_client) == [5]
+    assert sorted(seqs(route_client)) == [1, 5]
+    # b1 reaches `both` through the bus room only
+    assert sorted(seqs(both)) == [1, 5]
+    assert scheduler.stats()["coalesced"] == 8
+    assert scheduler.stats()["pending"] == 0
+
+@pytest.mark.asyncio
+async def test_zero_intervals_send_immediately_to_union(server, add_client):
+    _, both = await add_client(server, "eio-1", "route:r1", "bus:b1")
+    scheduler = scheduler_for(server, route_interval=0, bus_interval=0)
+
+    await scheduler.submit("b1", "r1", {"busId": "b1", "seq": 1})
+    await scheduler.submit("b1", "r1", {"busId": "b1", "seq": 2})
+
+    assert seqs(both) == [1, 2]
+    assert server.manager.stats()["emits"] == 2
+
+@pytest.mark.asyncio
+async def test_flush_loops_run_on_their_own_interval(server, add_client):
+    _, route_client = await add_client(server, "eio-1", "route:r1")
+    _, bus_client = await add_client(server, "eio-2", "bus:b1")
+    scheduler = scheduler_for(server, route_interval=0.2, bus_interval=0.02)
+    scheduler.start()
+    try:
+        for seq in range(1, 11):
+            await scheduler.submit("b1", "r1", {"busId": "b1", "seq": seq})
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.25)
+    finally:
+        await scheduler.stop()
+
+    assert seqs(route_client)[-1] == 10
+    assert len(route_client.packets) <= 2
+    assert seqs(bus_client)[-1] == 10
+    assert len(route_client.packets) < len(bus_client.packets) <= 10
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import insert, select
+from app.models import BusLocation, BusLocationRollup
+from app.services.location_maintenance import LocationMaintenance
+
+NOW = datetime(2024, 9, 2, 8, 0, 30, tzinfo=timezone.utc)
+
+def ping(bus_id, at, lat, speed=10.0):
+    return {"bus_id": bus_id, "latitude": lat, "longitude": -122.0, "speed": speed, "timestamp": at}
+
+@pytest.fixture
+def seed(sync_session_factory):
+    def seed(rows):
+        with sync_session_factory() as db:
+            db.execute(insert(BusLocation), rows)
+            db.commit()
+    return seed
+
+@pytest.mark.asyncio
+async def test_rollup_averages_complete_minutes_once(seed, async_session_factory, sync_session_factory):
+    minute = datetime(2024, 9, 2, 7, 50, tzinfo=timezone.utc)
+    seed([
+        ping("b1", minute + timedelta(seconds=5), 37.0, speed=10.0),
+        ping("b1", minute + timedelta(seconds=35), 37.2, speed=20.0),
+        ping("b2", minute + timedelta(seconds=10), 38.0),
+        ping("b1", minute + timedelta(minutes=1, seconds=1), 37.4),
+        ping("b1", NOW - timedelta(seconds=20), 37.6),  # within rollup_delay
+    ])
+    maintenance = LocationMaintenance(rollup_delay=120, session_factory=async_session_factory)
+
+    await maintenance.run_once(NOW)
+    await maintenance.run_once(NOW)
+
+    with sync_session_factory() as db:
+        rollups = db.execute(select(BusLocationRollup).order_by(
+            BusLocationRollup.minute, BusLocationRollup.bus_id)).scalars().all()
+        ids = db.execute(select(BusLocation.id).order_by(BusLocation.id)).scalars().all()
+    assert [(r.bus_id, r.minute.minute, r.samples) for r in rollups] == [("b1", 50, 2), ("b2", 50, 1), ("b1", 51, 1)]
+    assert rollups[0].latitude == pytest.approx(37.1)
+    assert (rollups[0].speed, rollups[0].max_speed) == (15.0, 20.0)
+    assert ids == [1, 2, 3, 4, 5]
+    assert maintenance.stats()["rolled_up"] == 3
+
+@pytest.mark.asyncio
+async def test_late_rows_are_rolled_into_recent_minutes(seed, async_session_factory, sync_session_factory):
+    minute = datetime(2024, 9, 2, 7, 50, tzinfo=timezone.utc)
+    seed([ping("b1", minute + timedelta(seconds=5), 37.0), ping("b1", minute + timedelta(minutes=1), 37.0)])
+    maintenance = LocationMaintenance(rollup_delay=120, rollup_lookback=15, session_factory=async_session_factory)
+    await maintenance.run_once(NOW)
+
+    # Written after 7:51 was already rolled up; 7:30 is outside the lookback
+    seed([ping("b1", minute + timedelta(seconds=50), 37.4),
+          ping("b1", minute - timedelta(minutes=20), 36.0)])
+    await maintenance.run_once(NOW + timedelta(minutes=5))
+
+    with sync_session_factory() as db:
+        rollups = db.execute(select(BusLocationRollup).order_by(BusLocationRollup.minute)).scalars().all()
+    assert [(r.minute.minute, r.samples) for r in rollups] == [(50, 2), (51, 1)]
+    assert rollups[0].latitude == pytest.approx(37.2)
+    assert maintenance.stats()["rolled_up"] == 3
+
+@pytest.mark.asyncio
+async def test_retention_deletes_expired_rows_in_batches(seed, async_session_factory, sync_session_factory):
+    seed([ping("b1", NOW - timedelta(days=40, minutes=i), 37.0) for i in range(5)]
+         + [ping("b1", NOW - timedelta(days=1), 37.0)])
+    maintenance = LocationMaintenance(retention_days=30, rollup_retention_days=35,
+                                      delete_batch_size=2, session_factory=async_session_factory)
+
+    await maintenance.run_once(NOW)
+
+    with sync_session_factory() as db:
+        remaining = db.execute(select(BusLocation.timestamp)).scalars().all()
+        rollup_days = {r.date() for r in db.execute(select(BusLocationRollup.minute)).scalars()}
+    assert len(remaining) == 1
+    assert maintenance.stats()["deleted_rows"] == 5
+    assert maintenance.stats()["partitioned"] is False
+    # Rolled up before deletion, then the expired rollups went too
+    assert rollup_days == {(NOW - timedelta(days=1)).date()}
@@ -0,0 +1,76 @@
+import asyncio
+import time
+import pytest
+from app.services import password_hasher as password_hasher_module
+from app.services.password_hasher import PasswordHasher, PasswordHasherBusy
+
+@pytest.mark.asyncio
+async def test_hash_and_verify_round_trip():
+    hasher = PasswordHasher(workers=1)
+    hashed = await hasher.hash("s3cret")
+    assert await hasher.verify("s3cret", hashed)
+    assert not await hasher.verify("wrong", hashed)
+    assert hasher.stats()["completed"] == 3
+    hasher.stop()
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded_and_overflow_rejected(monkeypatch):
+    active = 0
+    peak = 0
+
+    def slow_hash(password):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        time.sleep(0.02)
+        active -= 1
+        return "hashed"
+
+    monkeypatch.setattr(password_hasher_module, "get_password_hash", slow_hash)
+    hasher = PasswordHasher(workers=2, max_pending=3)
+    results = await asyncio.gather(*(hasher.hash("pw") for _ in range(8)), return_exceptions=True)
+    hasher.stop()
+
+    # 2 running + 3 waiting are accepted; the rest fail fast
+    assert results.count("hashed") == 5
+    assert sum(isinstance(r, PasswordHasherBusy) for r in results) == 3
+    assert peak <= 2
+    stats = hasher.stats()
+    assert stats["rejected"] == 3
+    assert stats["max_queue_ms"] > 0
+
+@pytest.mark.asyncio
+async def test_event_loop_keeps_running_while_hashing():
+    hasher = PasswordHasher(workers=1)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.001)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.gather(*(hasher.hash("pw") for _ in range(3)))
+    task.cancel()
+    hasher.stop()
+    assert ticks > 10
+
+@pytest.mark.asyncio
+async def test_stop_lets_running_calls_finish_and_refuses_the_rest(monkeypatch):
+    def slow_hash(password):
+        time.sleep(0.05)
+        return "hashed"
+
+    monkeypatch.setattr(password_hasher_module, "get_password_hash", slow_hash)
+    hasher = PasswordHasher(workers=1)
+    calls = [asyncio.ensure_future(hasher.hash("pw")) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    hasher.stop()
+    results = await asyncio.gather(*calls, return_exceptions=True)
+
+    assert results[0] == "hashed"
+    assert isinstance(results[1], PasswordHasherBusy)
+    with pytest.raises(PasswordHasherBusy):
+        await hasher.hash("pw")
+    assert hasher.stats()["running"] == 0
@@ -0,0 +1,241 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+import pytest
+import stripe
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import payments as payments_api
+from app.core.auth import get_current_user_id
+from app.core.config import settings
+from app.core.database import get_async_db
+from app.models import PaymentEvent, Route, Stop, Subscription, User
+from app.services import payment_events
+from app.services.payment_events import PaymentEventProcessor
+from app.services.stripe_gateway import StripeGateway, StripeGatewayBusy
+from app.services.subscription_index import subscription_index
+
+WEBHOOK_SECRET = "whsec_test"
+
+class StripeStub(BaseHTTPRequestHandler):
+    """Just enough of the Stripe API: POST /v1/checkout/sessions."""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.requests.append((self.path, self.headers["Authorization"], parse_qs(body.decode())))
+        number = len(self.server.requests)
+        time.sleep(self.server.latency)
+        payload = json.dumps({
+            "id": f"cs_test_{number}",
+            "object": "checkout.session",
+            "url": f"https://checkout.stripe.test/{number}",
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stripe_stub(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StripeStub)
+    server.requests, server.latency = [], 0.0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    # StripeGateway.start() sets these process-wide; restore them afterwards
+    monkeypatch.setattr(stripe, "api_base", stripe.api_base)
+    monkeypatch.setattr(stripe, "default_http_client", stripe.default_http_client)
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def seeded(sync_session_factory):
+    with sync_session_factory() as db:
+        db.add(User(id="parent-1", email="p@example.com", hashed_password="-", name="P"))
+        db.add(Route(id="route-1", name="Route 1", price=9.99))
+        db.add(Stop(id="stop-1", route_id="route-1", name="Stop 1", latitude=0.0, longitude=0.0, index=2))
+        db.add(Subscription(id="sub-1", user_id="parent-1", route_id="route-1", stop_id="stop-1", stop_index=2))
+        db.commit()
+
+@pytest.fixture
+def processor(async_session_factory, monkeypatch):
+    processor = PaymentEventProcessor(max_attempts=3, retry_base=10.0, session_factory=async_session_factory)
+    monkeypatch.setattr(payments_api, "payment_event_processor", processor)
+    monkeypatch.setattr(settings, "STRIPE_WEBHOOK_SECRET", WEBHOOK_SECRET)
+    return processor
+
+@pytest.fixture
+def client(seeded, async_session_factory):
+    async def get_test_db():
+        async with async_session_factory() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(payments_api.router, prefix="/payments")
+    app.dependency_overrides[get_async_db] = get_test_db
+    app.dependency_overrides[get_current_user_id] = lambda: "parent-1"
+    return TestClient(app)
+
+def signed(event: dict):
+    payload = json.dumps(event)
+    timestamp = int(time.time())
+    signature = hmac.new(WEBHOOK_SECRET.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return payload, {"stripe-signature": f"t={timestamp},v1={signature}", "content-type": "application/json"}
+
+def completed(event_id: str) -> dict:
+    metadata = {"user_id": "parent-1", "route_id": "route-1", "stop_id": "stop-1", "stop_index": "2"}
+    return {"id": event_id, "object": "event", "type": "checkout.session.completed",
+            "data": {"object": {"id": "cs_test_1", "object": "checkout.session", "metadata": metadata}}}
+
+def test_checkout_session_is_created_through_the_gateway(client, stripe_stub, monkeypatch):
+    monkeypatch.setattr(payments_api, "stripe_gateway", StripeGateway("sk_test_stub", api_base=stripe_stub.url))
+
+    response = client.post("/payments/create-checkout-session",
+                           json={"route_id": "route-1", "stop_id": "stop-1", "stop_index": 2})
+
+    assert response.status_code == 200
+    assert response.json() == {"url": "https://checkout.stripe.test/1"}
+    path, authorization, form = stripe_stub.requests[0]
+    assert path == "/v1/checkout/sessions"
+    assert authorization == "Bearer sk_test_stub"
+    assert form["metadata[user_id]"] == ["parent-1"]
+    assert form["line_items[0][price_data][unit_amount]"] == ["999"]
+    payments_api.stripe_gateway.stop()
+
+def test_slow_stripe_times_out_with_504(client, stripe_stub, monkeypatch):
+    stripe_stub.latency = 1.0
+    monkeypatch.setattr(payments_api, "stripe_gateway",
+                        StripeGateway("sk_test_stub", timeout=0.2, api_base=stripe_stub.url))
+
+    response = client.post("/payments/create-checkout-session",
+                           json={"route_id": "route-1", "stop_id": "stop-1", "stop_index": 2})
+
+    assert response.status_code == 504
+    assert payments_api.stripe_gateway.stats()["timeouts"] == 1
+    payments_api.stripe_gateway.stop()
+
+@pytest.mark.asyncio
+async def test_gateway_bounds_concurrency_and_rejects_overflow(stripe_stub):
+    stripe_stub.latency = 0.2
+    gateway = StripeGateway("sk_test_stub", workers=2, max_pending=2, api_base=stripe_stub.url)
+    probe_lag = []
+
+    async def probe():
+        # The loop keeps ticking while Stripe calls are in flight
+        for _ in range(10):
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            probe_lag.append(time.perf_counter() - started - 0.01)
+
+    calls = [asyncio.ensure_future(gateway.create_checkout_session(mode="payment")) for _ in range(4)]
+    await asyncio.sleep(0.05)
+    assert gateway.stats()["running"] == 2 and gateway.stats()["pending"] == 2
+    with pytest.raises(StripeGatewayBusy):
+        await gateway.create_checkout_session(mode="payment")
+    await probe()
+    sessions = await asyncio.gather(*calls)
+
+    assert sorted(session.id for session in sessions) == [f"cs_test_{i}" for i in range(1, 5)]
+    assert max(probe_lag) < 0.1
+    assert gateway.stats()["completed"] == 4 and gateway.stats()["rejected"] == 1
+    gateway.stop()
+
+@pytest.mark.asyncio
+async def test_timed_out_call_keeps_its_slot_until_it_returns(stripe_stub):
+    gateway = StripeGateway("sk_test_stub", workers=1, timeout=0.1, api_base=stripe_stub.url)
+    calls = []
+
+    def slow_call(api_key):
+        # A Stripe call the SDK's own HTTP timeout has not cut short yet
+        calls.append(api_key)
+        time.sleep(0.4)
+        return len(calls)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await gateway._call(slow_call)
+    # The thread is still busy; a second call cannot start
+    assert gateway.stats()["running"] == 1
+    with pytest.raises(asyncio.TimeoutError):
+        await gateway._call(slow_call)
+    assert len(calls) == 1
+
+    await asyncio.sleep(0.4)
+    assert gateway.stats()["running"] == 0
+    session = await gateway.create_checkout_session(mode="payment")
+    assert session.id == "cs_test_1"
+    assert gateway.stats()["timeouts"] == 2 and gateway.stats()["completed"] == 1
+    gateway.stop()
+
+@pytest.mark.asyncio
+async def test_stop_lets_running_calls_finish_and_refuses_new_ones(stripe_stub):
+    stripe_stub.latency = 0.2
+    gateway = StripeGateway("sk_test_stub", workers=1, api_base=stripe_stub.url)
+    running = asyncio.ensure_future(gateway.create_checkout_session(mode="payment"))
+    waiting = asyncio.ensure_future(gateway.create_checkout_session(mode="payment"))
+    await asyncio.sleep(0.05)
+
+    gateway.stop()
+    assert (await running).id == "cs_test_1"
+    with pytest.raises(StripeGatewayBusy):
+        await waiting
+    with pytest.raises(StripeGatewayBusy):
+        await gateway.create_checkout_session(mode="payment")
+    assert gateway.stats()["running"] == 0 and gateway.stats()["rejected"] == 2
+
+@pytest.mark.asyncio
+async def test_webhook_stores_once_and_processor_activates_subscription(client, processor, sync_session_factory, monkeypatch):
+    monkeypatch.setattr(payment_events, "subscription_index", subscription_index)
+    payload, headers = signed(completed("evt_1"))
+
+    first = client.post("/payments/webhook/payment", content=payload, headers=headers)
+    duplicate = client.post("/payments/webhook/payment", content=payload, headers=headers)
+    forged = client.post("/payments/webhook/payment", content=payload,
+                         headers={**headers, "stripe-signature": "t=1,v1=bad"})
+
+    assert first.status_code == duplicate.status_code == 200
+    assert forged.status_code == 400
+    assert processor.stats()["stored"] == 1 and processor.stats()["duplicates"] == 1
+    with sync_session_factory() as db:
+        assert db.get(Subscription, "sub-1").is_active is False
+
+    assert await processor.run_once() == 1
+    assert await processor.run_once() == 0
+    with sync_session_factory() as db:
+        assert db.get(Subscription, "sub-1").is_active is True
+        assert db.get(PaymentEvent, "evt_1").status == "processed"
+    assert [target.subscription_id for target in subscription_index.lookup("route-1", 2)] == ["sub-1"]
+    subscription_index.remove("sub-1")
+
+@pytest.mark.asyncio
+async def test_failing_event_is_retried_with_backoff_then_marked_failed(client, processor, sync_session_factory, monkeypatch):
+    async def broken(db, event):
+        raise RuntimeError("handler down")
+
+    monkeypatch.setitem(payment_events.HANDLERS, "checkout.session.completed", broken)
+    payload, headers = signed(completed("evt_2"))
+    assert client.post("/payments/webhook/payment", content=payload, headers=headers).status_code == 200
+
+    now = datetime.now(timezone.utc) + timedelta(seconds=1)
+    assert await processor.run_once(now) == 1
+    # Not due again until the backoff has passed
+    assert await processor.run_once(now + timedelta(seconds=9)) == 0
+    assert await processor.run_once(now + timedelta(seconds=11)) == 1
+    assert await processor.run_once(now + timedelta(seconds=60)) == 1
+
+    with sync_session_factory() as db:
+        event = db.get(PaymentEvent, "evt_2")
+        assert (event.status, event.attempts) == ("failed", 3)
+        assert "handler down" in event.last_error
+    assert await processor.run_once(now + timedelta(days=1)) == 0
+    assert processor.stats()["retried"] == 2 and processor.stats()["failed"] == 1
@@ -0,0 +1,77 @@
+import pytest
+from app.models import DeviceToken, User
+from app.services.fcm_service import FakeFCMClient, PushDispatcher
+
+@pytest.fixture
+def seeded(sync_session_factory):
+    db = sync_session_factory()
+    for i in range(3):
+        db.add(User(id=f"u{i}", email=f"u{i}@example.com", hashed_password="x", name="Parent"))
+    db.add_all([
+        DeviceToken(id="t0", user_id="u0", token="phone-0"),
+        DeviceToken(id="t1", user_id="u1", token="phone-1"),
+        DeviceToken(id="t2", user_id="u1", token="tablet-1"),
+        DeviceToken(id="t3", user_id="u2", token="dead-2"),
+    ])
+    db.commit()
+    db.close()
+
+@pytest.mark.asyncio
+async def test_groups_identical_messages_into_one_multicast(seeded, async_session_factory, wait_for):
+    client = FakeFCMClient()
+    dispatcher = PushDispatcher(client=client, session_factory=async_session_factory)
+    dispatcher.start()
+    for user_id in ("u0", "u1"):
+        dispatcher.enqueue(user_id, "Bus Approaching", "Your stop is coming up")
+    await wait_for(lambda: dispatcher.sent == 3)
+    await dispatcher.stop()
+
+    assert len(client.requests) == 1
+    assert sorted(client.requests[0][0]) == ["phone-0", "phone-1", "tablet-1"]
+
+@pytest.mark.asyncio
+async def test_dead_tokens_are_pruned(seeded, sync_session_factory, async_session_factory, wait_for):
+    client = FakeFCMClient(dead_tokens={"dead-2"})
+    dispatcher = PushDispatcher(client=client, session_factory=async_session_factory)
+    dispatcher.start()
+    dispatcher.enqueue("u2", "Bus Approaching", "Your stop is coming up")
+    await wait_for(lambda: dispatcher.pruned == 1)
+    await dispatcher.stop()
+
+    db = sync_session_factory()
+    assert db.query(DeviceToken).filter(DeviceToken.token == "dead-2").count() == 0
+    db.close()
+
+@pytest.mark.asyncio
+async def test_transient_failures_are_retried_with_backoff(seeded, async_session_factory, wait_for):
+    client = FakeFCMClient(flaky_tokens={"phone-0": 2})
+    dispatcher = PushDispatcher(client=client, retry_base=0.01, session_factory=async_session_factory)
+    dispatcher.start()
+    dispatcher.enqueue("u0", "Bus Approaching", "Your stop is coming up")
+    await wait_for(lambda: dispatcher.sent == 1)
+    await dispatcher.stop()
+
+    assert dispatcher.retried == 2
+    assert len(client.requests) == 3
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_retries(seeded, async_session_factory, wait_for):
+    client = FakeFCMClient(flaky_tokens={"phone-0": 10})
+    dispatcher = PushDispatcher(client=client, retry_base=0.001, max_retries=2, session_factory=async_session_factory)
+    dispatcher.start()
+    dispatcher.enqueue("u0", "Bus Approaching", "Your stop is coming up")
+    await wait_for(lambda: dispatcher.failed == 1)
+    await dispatcher.stop()
+    assert len(client.requests) == 3
+
+@pytest.mark.asyncio
+async def test_stop_finishes_the_batch_in_flight(seeded, async_session_factory, wait_for):
+    client = FakeFCMClient(latency=0.2)
+    dispatcher = PushDispatcher(client=client, session_factory=async_session_factory)
+    dispatcher.start()
+    dispatcher.enqueue("u0", "Bus Approaching", "Your stop is coming up")
+    # The worker has dequeued the message and is waiting on FCM
+    await wait_for(lambda: dispatcher.requests == 1)
+    await dispatcher.stop()
+
+    assert dispatcher.sent == 1
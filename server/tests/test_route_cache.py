@@ -0,0 +1,52 @@
+from functools import partial
+import pytest
+from app.models import Route, Stop
+from app.services import route_cache as route_cache_module
+from app.services.route_cache import RouteCache, load_geometries
+
+@pytest.fixture
+def seeded(sync_session_factory):
+    db = sync_session_factory()
+    db.add(Route(id="r1", name="Route 1", price=10.0))
+    db.add_all([
+        Stop(id=f"s{i}", route_id="r1", name=f"Stop {i}", latitude=37.0 + i * 0.01, longitude=-122.0, index=i)
+        for i in (2, 0, 1)
+    ])
+    db.commit()
+    db.close()
+
+@pytest.fixture
+def cache(seeded, async_session_factory, monkeypatch):
+    cache = RouteCache(ttl=300, loader=partial(load_geometries, session_factory=async_session_factory))
+    monkeypatch.setattr(route_cache_module, "route_cache", cache)
+    return cache
+
+@pytest.mark.asyncio
+async def test_geometry_is_ordered_by_stop_index(cache):
+    geometry = await cache.get("r1")
+    assert geometry.stop_ids == ["s0", "s1", "s2"]
+    assert geometry.lats.tolist() == [37.0, 37.01, 37.02]
+    assert geometry.stop_name("s1") == "Stop 1"
+    assert (await cache.get("r1")) is geometry
+    assert cache.hits == 1 and cache.misses == 1
+
+@pytest.mark.asyncio
+async def test_unknown_route_is_cached_empty(cache):
+    geometry = await cache.get("missing")
+    assert geometry.stop_count == 0
+    assert cache.peek("missing") is geometry
+
+@pytest.mark.asyncio
+async def test_commit_invalidates_route(cache, sync_session_factory):
+    await cache.warm()
+    assert cache.peek("r1") is not None
+
+    db = sync_session_factory()
+    db.add(Stop(id="s3", route_id="r1", name="Stop 3", latitude=37.03, longitude=-122.0, index=3))
+    db.flush()
+    assert cache.peek("r1") is not None  # not until the commit
+    db.commit()
+    db.close()
+
+    assert cache.peek("r1") is None
+    assert (await cache.get("r1")).stop_count == 4
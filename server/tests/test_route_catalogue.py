@@ -0,0 +1,97 @@
+from functools import partial
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from app.api import routes as routes_api
+from app.core.database import get_async_db
+from app.models import Route, Stop
+from app.services import route_cache as route_cache_module
+from app.services.route_cache import RouteCache
+from app.services.route_catalogue import RouteCatalogue, etag_matches, load_catalogue
+
+@pytest.fixture
+def seeded(sync_session_factory):
+    db = sync_session_factory()
+    for r in range(3):
+        db.add(Route(id=f"r{r}", name=f"Route {r}", price=10.0))
+        db.add_all([
+            Stop(id=f"r{r}s{i}", route_id=f"r{r}", name=f"Stop {i}", address="-",
+                 latitude=37.0 + i * 0.01, longitude=-122.0, index=i)
+            for i in (1, 0)
+        ])
+    db.commit()
+    db.close()
+
+@pytest.fixture
+def catalogue(seeded, async_session_factory, monkeypatch):
+    catalogue = RouteCatalogue(loader=partial(load_catalogue, session_factory=async_session_factory))
+    cache = RouteCache()
+    cache.add_listener(catalogue.invalidate)
+    monkeypatch.setattr(route_cache_module, "route_cache", cache)
+    monkeypatch.setattr(routes_api, "route_catalogue", catalogue)
+    return catalogue
+
+@pytest.fixture
+def client(catalogue, async_session_factory):
+    async def get_test_db():
+        async with async_session_factory() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(routes_api.router, prefix="/routes")
+    app.dependency_overrides[routes_api.get_current_user_id] = lambda: "user-1"
+    app.dependency_overrides[get_async_db] = get_test_db
+    return TestClient(app)
+
+@pytest.mark.asyncio
+async def test_catalogue_loads_in_fixed_number_of_queries(seeded, async_session_factory):
+    statements = []
+    async with async_session_factory() as db:
+        engine = db.bind.sync_engine
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        snapshot = await load_catalogue(session_factory=async_session_factory)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert len(statements) == 2
+    assert sorted(snapshot.by_id) == ["r0", "r1", "r2"]
+
+def test_etag_and_not_modified(client, catalogue):
+    response = client.get("/routes")
+    assert response.status_code == 200
+    routes = response.json()
+    assert [stop["id"] for stop in routes[0]["stops"]] == ["r0s0", "r0s1"]
+    etag = response.headers["etag"]
+
+    cached = client.get("/routes", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert client.get("/routes", headers={"If-None-Match": '"stale"'}).status_code == 200
+    assert catalogue.misses == 1 and catalogue.not_modified == 1
+
+    single = client.get("/routes/r1")
+    assert single.json()["id"] == "r1"
+    assert client.get("/routes/r1", headers={"If-None-Match": single.headers["etag"]}).status_code == 304
+    assert client.get("/routes/missing").status_code == 404
+
+def test_stop_commit_changes_etag(client, catalogue, sync_session_factory):
+    etag = client.get("/routes").headers["etag"]
+
+    db = sync_session_factory()
+    db.get(Stop, "r2s1").name = "Renamed"
+    db.commit()
+    db.close()
+
+    response = client.get("/routes", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()[2]["stops"][1]["name"] == "Renamed"
+
+def test_etag_matches_lists_and_weak_tags():
+    assert etag_matches('"a", W/"b"', '"b"')
+    assert etag_matches("*", '"b"')
+    assert not etag_matches(None, '"b"')
+    assert not etag_matches('"a"', '"b"')
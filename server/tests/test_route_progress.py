@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+import numpy as np
+from app.services.route_progress import BusProgress, RouteProgressTracker
+from app.services.stop_locator import StopLocator
+
+def make_geometry(coords, route_id="r1"):
+    geometry = SimpleNamespace(
+        route_id=route_id,
+        stop_ids=[f"s{i}" for i in range(len(coords))],
+        indexes=list(range(len(coords))),
+        lats=np.array([c[0] for c in coords]),
+        lngs=np.array([c[1] for c in coords]),
+        stop_count=len(coords),
+    )
+    geometry.locator = StopLocator(geometry)
+    return geometry
+
+# Out along a street and back on a parallel one ~20 m away, so stops 1 and 5
+# (and 2 and 4) are nearly on top of each other
+LOOP = [
+    (45.0000, -122.000),
+    (45.0000, -121.995),
+    (45.0000, -121.990),
+    (45.0002, -121.985),
+    (45.0002, -121.990),
+    (45.0002, -121.995),
+    (45.0002, -122.000),
+]
+
+def test_advances_monotonically_on_self_crossing_route():
+    geometry = make_geometry(LOOP)
+    tracker = RouteProgressTracker(window=2, arrival_radius_m=30)
+    state = BusProgress("r1")
+
+    seen = []
+    for lat, lng in LOOP:
+        update = tracker.update(state, geometry, lat, lng)
+        seen.extend(a.position for a in update.arrivals)
+    assert seen == [0, 1, 2, 3, 4, 5, 6]
+    assert state.completed
+
+def test_noise_near_an_earlier_stop_does_not_regress():
+    geometry = make_geometry(LOOP)
+    tracker = RouteProgressTracker(window=2, arrival_radius_m=30)
+    state = BusProgress("r1")
+    for lat, lng in LOOP[:5]:
+        tracker.update(state, geometry, lat, lng)
+    assert state.position == 4
+
+    # On the return leg, right next to stop 2 on the outbound leg
+    update = tracker.update(state, geometry, 45.0001, -121.990)
+    assert update.position == 4
+    assert update.arrivals == []
+
+def test_skipped_stops_are_reported_in_order():
+    geometry = make_geometry(LOOP)
+    tracker = RouteProgressTracker(window=3, arrival_radius_m=30)
+    state = BusProgress("r1")
+    tracker.update(state, geometry, *LOOP[0])
+    update = tracker.update(state, geometry, *LOOP[3])
+    assert [a.stop_id for a in update.arrivals] == ["s1", "s2", "s3"]
+
+def test_new_trip_starts_back_at_the_route_start():
+    line = [(45.0, -122.0 + i * 0.005) for i in range(6)]
+    geometry = make_geometry(line)
+    tracker = RouteProgressTracker(window=2, arrival_radius_m=30)
+    state = BusProgress("r1")
+    for lat, lng in line:
+        tracker.update(state, geometry, lat, lng)
+    assert state.completed and state.trip == 1
+
+    # Parked at the terminus: still the same trip
+    assert tracker.update(state, geometry, *line[-1]).trip == 1
+
+    update = tracker.update(state, geometry, *line[0])
+    assert update.trip_started and update.trip == 2
+    assert update.position == 0
@@ -0,0 +1,93 @@
+import json
+import pytest
+from app import socketio_app
+from app.services.bus_state import BusStateStore
+from app.services.fanout_scheduler import FanoutScheduler
+from app.services.route_cache import RouteCache, RouteGeometry
+
+def decode(packet):
+    # Engine.IO MESSAGE ("4") carrying a Socket.IO EVENT ("2") + [event, data]
+    assert packet.startswith("42")
+    return json.loads(packet[2:])
+
+@pytest.fixture
+def store(monkeypatch):
+    store = BusStateStore()
+    monkeypatch.setattr(socketio_app, "bus_state", store)
+    return store
+
+@pytest.mark.asyncio
+async def test_subscribe_route_sends_one_snapshot(store, add_client):
+    await store.update("bus-1", route_id="r1", lat=37.0, lng=-122.0, updated_at=1.0, seq=7)
+    await store.update("bus-2", route_id="r1", lat=37.1, lng=-122.1, updated_at=2.0, seq=3)
+    await store.update("bus-3", route_id="r1")  # connected, never pinged
+    await store.update("bus-4", route_id="r2", lat=38.0, lng=-121.0, updated_at=1.0)
+    sid, socket = await add_client(socketio_app.sio, "eio-snap-1")
+
+    await socketio_app.subscribe_route(sid, "r1")
+
+    assert len(socket.packets) == 1
+    event, snapshot = decode(socket.packets[0])
+    assert event == "bus:snapshot"
+    assert snapshot["routeId"] == "r1"
+    assert {(bus["busId"], bus["seq"]) for bus in snapshot["buses"]} == {("bus-1", 7), ("bus-2", 3)}
+    assert sid in socketio_app.sio.manager.rooms["/"]["route:r1"]
+
+@pytest.mark.asyncio
+async def test_subscribe_bus_snapshot_and_sequence(store, add_client, monkeypatch):
+    async def no_stops(route_id):
+        return {route_id: RouteGeometry(route_id, [])}
+
+    monkeypatch.setattr(socketio_app, "route_cache", RouteCache(loader=no_stops))
+    monkeypatch.setattr(socketio_app.telemetry_ingestor, "submit", lambda *args: True)
+    monkeypatch.setattr(socketio_app, "fanout_scheduler", FanoutScheduler(
+        socketio_app.emit_bus_update, socketio_app.bus_room_members, route_interval=0, bus_interval=0
+    ))
+    sid, socket = await add_client(socketio_app.sio, "eio-snap-2")
+
+    await socketio_app.subscribe_bus(sid, "bus-9")
+    assert decode(socket.packets[0]) == ["bus:snapshot", {"busId": "bus-9", "buses": []}]
+
+    for lng in (-122.0, -122.001):
+        await socketio_app.bus_update("bus-sid", {"bus_id": "bus-9", "route_id": "r9", "lat": 37.0, "lng": lng})
+    updates = [decode(packet)[1] for packet in socket.packets[1:]]
+    assert [update["seq"] for update in updates] == [1, 2]
+
+    await socketio_app.subscribe_bus(sid, "bus-9")
+    event, snapshot = decode(socket.packets[-1])
+    assert snapshot["buses"][0]["seq"] == 2
+    assert snapshot["buses"][0]["lng"] == -122.001
+
+@pytest.mark.asyncio
+async def test_bus_disconnect_drops_its_live_state(store, add_client, monkeypatch):
+    async def no_stops(route_id):
+        return {route_id: RouteGeometry(route_id, [])}
+
+    monkeypatch.setattr(socketio_app, "route_cache", RouteCache(loader=no_stops))
+    monkeypatch.setattr(socketio_app.telemetry_ingestor, "submit", lambda *args: True)
+    monkeypatch.setattr(socketio_app, "fanout_scheduler", FanoutScheduler(
+        socketio_app.emit_bus_update, socketio_app.bus_room_members, route_interval=0, bus_interval=0
+    ))
+    store.add_listener(socketio_app.forget_bus)
+    manager = socketio_app.sio.manager
+    bus_sid, bus_socket = await add_client(socketio_app.sio, "eio-bus-1")
+    bus_socket.session = {}
+    viewer, viewer_socket = await add_client(socketio_app.sio, "eio-viewer-1", "bus:bus-7")
+    viewer_socket.session = {}
+    manager.set_format(viewer, "compact")
+
+    await socketio_app.bus_connect(bus_sid, {"bus_id": "bus-7", "route_id": "r7"})
+    await socketio_app.bus_update(bus_sid, {"bus_id": "bus-7", "route_id": "r7", "lat": 37.0, "lng": -122.0})
+    assert store.get("bus-7").sid == bus_sid
+    assert "bus-7" in socketio_app.bus_progress
+    assert manager.compact.stats()["streams"] == 1
+
+    await socketio_app.disconnect(viewer)
+    assert store.get("bus-7") is not None
+
+    await socketio_app.disconnect(bus_sid)
+    assert store.get("bus-7") is None and store.on_route("r7") == []
+    assert "bus-7" not in socketio_app.bus_progress
+    assert manager.compact.stats()["streams"] == 0
+    await manager.disconnect(viewer, "/", ignore_queue=True)
+    await manager.disconnect(bus_sid, "/", ignore_queue=True)
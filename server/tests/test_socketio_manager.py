@@ -0,0 +1,156 @@
+import asyncio
+import pytest
+import pytest_asyncio
+import socketio
+from fastapi.testclient import TestClient
+from app.core.state_channel import StateChannel
+from app.models import Route, Subscription
+from app.services import route_cache as route_cache_module
+from app.services.bus_state import BusStateStore
+from app.services.subscription_index import SubscriptionIndex
+from app.services.socketio_manager import (
+    FanoutManager, InProcessBroker, InProcessPubSubManager, create_client_manager,
+)
+from app.socketio_app import start_client_manager
+
+@pytest_asyncio.fixture
+async def workers():
+    broker = InProcessBroker()
+    servers = []
+    for _ in range(2):
+        server = socketio.AsyncServer(async_mode="asgi", client_manager=InProcessPubSubManager(broker))
+        start_client_manager(server)
+        servers.append(server)
+    yield servers
+    for server in servers:
+        server.manager.thread.cancel()
+
+@pytest.mark.asyncio
+async def test_emit_reaches_clients_on_other_workers(workers, add_client, wait_for):
+    worker_a, worker_b = workers
+    _, local = await add_client(worker_a, "eio-a", "route:r1")
+    _, remote = await add_client(worker_b, "eio-b", "route:r1")
+    _, other_route = await add_client(worker_b, "eio-c", "route:r2")
+
+    await worker_a.emit("bus:update", {"busId": "bus-1"}, room="route:r1")
+    await wait_for(lambda: remote.packets)
+
+    assert len(local.packets) == 1
+    assert remote.packets == local.packets
+    assert '"bus:update"' in remote.packets[0]
+    assert other_route.packets == []
+
+@pytest.mark.asyncio
+async def test_bus_state_is_replicated(workers, wait_for):
+    worker_a, worker_b = workers
+    store_a, store_b = BusStateStore(), BusStateStore()
+    store_a.attach(worker_a.manager)
+    store_b.attach(worker_b.manager)
+
+    await store_a.update("bus-1", route_id="r1", current_stop_index=0)
+    await store_a.update("bus-1", lat=37.0, lng=-122.0, speed=30.0)
+    await wait_for(lambda: store_b.received == 2)
+    replica = store_b.get("bus-1")
+    assert (replica.route_id, replica.lat, replica.lng, replica.speed) == ("r1", 37.0, -122.0, 30.0)
+    assert [state.bus_id for state in store_b.on_route("r1")] == ["bus-1"]
+
+    await store_b.update("bus-1", route_id="r2")
+    await wait_for(lambda: store_a.received == 1)
+    assert store_a.on_route("r1") == []
+    assert store_a.get("bus-1").route_id == "r2"
+
+    await store_a.remove("bus-1")
+    await wait_for(lambda: store_b.get("bus-1") is None)
+
+@pytest.mark.asyncio
+async def test_subscription_index_is_replicated(workers, wait_for):
+    channels = [StateChannel(), StateChannel()]
+    indexes = [SubscriptionIndex(refresh_interval=0, channel=channel) for channel in channels]
+    for worker, channel in zip(workers, channels):
+        channel.attach(worker.manager)
+    bus_state_b = BusStateStore()
+    bus_state_b.attach(workers[1].manager)
+
+    subscription = Subscription(id="sub-1", route_id="r1", user_id="u1", stop_id="s3",
+                                stop_index=3, is_active=True, notifications_enabled=True)
+    indexes[0].upsert(subscription)
+    await wait_for(lambda: indexes[1].lookup("r1", 3))
+    assert indexes[1].lookup("r1", 3) == indexes[0].lookup("r1", 3)
+
+    subscription.notifications_enabled = False
+    indexes[0].upsert(subscription)
+    await wait_for(lambda: not indexes[1].lookup("r1", 3))
+
+    indexes[1].upsert(Subscription(id="sub-2", route_id="r2", user_id="u2", stop_id="s1",
+                                   stop_index=1, is_active=True, notifications_enabled=True))
+    await wait_for(lambda: indexes[0].lookup("r2", 1))
+    indexes[1].remove("sub-2")
+    await wait_for(lambda: not indexes[0].lookup("r2", 1))
+    assert channels[0].stats()["published"] == 2 and channels[1].stats()["received"] == 2
+    # Not bus state; the bus store ignores them
+    assert bus_state_b.received == 0
+
+@pytest.mark.asyncio
+async def test_committed_route_is_invalidated_on_other_workers(workers, sync_session_factory, monkeypatch, wait_for):
+    channel_a, channel_b = StateChannel(), StateChannel()
+    channel_a.attach(workers[0].manager)
+    channel_b.attach(workers[1].manager)
+    channel_a.start()
+    invalidated = []
+    channel_b.on("routes:invalidate", lambda change: invalidated.append(change["route_id"]))
+    monkeypatch.setattr(route_cache_module, "state_channel", channel_a)
+
+    def commit_route():
+        # A sync session in the threadpool: no running loop in this thread
+        with sync_session_factory() as db:
+            db.add(Route(id="route-x", name="Route X", price=1.0))
+            db.commit()
+
+    await asyncio.to_thread(commit_route)
+    await wait_for(lambda: invalidated)
+    assert invalidated == ["route-x"]
+
+def test_memory_store_is_local_only():
+    store = BusStateStore()
+    store.attach(socketio.AsyncServer(async_mode="asgi").manager)
+    assert not store.shared
+
+def test_create_client_manager_backends():
+    assert isinstance(create_client_manager("memory"), FanoutManager)
+    assert isinstance(create_client_manager("inprocess"), InProcessPubSubManager)
+    with pytest.raises(ValueError):
+        create_client_manager("carrier-pigeon")
+
+@pytest.mark.asyncio
+async def test_disconnect_leaves_only_the_clients_rooms(add_client):
+    server = socketio.AsyncServer(async_mode="asgi", client_manager=FanoutManager())
+    start_client_manager(server)
+    sid, _ = await add_client(server, "eio-rooms-1", "user:u1", "route:r1")
+    other, _ = await add_client(server, "eio-rooms-2", "user:u2", "route:r1")
+    assert sorted(server.manager.get_rooms(sid, "/")) == sorted([sid, "user:u1", "route:r1"])
+
+    await server.manager.leave_room(sid, "/", "route:r1")
+    assert sorted(server.manager.get_rooms(sid, "/")) == sorted([sid, "user:u1"])
+    await server.manager.disconnect(sid, "/", ignore_queue=True)
+
+    rooms = server.manager.rooms["/"]
+    assert sid not in rooms and "user:u1" not in rooms
+    assert sid not in rooms[None]
+    assert list(rooms["route:r1"]) == [other]
+    assert server.manager.get_rooms(sid, "/") == []
+
+def test_engineio_is_served_under_the_socketio_mount(monkeypatch):
+    # main mounts the Socket.IO app at /socket.io/; the mount strips that
+    # prefix before Engine.IO sees the request
+    from main import app, sio
+    # Only the handshake matters here: no ping monitor, and none of the
+    # fake sockets other tests left behind
+    monkeypatch.setattr(sio.eio, "sockets", {})
+    monkeypatch.setattr(sio.eio, "start_service_task", False)
+    client = TestClient(app)
+
+    response = client.get("/socket.io/", params={"EIO": "4", "transport": "polling"})
+
+    assert response.status_code == 200
+    assert response.text.startswith("0{")
+    assert '"sid"' in response.text
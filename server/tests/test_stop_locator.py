@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from app.services.stop_locator import StopLocator, haversine_m
+
+def make_geometry(stop_count):
+    # Stops every 0.01 degrees of longitude along the equator-ish latitude 45
+    lngs = np.array([-122.0 + i * 0.01 for i in range(stop_count)])
+    return SimpleNamespace(
+        stop_ids=[f"s{i}" for i in range(stop_count)],
+        indexes=list(range(stop_count)),
+        lats=np.full(stop_count, 45.0),
+        lngs=lngs,
+    )
+
+def test_haversine_one_degree_latitude():
+    assert haversine_m(0.0, 0.0, 1.0, 0.0) == pytest.approx(111195, rel=1e-3)
+
+@pytest.mark.parametrize("stop_count", [5, 200])
+def test_nearest_reports_meters_and_progress(stop_count):
+    locator = StopLocator(make_geometry(stop_count))
+    # Slightly past the third stop, ~55 m north of the line
+    result = locator.nearest(45.0005, -122.0 + 2 * 0.01 + 0.002)
+    assert result.position == 2
+    assert result.stop_id == "s2"
+    assert result.distance_m == pytest.approx(161, rel=0.05)
+    segment_m = haversine_m(45.0, -122.0, 45.0, -121.99)
+    assert result.progress_m == pytest.approx(2.2 * segment_m, rel=0.01)
+
+@pytest.mark.parametrize("stop_count", [5, 200])
+def test_single_and_batch_agree(stop_count):
+    locator = StopLocator(make_geometry(stop_count))
+    rng = np.random.default_rng(1)
+    lats = 45.0 + rng.uniform(-0.003, 0.003, 50)
+    lngs = -122.0 + rng.uniform(0, 0.01 * (stop_count - 1), 50)
+    positions, distances, progress = locator.nearest_many(lats, lngs)
+    for i in range(50):
+        single = locator.nearest(lats[i], lngs[i])
+        assert single.position == positions[i]
+        assert single.distance_m == pytest.approx(distances[i])
+        assert single.progress_m == pytest.approx(progress[i])
+
+def test_batch_is_chunked(monkeypatch):
+    monkeypatch.setattr(StopLocator, "BATCH_CELLS", 10)
+    locator = StopLocator(make_geometry(5))
+    positions, _, _ = locator.nearest_many([45.0] * 7, [-122.0 + 0.04] * 7)
+    assert positions.tolist() == [4] * 7
@@ -0,0 +1,43 @@
+import pytest
+from app.models import Subscription
+from app.services.subscription_index import AlertTarget, SubscriptionIndex
+
+def make_subscription(id, stop_index=3, is_active=True, notifications_enabled=True, route_id="r1"):
+    return Subscription(
+        id=id, user_id=f"user-{id}", route_id=route_id, stop_id=f"stop-{stop_index}",
+        stop_index=stop_index, is_active=is_active, notifications_enabled=notifications_enabled,
+    )
+
+@pytest.mark.asyncio
+async def test_load_buckets_by_route_and_stop_index():
+    rows = [
+        ("r1", AlertTarget("a", "u1", "s3", 3)),
+        ("r1", AlertTarget("b", "u2", "s3", 3)),
+        ("r2", AlertTarget("c", "u3", "s3", 3)),
+    ]
+    async def loader():
+        return rows
+
+    index = SubscriptionIndex(loader=loader)
+    await index.load()
+    assert {t.subscription_id for t in index.lookup("r1", 3)} == {"a", "b"}
+    assert [t.subscription_id for t in index.lookup("r2", 3)] == ["c"]
+    assert index.lookup("r1", 4) == []
+
+def test_upsert_moves_and_removes_subscriptions():
+    index = SubscriptionIndex(loader=lambda: [])
+    index.upsert(make_subscription("a", stop_index=3))
+    assert [t.user_id for t in index.lookup("r1", 3)] == ["user-a"]
+
+    index.upsert(make_subscription("a", stop_index=5))
+    assert index.lookup("r1", 3) == []
+    assert [t.stop_index for t in index.lookup("r1", 5)] == [5]
+
+    index.upsert(make_subscription("a", stop_index=5, is_active=False))
+    assert index.lookup("r1", 5) == []
+    assert index.stats() == {"subscriptions": 0, "buckets": 0}
+
+def test_muted_subscriptions_are_not_indexed():
+    index = SubscriptionIndex(loader=lambda: [])
+    index.upsert(make_subscription("a", notifications_enabled=False))
+    assert index.lookup("r1", 3) == []
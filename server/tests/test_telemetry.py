@@ -0,0 +1,59 @@
+import asyncio
+import pytest
+from app.models import BusLocation
+from app.services.telemetry import TelemetryIngestor
+
+@pytest.mark.asyncio
+async def test_flushes_on_batch_size(async_session_factory, sync_session_factory):
+    ingestor = TelemetryIngestor(batch_size=5, flush_interval=10, session_factory=async_session_factory)
+    ingestor.start()
+    for i in range(5):
+        assert ingestor.submit("bus-1", 37.0 + i, -122.0, 30.0)
+    for _ in range(50):
+        if ingestor.flushed_rows == 5:
+            break
+        await asyncio.sleep(0.01)
+    await ingestor.stop()
+
+    db = sync_session_factory()
+    assert db.query(BusLocation).count() == 5
+    assert ingestor.flush_count == 1
+    db.close()
+
+@pytest.mark.asyncio
+async def test_stop_flushes_pending_rows(async_session_factory, sync_session_factory):
+    ingestor = TelemetryIngestor(batch_size=100, flush_interval=60, session_factory=async_session_factory)
+    ingestor.start()
+    for i in range(3):
+        ingestor.submit("bus-1", 37.0, -122.0 + i)
+    await ingestor.stop()
+
+    db = sync_session_factory()
+    assert db.query(BusLocation).count() == 3
+    db.close()
+
+@pytest.mark.asyncio
+async def test_stop_writes_the_batch_the_flusher_holds(async_session_factory, sync_session_factory):
+    ingestor = TelemetryIngestor(batch_size=100, flush_interval=60, session_factory=async_session_factory)
+    ingestor.start()
+    for i in range(3):
+        ingestor.submit("bus-1", 37.0, -122.0 + i)
+    # The flusher has taken the rows off the queue and waits for more
+    await asyncio.sleep(0.1)
+    assert ingestor._queue.qsize() == 0
+    await ingestor.stop()
+
+    db = sync_session_factory()
+    assert db.query(BusLocation).count() == 3
+    assert ingestor.dropped == 0
+    assert not ingestor.submit("bus-1", 37.0, -122.0)
+    db.close()
+
+@pytest.mark.asyncio
+async def test_full_queue_drops_pings(async_session_factory, sync_session_factory):
+    ingestor = TelemetryIngestor(max_queue_size=2, batch_size=100, flush_interval=60, session_factory=async_session_factory)
+    ingestor.start()
+    results = [ingestor.submit("bus-1", 37.0, -122.0) for _ in range(4)]
+    assert results.count(False) >= 1
+    assert ingestor.dropped == results.count(False)
+    await ingestor.stop()